@@ -0,0 +1,140 @@
+"""Time the baseline engine on synthetic behaviour windows.
+
+    python -m bench.bench_baselines --days 30 --horses 20
+
+Fills a scratch database with one 5-minute window per horse per behaviour
+seen (1-3 behaviours per window), then times the full backfill, a single
+daily update and, for reference, a per-row Python summary of one day.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+from server.analysis.baseline_engine import (
+    DAY_MS,
+    HOUR_MS,
+    day_start_ms,
+    backfill,
+    summarize_day,
+    update_baselines,
+)
+from server.storage.db import (
+    close_all_conns,
+    init_db,
+    iter_behaviour_windows,
+    upsert_behaviour_windows,
+)
+
+BEHAVIOURS = ("standing", "lying", "eating", "drinking", "walking", "pawing", "rolling", "pacing")
+WINDOW_MS = 300_000
+
+
+def seed(db_path: Path, first_day: date, days: int, horses: int, seed_value: int) -> int:
+    rng = random.Random(seed_value)
+    rows = 0
+    for offset in range(days):
+        start = day_start_ms(first_day + timedelta(days=offset))
+        windows = []
+        for horse in range(horses):
+            for window_start in range(start, start + DAY_MS, WINDOW_MS):
+                for behaviour in rng.sample(BEHAVIOURS, rng.randint(1, 3)):
+                    count = rng.randint(1, 20)
+                    windows.append(
+                        (
+                            f"stable_{horse:02d}",
+                            horse,
+                            behaviour,
+                            window_start,
+                            window_start + WINDOW_MS,
+                            count,
+                            0.8 * count,
+                            window_start,
+                            window_start + WINDOW_MS - 1,
+                        )
+                    )
+        upsert_behaviour_windows(windows, db_path=db_path)
+        rows += len(windows)
+    return rows
+
+
+def summarize_day_per_row(day: date, db_path: Path) -> dict:
+    """The straightforward per-row equivalent of summarize_day, for comparison."""
+    day_start = day_start_ms(day)
+    totals: dict[tuple, int] = defaultdict(int)
+    rows = [
+        row
+        for chunk in iter_behaviour_windows(day_start, day_start + DAY_MS, db_path=db_path)
+        for row in chunk
+    ]
+    for subject, _behaviour, start, _end, detections in rows:
+        totals[(subject, start)] += detections
+    minutes: dict[tuple, float] = defaultdict(float)
+    for subject, behaviour, start, end, detections in rows:
+        share = detections / totals[(subject, start)]
+        hour = (start - day_start) // HOUR_MS
+        minutes[(subject, hour, behaviour)] += share * (end - start) / 60_000
+    return minutes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--horses", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, default=None, help="Write results to this file")
+    args = parser.parse_args()
+
+    first_day = date(2026, 1, 1)
+    last_day = first_day + timedelta(days=args.days - 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        init_db(db_path)
+        started = time.perf_counter()
+        windows = seed(db_path, first_day, args.days, args.horses, args.seed)
+        seed_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        baseline_rows = backfill(first_day, last_day, db_path=db_path)
+        backfill_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        update_baselines(last_day, db_path=db_path)
+        daily_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        vectorized = summarize_day(last_day, db_path=db_path)
+        vector_day_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        per_row = summarize_day_per_row(last_day, db_path)
+        per_row_day_seconds = time.perf_counter() - started
+        assert len(per_row) == len(vectorized)
+        close_all_conns()
+
+    result = {
+        "days": args.days,
+        "horses": args.horses,
+        "behaviour_windows": windows,
+        "baseline_rows": baseline_rows,
+        "seed_seconds": seed_seconds,
+        "backfill_seconds": backfill_seconds,
+        "daily_update_seconds": daily_seconds,
+        "summarize_day_seconds": vector_day_seconds,
+        "summarize_day_per_row_seconds": per_row_day_seconds,
+    }
+    for key, value in result.items():
+        print(f"{key:>30}: {value:.3f}" if isinstance(value, float) else f"{key:>30}: {value}")
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
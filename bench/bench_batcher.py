@@ -0,0 +1,99 @@
+"""Sweep MicroBatcher batch-size and deadline knobs against a simulated backend.
+
+    python -m bench.bench_batcher --cameras 12 --fps 5 --seconds 3
+
+The backend costs ``--call-ms`` per call plus ``--frame-ms`` per frame, the
+shape of batched GPU/CPU inference. For each (max_batch_size, max_wait_ms)
+pair the report shows mean batch size, sustained frames/s and latency from
+submit to result.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+
+from server.detection.batcher import MicroBatcher
+from server.detection.pipeline import FrameInput, HeuristicBackend
+
+
+def run_case(
+    cameras: int,
+    fps: float,
+    seconds: float,
+    max_batch_size: int,
+    max_wait_ms: float,
+    call_ms: float,
+    frame_ms: float,
+) -> dict:
+    backend = HeuristicBackend(call_ms / 1000, frame_ms / 1000)
+    batcher = MicroBatcher(backend, max_batch_size, max_wait_ms / 1000)
+    stop_at = time.monotonic() + seconds
+
+    def camera(index: int) -> None:
+        interval = 1.0 / fps
+        next_at = time.monotonic() + index * interval / cameras
+        while next_at < stop_at:
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            batcher.submit(FrameInput(Path(f"cam{index}.jpg"), 1000 + index))
+            next_at += interval
+
+    threads = [threading.Thread(target=camera, args=(i,)) for i in range(cameras)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+    elapsed = time.monotonic() - started
+
+    summary = batcher.stats.summary()
+    summary.update(
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        offered_fps=cameras * fps,
+        sustained_fps=summary["frames"] / elapsed,
+    )
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cameras", type=int, default=12)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--call-ms", type=float, default=20.0)
+    parser.add_argument("--frame-ms", type=float, default=2.0)
+    parser.add_argument("--batch-sizes", default="1,4,8,16,32")
+    parser.add_argument("--waits-ms", default="0,10,25,50")
+    parser.add_argument("--json", type=Path, default=None, help="Write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'batch':>5} {'wait_ms':>7} {'mean_bs':>7} {'fps':>7} {'p50_ms':>8} {'p99_ms':>8}")
+    for batch_size in (int(v) for v in args.batch_sizes.split(",")):
+        for wait_ms in (float(v) for v in args.waits_ms.split(",")):
+            result = run_case(
+                args.cameras,
+                args.fps,
+                args.seconds,
+                batch_size,
+                wait_ms,
+                args.call_ms,
+                args.frame_ms,
+            )
+            results.append(result)
+            print(
+                f"{batch_size:>5} {wait_ms:>7.0f} {result['mean_batch_size']:>7.1f} "
+                f"{result['sustained_fps']:>7.1f} {result['latency_p50_ms']:>8.1f} "
+                f"{result['latency_p99_ms']:>8.1f}"
+            )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
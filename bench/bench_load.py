@@ -0,0 +1,364 @@
+"""Load-test ingestion and detection end to end on a scratch data directory.
+
+    python -m bench.bench_load --cameras 8 --fps 2 --frame-kb 120 --seconds 10 --workers 2
+
+Starts the API under uvicorn on localhost and forks ``--workers`` detection
+workers, then simulates ``--cameras`` cameras uploading ``--frame-kb`` frames
+at ``--fps`` each for ``--seconds``. Workers drain the ``detect`` queue
+concurrently. After the uploads stop, the run waits until the queue is empty.
+
+Reports sustained uploads/s and jobs/s, SQLite commits/s (API plus workers),
+upload and end-to-end latency percentiles (upload sent to job done) and peak
+RSS. Frame payloads come from ``--seed``, so repeated runs send the same
+bytes. Results are written as JSON (with the git commit) to ``--json``;
+``--compare`` prints the change against an earlier result file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import random
+import resource
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+from server.analysis.anomaly_scorer import AnomalyScorer
+from server.analysis.baseline_engine import BaselineIndex
+from server.analysis.behaviour_logs import BehaviourAggregator
+from server.detection.gate import DuplicateGate
+from server.detection.pipeline import HeuristicBackend, set_backend
+from server.detection.worker import process_detection_batch
+from server.monitoring.metrics import stage_timer
+from server.storage import db as storage_db
+from server.storage import wakeup as storage_wakeup
+
+RESULTS_DIR = Path("bench/results")
+# Compared by --compare; for latencies and RSS lower is better.
+HEADLINE_KEYS = (
+    "uploads_per_second",
+    "jobs_per_second",
+    "sqlite_commits_per_second",
+    "upload_latency_p50_ms",
+    "upload_latency_p99_ms",
+    "end_to_end_p50_ms",
+    "end_to_end_p99_ms",
+    "peak_rss_api_mb",
+    "peak_rss_worker_mb",
+)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def use_data_dir(data_dir: Path) -> None:
+    """Point the API, storage and wakeup sockets at a scratch directory."""
+    from server.ingestion import api as ingestion_api
+
+    ingestion_api.FRAMES_DIR = data_dir / "frames"
+    ingestion_api.FRAMES_DIR.mkdir(parents=True, exist_ok=True)
+    storage_db.DB_PATH = data_dir / "stableguard.db"
+    storage_wakeup.WAKEUP_DIR = data_dir / "run" / "wakeup"
+    storage_wakeup.FEED_DIR = data_dir / "run" / "feed"
+    storage_db.init_db()
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def _worker_main(
+    stop: multiprocessing.synchronize.Event,
+    results: multiprocessing.Queue,
+    batch_size: int,
+    change_threshold: float,
+    call_ms: float,
+    frame_ms: float,
+) -> None:
+    set_backend(HeuristicBackend(call_ms / 1000, frame_ms / 1000))
+    gate = DuplicateGate(change_threshold) if change_threshold > 0 else None
+    aggregator = BehaviourAggregator()
+    scorer = AnomalyScorer(BaselineIndex())
+    commits = stage_timer("sqlite_commit")
+    commits_before = commits.count
+    jobs = 0
+    with storage_wakeup.JobWakeup() as wakeup:
+        while True:
+            processed = process_detection_batch(
+                batch_size, gate=gate, aggregator=aggregator, scorer=scorer
+            )
+            jobs += processed
+            if processed:
+                continue
+            if stop.is_set():
+                break
+            wakeup.wait(0.05)
+    aggregator.flush(close_all=True)
+    results.put(
+        {
+            "jobs": jobs,
+            "commits": commits.count - commits_before,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+    )
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_api(port: int) -> uvicorn.Server:
+    from server.api.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def _camera(
+    index: int,
+    base_url: str,
+    cameras: int,
+    fps: float,
+    frame_bytes: int,
+    stop_at: float,
+    seed: int,
+    sent: dict[int, float],
+    latencies: list[float],
+    errors: list[str],
+) -> None:
+    rng = random.Random(seed * 1000 + index)
+    interval = 1.0 / fps
+    next_at = time.monotonic() + index * interval / cameras
+    with httpx.Client(base_url=base_url, timeout=30.0) as client:
+        while next_at < stop_at:
+            time.sleep(max(0.0, next_at - time.monotonic()))
+            next_at += interval
+            payload = b"\xff\xd8\xff" + rng.randbytes(frame_bytes - 3)
+            sent_at = time.time()
+            started = time.perf_counter()
+            response = client.post(
+                "/ingestion/frame",
+                data={"camera_id": f"bench_{index:02d}"},
+                files={"frame": ("frame.jpg", payload, "image/jpeg")},
+            )
+            if response.status_code != 200:
+                errors.append(f"{response.status_code} {response.text[:200]}")
+                continue
+            latencies.append(time.perf_counter() - started)
+            sent[response.json()["event_id"]] = sent_at
+
+
+def _end_to_end_latencies(sent: dict[int, float]) -> list[float]:
+    conn = storage_db.get_conn()
+    latencies = []
+    for event_id, updated_at in conn.execute(
+        "SELECT event_id, updated_at FROM jobs WHERE type = 'detect' AND status = 'done'"
+    ):
+        done_ms = storage_db.iso_to_epoch_ms(updated_at)
+        if event_id in sent and done_ms is not None:
+            latencies.append(done_ms / 1000 - sent[event_id])
+    return latencies
+
+
+def run(args: argparse.Namespace, data_dir: Path) -> dict:
+    use_data_dir(data_dir)
+    ctx = multiprocessing.get_context("fork")
+    stop = ctx.Event()
+    worker_results = ctx.Queue()
+    # Fork before the API starts its threads.
+    workers = [
+        ctx.Process(
+            target=_worker_main,
+            args=(
+                stop,
+                worker_results,
+                args.batch_size,
+                args.change_threshold,
+                args.call_ms,
+                args.frame_ms,
+            ),
+        )
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    port = _free_port()
+    server = _start_api(port)
+    commits = stage_timer("sqlite_commit")
+    api_commits_before = commits.count
+
+    sent: dict[int, float] = {}
+    upload_latencies: list[float] = []
+    errors: list[str] = []
+    started = time.monotonic()
+    stop_at = started + args.seconds
+    cameras = [
+        threading.Thread(
+            target=_camera,
+            args=(
+                i,
+                f"http://127.0.0.1:{port}",
+                args.cameras,
+                args.fps,
+                args.frame_kb * 1024,
+                stop_at,
+                args.seed,
+                sent,
+                upload_latencies,
+                errors,
+            ),
+        )
+        for i in range(args.cameras)
+    ]
+    for camera in cameras:
+        camera.start()
+    for camera in cameras:
+        camera.join()
+    upload_seconds = time.monotonic() - started
+    api_commits = commits.count - api_commits_before
+
+    stop.set()
+    per_worker = []
+    while len(per_worker) < len(workers):
+        try:
+            per_worker.append(worker_results.get(timeout=1.0))
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                server.should_exit = True
+                raise RuntimeError("A detection worker died; see its traceback above")
+    for worker in workers:
+        worker.join()
+    drain_seconds = time.monotonic() - started
+    server.should_exit = True
+
+    end_to_end = _end_to_end_latencies(sent)
+    jobs = sum(w["jobs"] for w in per_worker)
+    worker_commits = sum(w["commits"] for w in per_worker)
+    return {
+        "uploads": len(upload_latencies),
+        "upload_errors": len(errors),
+        "first_errors": errors[:5],
+        "jobs": jobs,
+        "upload_seconds": round(upload_seconds, 3),
+        "drain_seconds": round(drain_seconds, 3),
+        "offered_uploads_per_second": args.cameras * args.fps,
+        "uploads_per_second": round(len(upload_latencies) / upload_seconds, 2),
+        "jobs_per_second": round(jobs / drain_seconds, 2),
+        "sqlite_commits_per_second": round((api_commits + worker_commits) / drain_seconds, 2),
+        "api_commits": api_commits,
+        "worker_commits": worker_commits,
+        "upload_latency_p50_ms": round(percentile(upload_latencies, 0.50) * 1000, 2),
+        "upload_latency_p99_ms": round(percentile(upload_latencies, 0.99) * 1000, 2),
+        "end_to_end_p50_ms": round(percentile(end_to_end, 0.50) * 1000, 2),
+        "end_to_end_p99_ms": round(percentile(end_to_end, 0.99) * 1000, 2),
+        "peak_rss_api_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_worker_mb": round(max((w["peak_rss_mb"] for w in per_worker), default=0.0), 1),
+    }
+
+
+def compare(previous: dict, current: dict) -> None:
+    print(f"{'metric':<28} {'previous':>12} {'current':>12} {'change':>8}")
+    for key in HEADLINE_KEYS:
+        old, new = previous["results"].get(key), current["results"].get(key)
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{key:<28} {old:>12} {new:>12} {change:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--fps", type=float, default=2.0)
+    parser.add_argument("--frame-kb", type=int, default=120)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument(
+        "--change-threshold",
+        type=float,
+        default=0.0,
+        help="Duplicate gate threshold for the workers; off by default so every frame is detected",
+    )
+    parser.add_argument(
+        "--call-ms", type=float, default=0.0, help="Simulated cost per backend call"
+    )
+    parser.add_argument("--frame-ms", type=float, default=0.0, help="Simulated cost per frame")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--data-dir", type=Path, default=None, help="Scratch directory (default: a temp dir)"
+    )
+    parser.add_argument("--json", type=Path, default=None, help="Result file to write")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier result file")
+    args = parser.parse_args()
+    if args.workers < 1 or args.cameras < 1 or args.fps <= 0 or args.frame_kb < 1:
+        parser.error("--workers, --cameras, --fps and --frame-kb must be positive")
+
+    config = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}
+    if args.data_dir is not None:
+        args.data_dir.mkdir(parents=True, exist_ok=True)
+        results = run(args, args.data_dir)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = run(args, Path(tmp))
+
+    commit = git_commit()
+    report = {
+        "benchmark": "load",
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    print(json.dumps(results, indent=2))
+
+    output = args.json
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"load_{(commit or 'nogit')[:10]}_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Wrote {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+
+from server.analysis.baseline_engine import HOUR_MS, BaselineIndex, subject_key
+
+SEVERITIES = ("amber", "red", "critical")
+# Standard deviations above the baseline share for amber / red / critical.
+DEFAULT_THRESHOLDS = (3.0, 5.0, 8.0)
+# Behaviours that are colic signs raise an alert one severity level higher.
+COLIC_SIGNS = frozenset({"rolling", "pawing", "flank_watching"})
+# Too few detections in the hour make the observed share meaningless.
+MIN_DETECTIONS = 12
+# Floor on the spread, as a share of the hour, so a behaviour that never
+# happened at this hour needs a real excess before it alerts.
+MIN_STD_SHARE = 0.05
+
+
+@dataclass
+class Alert:
+    subject: str
+    camera_id: str
+    horse_id: int | None
+    event_id: int
+    event_ts: int
+    severity: str
+    behaviour: str
+    risk_score: float
+    observed_minutes: float
+    expected_minutes: float
+
+    def row(self) -> tuple:
+        return (
+            self.subject,
+            self.camera_id,
+            self.horse_id,
+            self.event_id,
+            self.event_ts,
+            self.severity,
+            "behaviour_anomaly",
+            self.behaviour,
+            round(self.risk_score, 3),
+            round(self.observed_minutes, 2),
+            round(self.expected_minutes, 2),
+        )
+
+
+@dataclass
+class _HourState:
+    hour_start: int
+    total: int = 0
+    counts: dict[str, int] = field(default_factory=dict)
+    # Highest severity level already raised per behaviour this hour.
+    alerted: dict[str, int] = field(default_factory=dict)
+
+
+class AnomalyScorer:
+    """Score behaviour detections against the subject's hourly baseline as they arrive.
+
+    Per subject the scorer counts detections per behaviour in the current
+    hour (O(1) per detection). A behaviour's share of the hour so far is
+    compared with its baseline share, ``mean / sum of means``, in units of
+    the baseline spread. Crossing a threshold yields an Alert; within an
+    hour each behaviour only alerts again when its severity goes up. Only
+    excess behaviour is scored here: a shortfall (e.g. not eating) can only
+    be judged once the hour is over.
+    """
+
+    def __init__(
+        self,
+        baselines: BaselineIndex,
+        thresholds: tuple[float, float, float] = DEFAULT_THRESHOLDS,
+        min_detections: int = MIN_DETECTIONS,
+        refresh_seconds: float = 300.0,
+    ):
+        self.baselines = baselines
+        self.thresholds = thresholds
+        self.min_detections = min_detections
+        self.refresh_seconds = refresh_seconds
+        self.scored = 0
+        self.alerts = 0
+        self._hours: dict[str, _HourState] = {}
+        self._refreshed_at = time.monotonic()
+
+    def _maybe_refresh(self) -> None:
+        # Baselines are recomputed once a day; picking them up is cheap.
+        if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            self.baselines.reload()
+            self._refreshed_at = time.monotonic()
+
+    def observe(
+        self,
+        camera_id: str,
+        horse_id: int | None,
+        behaviour: str,
+        event_id: int,
+        event_ts: int,
+    ) -> Alert | None:
+        subject = subject_key(horse_id, camera_id)
+        hour_start = event_ts - event_ts % HOUR_MS
+        state = self._hours.get(subject)
+        if state is None or hour_start > state.hour_start:
+            state = self._hours[subject] = _HourState(hour_start)
+        elif hour_start < state.hour_start:
+            return None  # Late frame for an hour that is already over.
+
+        state.total += 1
+        count = state.counts[behaviour] = state.counts.get(behaviour, 0) + 1
+        if state.total < self.min_detections:
+            return None
+
+        self._maybe_refresh()
+        hour_of_day = hour_start % (24 * HOUR_MS) // HOUR_MS
+        hour_total = self.baselines.hour_total(subject, hour_of_day)
+        if hour_total <= 0:
+            return None
+        baseline = self.baselines.lookup(subject, hour_of_day, behaviour)
+        mean, std = (baseline.mean_minutes, baseline.std_minutes) if baseline else (0.0, 0.0)
+
+        self.scored += 1
+        share = count / state.total
+        expected_share = mean / hour_total
+        score = (share - expected_share) / max(std / hour_total, MIN_STD_SHARE)
+        level = sum(score >= threshold for threshold in self.thresholds)
+        if level and behaviour in COLIC_SIGNS:
+            level = min(level + 1, len(SEVERITIES))
+        if level <= state.alerted.get(behaviour, 0):
+            return None
+
+        state.alerted[behaviour] = level
+        self.alerts += 1
+        return Alert(
+            subject=subject,
+            camera_id=camera_id,
+            horse_id=horse_id,
+            event_id=event_id,
+            event_ts=event_ts,
+            severity=SEVERITIES[level - 1],
+            behaviour=behaviour,
+            risk_score=score,
+            observed_minutes=share * 60,
+            expected_minutes=expected_share * 60,
+        )
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from server.storage.db import (
+    init_db,
+    iter_behaviour_windows,
+    list_baselines,
+    list_behaviour_daily,
+    replace_baselines,
+    replace_behaviour_daily,
+)
+
+BASELINE_DAYS = 7
+HOURS = 24
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+
+
+def subject_key(horse_id: int | None, camera_id: str) -> str:
+    """Baselines are per horse; until re-ID assigns one, the camera stands in for its horse."""
+    return f"horse:{horse_id}" if horse_id is not None else f"camera:{camera_id}"
+
+
+def day_start_ms(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def summarize_day(
+    day: date, chunk_size: int = 10_000, db_path: Path | None = None
+) -> list[tuple[str, int, str, float]]:
+    """Behaviour minutes per subject and UTC hour for one day of behaviour_logs.
+
+    A window's length is split between the behaviours seen in it in
+    proportion to their detection counts. Windows are loaded in chunks and
+    the split and hourly sums are done as whole-array operations. Returns
+    the non-zero cells as (subject, hour_of_day, behaviour_type, minutes).
+    """
+    day_start = day_start_ms(day)
+    subjects: list[str] = []
+    behaviours: list[str] = []
+    numeric: list[np.ndarray] = []
+    for chunk in iter_behaviour_windows(day_start, day_start + DAY_MS, chunk_size, db_path=db_path):
+        columns = list(zip(*chunk))
+        subjects.extend(columns[0])
+        behaviours.extend(columns[1])
+        numeric.append(np.array(columns[2:], dtype=np.int64))
+    if not numeric:
+        return []
+
+    starts, ends, detections = np.concatenate(numeric, axis=1)
+    subject_names, subject_idx = np.unique(np.array(subjects), return_inverse=True)
+    behaviour_names, behaviour_idx = np.unique(np.array(behaviours), return_inverse=True)
+    offsets = starts - day_start
+
+    # Share of each (subject, window) that every behaviour accounts for.
+    _, window_idx = np.unique(subject_idx * DAY_MS + offsets, return_inverse=True)
+    totals = np.bincount(window_idx, weights=detections)
+    minutes = detections / totals[window_idx] * (ends - starts) / 60_000
+
+    n_subjects, n_behaviours = len(subject_names), len(behaviour_names)
+    cells = (subject_idx * HOURS + offsets // HOUR_MS) * n_behaviours + behaviour_idx
+    grid = np.bincount(cells, weights=minutes, minlength=n_subjects * HOURS * n_behaviours)
+    nonzero = np.flatnonzero(grid)
+    s, h, b = np.unravel_index(nonzero, (n_subjects, HOURS, n_behaviours))
+    return list(
+        zip(
+            subject_names[s].tolist(),
+            h.tolist(),
+            behaviour_names[b].tolist(),
+            grid[nonzero].tolist(),
+        )
+    )
+
+
+def compute_baselines(
+    daily_rows: list[tuple], first_day: date, days: int
+) -> list[tuple[str, int, str, int, float, float]]:
+    """Per subject x hour x behaviour mean and variance of daily minutes.
+
+    ``daily_rows`` are behaviour_daily rows for ``days`` days from
+    ``first_day``. Only days on which the subject was seen in that hour
+    count as samples; on those days a behaviour that did not occur counts
+    as zero minutes.
+    """
+    if not daily_rows:
+        return []
+    subjects, day_names, hours, behaviours, minutes = zip(*daily_rows)
+    subject_names, s = np.unique(np.array(subjects), return_inverse=True)
+    behaviour_names, b = np.unique(np.array(behaviours), return_inverse=True)
+    d = (np.array(day_names, dtype="datetime64[D]") - np.datetime64(first_day, "D")).astype(
+        np.int64
+    )
+
+    grid = np.zeros((len(subject_names), days, HOURS, len(behaviour_names)))
+    grid[s, d, np.array(hours), b] = minutes
+
+    samples = (grid.sum(axis=3) > 0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = grid.sum(axis=1) / samples[..., None]
+        var = np.maximum(np.square(grid).sum(axis=1) / samples[..., None] - mean**2, 0.0)
+
+    s, h, b = np.nonzero(np.broadcast_to(samples[..., None] > 0, mean.shape))
+    return list(
+        zip(
+            subject_names[s].tolist(),
+            h.tolist(),
+            behaviour_names[b].tolist(),
+            samples[s, h].tolist(),
+            mean[s, h, b].tolist(),
+            var[s, h, b].tolist(),
+        )
+    )
+
+
+def _recompute(day: date, days: int, db_path: Path | None) -> int:
+    first_day = day - timedelta(days=days - 1)
+    history = list_behaviour_daily(first_day.isoformat(), day.isoformat(), db_path=db_path)
+    rows = compute_baselines(history, first_day, days)
+    replace_baselines(rows, day.isoformat(), db_path=db_path)
+    return len(rows)
+
+
+def update_baselines(
+    day: date, days: int = BASELINE_DAYS, db_path: Path | None = None
+) -> int:
+    """Fold one finished day into the baselines; returns the number of baseline rows.
+
+    Only ``day``'s behaviour windows are read. The rolling baseline is then
+    rebuilt from the stored per-day summaries of the last ``days`` days.
+    """
+    replace_behaviour_daily(day.isoformat(), summarize_day(day, db_path=db_path), db_path=db_path)
+    return _recompute(day, days, db_path)
+
+
+def backfill(
+    first_day: date, last_day: date, days: int = BASELINE_DAYS, db_path: Path | None = None
+) -> int:
+    """Summarise every day in [first_day, last_day], then compute baselines as of last_day."""
+    day = first_day
+    while day <= last_day:
+        replace_behaviour_daily(
+            day.isoformat(), summarize_day(day, db_path=db_path), db_path=db_path
+        )
+        day += timedelta(days=1)
+    return _recompute(last_day, days, db_path)
+
+
+@dataclass
+class Baseline:
+    days: int
+    mean_minutes: float
+    std_minutes: float
+
+
+class BaselineIndex:
+    """In-memory copy of the baselines table for constant-time lookups."""
+
+    def __init__(self, db_path: Path | None = None):
+        self.db_path = db_path
+        self._baselines: dict[tuple[str, int, str], Baseline] = {}
+        self._hour_totals: dict[tuple[str, int], float] = {}
+        self.computed_date: str | None = None
+        self.reload()
+
+    def reload(self) -> None:
+        rows = list_baselines(db_path=self.db_path)
+        self._baselines = {
+            (row["subject"], row["hour_of_day"], row["behaviour_type"]): Baseline(
+                row["days"], row["mean_minutes"], row["var_minutes"] ** 0.5
+            )
+            for row in rows
+        }
+        totals: dict[tuple[str, int], float] = {}
+        for (subject, hour, _behaviour), baseline in self._baselines.items():
+            totals[(subject, hour)] = totals.get((subject, hour), 0.0) + baseline.mean_minutes
+        self._hour_totals = totals
+        self.computed_date = rows[0]["computed_date"] if rows else None
+
+    def lookup(self, subject: str, hour_of_day: int, behaviour: str) -> Baseline | None:
+        return self._baselines.get((subject, hour_of_day, behaviour))
+
+    def hour_total(self, subject: str, hour_of_day: int) -> float:
+        """Mean observed minutes over all behaviours; 0 when there is no baseline."""
+        return self._hour_totals.get((subject, hour_of_day), 0.0)
+
+    def __len__(self) -> int:
+        return len(self._baselines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="StableGuard behaviour baselines")
+    parser.add_argument(
+        "--day",
+        type=date.fromisoformat,
+        default=None,
+        help="UTC day to fold in (default: yesterday)",
+    )
+    parser.add_argument(
+        "--backfill-days",
+        type=int,
+        default=0,
+        help="Also summarise this many days before --day first",
+    )
+    parser.add_argument("--baseline-days", type=int, default=BASELINE_DAYS)
+    args = parser.parse_args()
+
+    day = args.day or datetime.now(timezone.utc).date() - timedelta(days=1)
+    init_db()
+    started = time.perf_counter()
+    if args.backfill_days:
+        rows = backfill(day - timedelta(days=args.backfill_days), day, args.baseline_days)
+    else:
+        rows = update_baselines(day, args.baseline_days)
+    print(f"Baselines as of {day}: {rows} row(s) in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from server.storage.db import (
+    delete_behaviour_logs,
+    init_db,
+    iso_to_epoch_ms,
+    iter_detections_by_time,
+    upsert_behaviour_windows,
+)
+
+WINDOW_SECONDS = 300
+ALLOWED_LATENESS_SECONDS = 120
+# Detection types that describe what a horse is doing; object detections
+# (rugs, hay, troughs) are not behaviour.
+BEHAVIOUR_DETECTION_TYPES = frozenset({"activity"})
+
+WindowKey = tuple[str, int | None, int, str]
+
+
+@dataclass
+class _Window:
+    detections: int
+    confidence_sum: float
+    first_seen_ts: int
+    last_seen_ts: int
+
+
+@dataclass
+class AggregatorStats:
+    detections: int = 0
+    late_detections: int = 0
+    windows_flushed: int = 0
+    flushes: int = 0
+
+
+class BehaviourAggregator:
+    """Fold detections into fixed event-time windows per camera, horse and behaviour.
+
+    Open windows live in memory and each detection is one dict update. The
+    watermark trails the newest event time seen by ``allowed_lateness``; a
+    window is closed once its end passes the watermark and is written to
+    ``behaviour_logs`` with the next batch of ``flush_windows`` closed
+    windows (or on ``flush``). A detection for a window that has already
+    closed is still counted: it opens a small late window that is merged
+    into the stored row, since writes add to what is there. Windows still
+    open when the process dies are lost; ``replay`` rebuilds them.
+    """
+
+    def __init__(
+        self,
+        window_seconds: int = WINDOW_SECONDS,
+        allowed_lateness_seconds: float = ALLOWED_LATENESS_SECONDS,
+        flush_windows: int = 256,
+        db_path: Path | None = None,
+    ):
+        self.window_ms = int(window_seconds * 1000)
+        self.lateness_ms = int(allowed_lateness_seconds * 1000)
+        self.flush_windows = flush_windows
+        self.db_path = db_path
+        self.stats = AggregatorStats()
+        self.watermark: int | None = None
+        # Open windows grouped by start so closing never scans every window.
+        self._open: dict[int, dict[WindowKey, _Window]] = {}
+        self._closed: list[tuple] = []
+
+    def window_start(self, event_ts: int) -> int:
+        return event_ts - event_ts % self.window_ms
+
+    def add(
+        self,
+        camera_id: str,
+        horse_id: int | None,
+        behaviour: str,
+        confidence: float,
+        event_ts: int,
+    ) -> None:
+        start = self.window_start(event_ts)
+        key = (camera_id, horse_id, start, behaviour)
+        self.stats.detections += 1
+        if self.watermark is not None and start + self.window_ms <= self.watermark:
+            self.stats.late_detections += 1
+            self._closed.append(self._row(key, _Window(1, confidence, event_ts, event_ts)))
+        else:
+            windows = self._open.setdefault(start, {})
+            window = windows.get(key)
+            if window is None:
+                windows[key] = _Window(1, confidence, event_ts, event_ts)
+            else:
+                window.detections += 1
+                window.confidence_sum += confidence
+                window.first_seen_ts = min(window.first_seen_ts, event_ts)
+                window.last_seen_ts = max(window.last_seen_ts, event_ts)
+        self.advance(event_ts - self.lateness_ms)
+
+    def advance(self, watermark: int) -> None:
+        """Move the watermark forward (never back) and close finished windows."""
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+            for start in sorted(s for s in self._open if s + self.window_ms <= watermark):
+                for key, window in self._open.pop(start).items():
+                    self._closed.append(self._row(key, window))
+        if len(self._closed) >= self.flush_windows:
+            self.flush()
+
+    def _row(self, key: WindowKey, window: _Window) -> tuple:
+        camera_id, horse_id, start, behaviour = key
+        return (
+            camera_id,
+            horse_id,
+            behaviour,
+            start,
+            start + self.window_ms,
+            window.detections,
+            window.confidence_sum,
+            window.first_seen_ts,
+            window.last_seen_ts,
+        )
+
+    def flush(self, close_all: bool = False) -> int:
+        """Write closed windows (and, with ``close_all``, the open ones too)."""
+        if close_all:
+            for start in sorted(self._open):
+                for key, window in self._open.pop(start).items():
+                    self._closed.append(self._row(key, window))
+        if not self._closed:
+            return 0
+        batch, self._closed = self._closed, []
+        upsert_behaviour_windows(batch, db_path=self.db_path)
+        self.stats.windows_flushed += len(batch)
+        self.stats.flushes += 1
+        return len(batch)
+
+    @property
+    def open_windows(self) -> int:
+        return sum(len(windows) for windows in self._open.values())
+
+
+def replay(
+    since_ts: int,
+    until_ts: int,
+    window_seconds: int = WINDOW_SECONDS,
+    chunk_size: int = 5000,
+    db_path: Path | None = None,
+) -> AggregatorStats:
+    """Rebuild behaviour_logs for [since_ts, until_ts) from stored detections.
+
+    The range is widened to whole windows, its rows are deleted, and the
+    detections are streamed once in event-time order. Stop live workers
+    first (or replay only closed history) or their windows are counted twice.
+    """
+    window_ms = int(window_seconds * 1000)
+    since_ts -= since_ts % window_ms
+    until_ts += -until_ts % window_ms
+    delete_behaviour_logs(since_ts, until_ts, db_path=db_path)
+    aggregator = BehaviourAggregator(window_seconds, 0, db_path=db_path)
+    for row in iter_detections_by_time(since_ts, until_ts, chunk_size, db_path=db_path):
+        if row["detection_type"] in BEHAVIOUR_DETECTION_TYPES:
+            aggregator.add(
+                row["camera_id"], row["horse_id"], row["label"], row["confidence"], row["event_ts"]
+            )
+    aggregator.flush(close_all=True)
+    return aggregator.stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild StableGuard behaviour logs")
+    parser.add_argument("--since", default=None, help="ISO 8601 start (default: all history)")
+    parser.add_argument("--until", default=None, help="ISO 8601 end (default: now)")
+    parser.add_argument("--window-seconds", type=int, default=WINDOW_SECONDS)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    since_ts = iso_to_epoch_ms(args.since) if args.since else 0
+    until_ts = iso_to_epoch_ms(args.until) if args.until else int(time.time() * 1000)
+    if since_ts is None or until_ts is None:
+        parser.error("--since/--until must be ISO 8601 timestamps")
+
+    init_db()
+    started = time.perf_counter()
+    stats = replay(since_ts, until_ts, args.window_seconds, args.chunk_size)
+    print(
+        f"Replayed {stats.detections} detection(s) into {stats.windows_flushed} window(s) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+from server.storage.db import ROLLUP_RESOLUTIONS, init_db, iso_to_epoch_ms, rebuild_rollups
+
+DAY_MS = ROLLUP_RESOLUTIONS["1d"] * 1000
+
+
+def pick_resolution(since_ts: int, until_ts: int, max_points: int) -> str:
+    """The finest resolution that covers [since_ts, until_ts) in ``max_points`` buckets.
+
+    Falls back to the coarsest (daily) when even that needs more.
+    """
+    span_ms = max(until_ts - since_ts, 1)
+    for name, seconds in ROLLUP_RESOLUTIONS.items():
+        if -(-span_ms // (seconds * 1000)) <= max_points:
+            return name
+    return next(reversed(ROLLUP_RESOLUTIONS))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild StableGuard detection rollups")
+    parser.add_argument("--since", default=None, help="ISO 8601 start (default: all history)")
+    parser.add_argument("--until", default=None, help="ISO 8601 end (default: now)")
+    args = parser.parse_args()
+
+    since_ts = iso_to_epoch_ms(args.since) if args.since else 0
+    until_ts = iso_to_epoch_ms(args.until) if args.until else int(time.time() * 1000)
+    if since_ts is None or until_ts is None:
+        parser.error("--since/--until must be ISO 8601 timestamps")
+    # Whole days, so every resolution's buckets are recounted completely.
+    since_ts -= since_ts % DAY_MS
+    until_ts += -until_ts % DAY_MS
+
+    init_db()
+    started = time.perf_counter()
+    rows = rebuild_rollups(since_ts, until_ts)
+    print(f"Rebuilt {rows} rollup row(s) in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
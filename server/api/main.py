@@ -1,9 +1,30 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from server.api.metrics import router as metrics_router
+from server.api.query import router as query_router
+from server.api.websocket import router as live_router
 from server.ingestion.api import router as ingestion_router
+from server.monitoring.queue import register_queue_collector
+from server.storage import async_db
+from server.storage.db import init_db
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    init_db()
+    register_queue_collector()
+    yield
+    # Drain queued writes before the process exits.
+    async_db.shutdown()
+
 
-app = FastAPI(title="StableGuard API", version="0.1.0")
+app = FastAPI(title="StableGuard API", version="0.1.0", lifespan=lifespan)
 app.include_router(ingestion_router)
+app.include_router(query_router)
+app.include_router(live_router)
+app.include_router(metrics_router)
 
 
 @app.get("/health")
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from server.monitoring.metrics import REGISTRY
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of this API process's metrics and the job queue.
+
+    Worker processes keep their own metrics and print them periodically.
+    """
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
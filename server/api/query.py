@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import heapq
+import json
+import time
+from collections.abc import Iterator
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+
+from server.analysis.rollups import pick_resolution
+from server.storage import async_db
+from server.storage.archive import (
+    archive_months,
+    archive_path,
+    list_with_archive,
+    migrate_archive,
+    month_bounds_ms,
+)
+from server.storage.db import (
+    ROLLUP_RESOLUTIONS,
+    iso_to_epoch_ms,
+    iter_detections_json,
+    list_detections,
+    list_events,
+    open_conn,
+)
+
+router = APIRouter(tags=["query"])
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_TIMELINE_SECONDS = 24 * 3600
+DEFAULT_TIMELINE_POINTS = 300
+MAX_TIMELINE_POINTS = 5000
+
+
+def encode_cursor(event_ts: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{event_ts}:{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> tuple[int, int] | None:
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        event_ts, row_id = raw.split(":")
+        return int(event_ts), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def _time_bound(value: str | None, name: str) -> int | None:
+    if value is None:
+        return None
+    epoch_ms = iso_to_epoch_ms(value)
+    if epoch_ms is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected ISO 8601")
+    return epoch_ms
+
+
+def _page(rows: list, limit: int) -> str | None:
+    # A short page is the last one; otherwise the last row is the cursor.
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1]["event_ts"], rows[-1]["id"])
+
+
+@router.get("/events")
+async def query_events(
+    camera_id: str | None = None,
+    since: str | None = Query(None, description="Inclusive lower bound, ISO 8601"),
+    until: str | None = Query(None, description="Exclusive upper bound, ISO 8601"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> dict:
+    """Events newest first; pass ``next_cursor`` back as ``cursor`` for the next page.
+
+    Ranges that reach back past compaction are read from the monthly archives too.
+    """
+    rows = await async_db.read(
+        list_with_archive,
+        list_events,
+        camera_id=camera_id,
+        since_ts=_time_bound(since, "since"),
+        until_ts=_time_bound(until, "until"),
+        before=decode_cursor(cursor),
+        limit=limit,
+    )
+    return {"events": [dict(row) for row in rows], "next_cursor": _page(rows, limit)}
+
+
+@router.get("/detections")
+async def query_detections(
+    camera_id: str | None = None,
+    label: str | None = None,
+    horse_id: int | None = None,
+    since: str | None = Query(None, description="Inclusive lower bound, ISO 8601"),
+    until: str | None = Query(None, description="Exclusive upper bound, ISO 8601"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Response:
+    """Detections newest first by event time, paged like ``GET /events``.
+
+    Each detection is serialised by SQLite and spliced into the body as is.
+    """
+    rows = await async_db.read(
+        list_with_archive,
+        list_detections,
+        camera_id=camera_id,
+        label=label,
+        horse_id=horse_id,
+        since_ts=_time_bound(since, "since"),
+        until_ts=_time_bound(until, "until"),
+        before=decode_cursor(cursor),
+        limit=limit,
+        as_json=True,
+    )
+    body = (
+        '{"detections":['
+        + ",".join(row["json"] for row in rows)
+        + '],"next_cursor":'
+        + json.dumps(_page(rows, limit))
+        + "}"
+    )
+    return Response(body, media_type="application/json")
+
+
+def _export_rows(since_ts: int | None, until_ts: int | None, **filters) -> Iterator[bytes]:
+    # Starlette pulls from this in worker threads, one chunk at a time, so
+    # it uses its own connections rather than a thread's pooled one.
+    conns = [open_conn()]
+    for month in archive_months():
+        start, end = month_bounds_ms(month)
+        if (until_ts is None or start < until_ts) and (since_ts is None or end > since_ts):
+            migrate_archive(archive_path(month))
+            conns.append(open_conn(archive_path(month)))
+    try:
+        # Every partition is already in (event_ts, id) order; merging keeps
+        # it, and a row caught mid-compaction comes out of the hot database
+        # first and its archive copy right after it.
+        merged = heapq.merge(
+            *(
+                iter_detections_json(since_ts=since_ts, until_ts=until_ts, conn=conn, **filters)
+                for conn in conns
+            ),
+            key=lambda row: (row["event_ts"], row["id"]),
+        )
+        last_id = None
+        for row in merged:
+            if row["id"] != last_id:
+                last_id = row["id"]
+                yield (row["json"] + "\n").encode()
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+@router.get("/detections/export")
+def export_detections(
+    camera_id: str | None = None,
+    label: str | None = None,
+    horse_id: int | None = None,
+    since: str | None = Query(None, description="Inclusive lower bound, ISO 8601"),
+    until: str | None = Query(None, description="Exclusive upper bound, ISO 8601"),
+) -> StreamingResponse:
+    """Every matching detection as NDJSON, oldest first, including archived months."""
+    rows = _export_rows(
+        _time_bound(since, "since"),
+        _time_bound(until, "until"),
+        camera_id=camera_id,
+        label=label,
+        horse_id=horse_id,
+    )
+    return StreamingResponse(rows, media_type="application/x-ndjson")
+
+
+@router.get("/timeline")
+async def query_timeline(
+    camera_id: str | None = None,
+    horse_id: int | None = None,
+    label: str | None = None,
+    since: str | None = Query(None, description="Inclusive lower bound, ISO 8601"),
+    until: str | None = Query(None, description="Exclusive upper bound, ISO 8601"),
+    points: int = Query(DEFAULT_TIMELINE_POINTS, ge=1, le=MAX_TIMELINE_POINTS),
+    resolution: str | None = Query(None, description="1m, 1h or 1d; picked from points if unset"),
+) -> dict:
+    """Detection counts per time bucket and label, read from the rollup tables.
+
+    Without ``resolution`` the finest bucket width that keeps the range within
+    ``points`` buckets is used. The range defaults to the last 24 hours and is
+    widened to whole buckets; buckets without detections are left out.
+    """
+    until_ts = _time_bound(until, "until")
+    until_ts = until_ts if until_ts is not None else int(time.time() * 1000)
+    since_ts = _time_bound(since, "since")
+    if since_ts is None:
+        since_ts = until_ts - DEFAULT_TIMELINE_SECONDS * 1000
+    if since_ts >= until_ts:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if resolution is None:
+        resolution = pick_resolution(since_ts, until_ts, points)
+    elif resolution not in ROLLUP_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Invalid resolution: expected 1m, 1h or 1d")
+
+    bucket_ms = ROLLUP_RESOLUTIONS[resolution] * 1000
+    since_ts -= since_ts % bucket_ms
+    until_ts += -until_ts % bucket_ms
+    rows = await async_db.list_timeline(
+        ROLLUP_RESOLUTIONS[resolution],
+        since_ts,
+        until_ts,
+        camera_id=camera_id,
+        horse_id=horse_id,
+        label=label,
+    )
+    return {
+        "resolution": resolution,
+        "bucket_ms": bucket_ms,
+        "since_ts": since_ts,
+        "until_ts": until_ts,
+        "buckets": [
+            {
+                "bucket_ts": row["bucket_ts"],
+                "label": row["label"],
+                "detections": row["detections"],
+                "confidence": row["confidence_sum"] / row["detections"],
+            }
+            for row in rows
+        ],
+    }
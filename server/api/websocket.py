@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from server.analysis.anomaly_scorer import SEVERITIES
+from server.storage.db import (
+    detection_to_dict,
+    latest_feed_ids,
+    list_alerts_after,
+    list_detections_after,
+    open_conn,
+)
+from server.storage.wakeup import feed_listener
+
+router = APIRouter(tags=["live"])
+
+MESSAGE_TYPES = ("detection", "alert")
+# Messages buffered per client before its detections are coalesced away.
+MAX_PENDING = 256
+FEED_BATCH = 500
+# Workers signal the feed after every commit; this is only the fallback.
+FEED_POLL_SECONDS = 1.0
+
+
+@dataclass
+class FeedMessage:
+    type: str
+    camera_id: str | None
+    horse_id: int | None
+    severity: int
+    # Serialised once and shared by every subscriber.
+    text: str
+
+
+def _detection_message(row: sqlite3.Row) -> FeedMessage:
+    data = detection_to_dict(row)
+    return FeedMessage(
+        "detection",
+        row["camera_id"],
+        row["horse_id"],
+        0,
+        json.dumps({"type": "detection", "data": data}, separators=(",", ":")),
+    )
+
+
+def _alert_message(row: sqlite3.Row) -> FeedMessage:
+    return FeedMessage(
+        "alert",
+        row["camera_id"],
+        row["horse_id"],
+        SEVERITIES.index(row["severity"]) + 1 if row["severity"] in SEVERITIES else 0,
+        json.dumps({"type": "alert", "data": dict(row)}, separators=(",", ":")),
+    )
+
+
+class Subscriber:
+    """One client's filter and send buffer.
+
+    ``push`` never blocks. When a client falls more than ``max_pending``
+    messages behind, its buffered detections are dropped and it is sent a
+    ``gap`` notice with the count (it can backfill from ``GET /detections``).
+    Alerts are never dropped; a client that cannot keep up with alerts alone
+    is disconnected.
+    """
+
+    def __init__(
+        self,
+        camera_id: str | None = None,
+        horse_id: int | None = None,
+        types: frozenset[str] = frozenset(MESSAGE_TYPES),
+        min_severity: int = 1,
+        max_pending: int = MAX_PENDING,
+    ):
+        self.camera_id = camera_id
+        self.horse_id = horse_id
+        self.types = types
+        self.min_severity = min_severity
+        self.max_pending = max_pending
+        self.pending: deque[FeedMessage] = deque()
+        self.dropped = 0
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def wants(self, message: FeedMessage) -> bool:
+        if message.type not in self.types:
+            return False
+        if self.camera_id is not None and message.camera_id != self.camera_id:
+            return False
+        if self.horse_id is not None and message.horse_id != self.horse_id:
+            return False
+        return message.type != "alert" or message.severity >= self.min_severity
+
+    def push(self, message: FeedMessage) -> None:
+        self.pending.append(message)
+        if len(self.pending) <= self.max_pending:
+            return
+        alerts = deque(m for m in self.pending if m.type == "alert")
+        self.dropped += len(self.pending) - len(alerts)
+        self.pending = alerts
+        if len(alerts) > self.max_pending:
+            self.overflowed = True
+
+
+class LiveHub:
+    """Fan committed detections and alerts out to WebSocket subscribers.
+
+    While anyone is subscribed, one feed thread tails both tables by primary
+    key (woken by workers through the feed socket) and hands each batch to
+    the event loop, which appends it to every matching subscriber's buffer.
+    The database is read once per batch however many clients there are.
+    """
+
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._stop: threading.Event | None = None
+        self._names = itertools.count()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.add(subscriber)
+        if self._stop is None:
+            self._start_feed(asyncio.get_running_loop())
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        if not self._subscribers and self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def publish(self, messages: list[FeedMessage]) -> None:
+        for subscriber in self._subscribers:
+            wanted = False
+            for message in messages:
+                if subscriber.wants(message):
+                    subscriber.push(message)
+                    wanted = True
+            if wanted:
+                subscriber.ready.set()
+
+    def _start_feed(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Start from what is committed now, so a new subscriber sees
+        # everything after it connected and no history.
+        conn = open_conn()
+        after = latest_feed_ids(conn=conn)
+        self._stop = threading.Event()
+        threading.Thread(
+            target=self._feed,
+            args=(loop, conn, after, self._stop, f"feed-{os.getpid()}-{next(self._names)}"),
+            daemon=True,
+        ).start()
+
+    def _feed(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        conn: sqlite3.Connection,
+        after: tuple[int, int],
+        stop: threading.Event,
+        name: str,
+    ) -> None:
+        # SQLite runs one write transaction at a time, so ids become visible
+        # in order and tailing by id cannot skip a row.
+        last_detection, last_alert = after
+        listener = feed_listener(name)
+        try:
+            while not stop.is_set():
+                detections = list_detections_after(last_detection, FEED_BATCH, conn=conn)
+                alerts = list_alerts_after(last_alert, FEED_BATCH, conn=conn)
+                if detections:
+                    last_detection = detections[-1]["id"]
+                if alerts:
+                    last_alert = alerts[-1]["id"]
+                messages = [_alert_message(row) for row in alerts]
+                messages += [_detection_message(row) for row in detections]
+                if messages:
+                    loop.call_soon_threadsafe(self.publish, messages)
+                if len(detections) < FEED_BATCH and len(alerts) < FEED_BATCH:
+                    listener.wait(FEED_POLL_SECONDS)
+        except RuntimeError:
+            pass  # Event loop closed under us.
+        finally:
+            listener.close()
+            conn.close()
+
+
+hub = LiveHub()
+
+
+async def _send_loop(websocket: WebSocket, subscriber: Subscriber) -> None:
+    while True:
+        await subscriber.ready.wait()
+        subscriber.ready.clear()
+        if subscriber.overflowed:
+            await websocket.close(code=1013, reason="Too far behind")
+            return
+        if subscriber.dropped:
+            dropped, subscriber.dropped = subscriber.dropped, 0
+            await websocket.send_text(json.dumps({"type": "gap", "dropped": dropped}))
+        while subscriber.pending:
+            await websocket.send_text(subscriber.pending.popleft().text)
+
+
+async def _receive_loop(websocket: WebSocket) -> None:
+    # Clients don't need to send anything; reading notices disconnects.
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/ws/live")
+async def live_feed(
+    websocket: WebSocket,
+    camera_id: str | None = None,
+    horse_id: int | None = None,
+    types: str = ",".join(MESSAGE_TYPES),
+    min_severity: str = SEVERITIES[0],
+) -> None:
+    """Push new detections and alerts as JSON messages ``{"type", "data"}``.
+
+    Filter with ``camera_id``, ``horse_id``, ``types`` (comma-separated
+    ``detection``/``alert``) and ``min_severity`` for alerts.
+    """
+    wanted = frozenset(t.strip() for t in types.split(",") if t.strip())
+    if not wanted or not wanted <= set(MESSAGE_TYPES) or min_severity not in SEVERITIES:
+        await websocket.close(code=1008, reason="Invalid subscription")
+        return
+
+    await websocket.accept()
+    subscriber = Subscriber(camera_id, horse_id, wanted, SEVERITIES.index(min_severity) + 1)
+    hub.subscribe(subscriber)
+    tasks = [
+        asyncio.create_task(_send_loop(websocket, subscriber)),
+        asyncio.create_task(_receive_loop(websocket)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        hub.unsubscribe(subscriber)
+        for task in tasks:
+            task.cancel()
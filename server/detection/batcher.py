@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from server.detection.pipeline import DetectionRecord, DetectorBackend, FrameInput
+
+
+@dataclass
+class BatcherStats:
+    batches: int = 0
+    frames: int = 0
+    busy_seconds: float = 0.0
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=10_000))
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def pct(q: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "mean_batch_size": self.frames / self.batches if self.batches else 0.0,
+            "frames_per_busy_second": self.frames / self.busy_seconds if self.busy_seconds else 0.0,
+            "latency_p50_ms": pct(0.50) * 1000,
+            "latency_p99_ms": pct(0.99) * 1000,
+        }
+
+
+@dataclass
+class _Pending:
+    frame: FrameInput
+    future: Future
+    submitted_at: float
+
+
+class MicroBatcher(DetectorBackend):
+    """Collect frames from many producers into batched backend calls.
+
+    A batch is dispatched when ``max_batch_size`` frames are waiting or when
+    the oldest waiting frame has waited ``max_wait_seconds``, whichever comes
+    first. Larger batches amortise the backend's per-call cost; the deadline
+    bounds the latency added while a batch fills. Results are delivered
+    through the Future returned by ``submit``. The worker runs inference
+    through it as a backend (``detect_batch``); there it has one producer, so
+    it only splits each claimed batch into calls of ``max_batch_size``.
+    """
+
+    def __init__(
+        self,
+        backend: DetectorBackend,
+        max_batch_size: int = 16,
+        max_wait_seconds: float = 0.02,
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.stats = BatcherStats()
+        self._queue: list[_Pending] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def version(self) -> str:
+        return self.backend.version
+
+    def submit(self, frame: FrameInput) -> Future:
+        return self.submit_many([frame])[0]
+
+    def submit_many(self, frames: Sequence[FrameInput]) -> list[Future]:
+        """Queue frames together, so they aren't split by an early dispatch."""
+        now = time.monotonic()
+        pending = [_Pending(frame, Future(), now) for frame in frames]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.extend(pending)
+            self._cond.notify()
+        return [item.future for item in pending]
+
+    def detect(self, frame: FrameInput) -> list[DetectionRecord]:
+        return self.submit(frame).result()
+
+    def detect_batch(self, frames: Sequence[FrameInput]) -> list[list[DetectionRecord]]:
+        """Run ``frames`` through the batcher; raises the first batch's error."""
+        return [future.result() for future in self.submit_many(frames)]
+
+    def _next_batch(self) -> list[_Pending]:
+        with self._cond:
+            while True:
+                if self._queue:
+                    deadline = self._queue[0].submitted_at + self.max_wait_seconds
+                    remaining = deadline - time.monotonic()
+                    if len(self._queue) >= self.max_batch_size or remaining <= 0 or self._closed:
+                        batch = self._queue[: self.max_batch_size]
+                        del self._queue[: self.max_batch_size]
+                        return batch
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return []
+                else:
+                    self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.monotonic()
+            try:
+                outputs = self.backend.detect_batch([item.frame for item in batch])
+                if len(outputs) != len(batch):
+                    raise RuntimeError(
+                        f"Backend returned {len(outputs)} results for {len(batch)} frames"
+                    )
+            except Exception as exc:
+                for item in batch:
+                    item.future.set_exception(exc)
+                continue
+            finished = time.monotonic()
+            self.stats.batches += 1
+            self.stats.frames += len(batch)
+            self.stats.busy_seconds += finished - started
+            for item, detections in zip(batch, outputs):
+                self.stats.latencies.append(finished - item.submitted_at)
+                item.future.set_result(detections)
+
+    def close(self) -> None:
+        """Flush whatever is queued, then stop the dispatch thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
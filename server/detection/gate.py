@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow no frame is decodable and all go to detection.
+    Image = None
+
+DEFAULT_CHANGE_THRESHOLD = 0.02
+DEFAULT_SIGNATURE_SIZE = 16
+DEFAULT_MAX_CARRIED = 50
+
+
+def _block_means(image: np.ndarray, size: int) -> np.ndarray:
+    # Crop to a multiple of ``size`` and average each block in one reshape.
+    height, width = image.shape
+    bh, bw = max(height // size, 1), max(width // size, 1)
+    if height < size or width < size:
+        image = np.resize(image, (bh * size, bw * size))
+    blocks = image[: bh * size, : bw * size].reshape(size, bh, size, bw)
+    return blocks.mean(axis=(1, 3), dtype=np.float32).ravel()
+
+
+def frame_signature(path: Path, size: int = DEFAULT_SIGNATURE_SIZE) -> np.ndarray | None:
+    """Downsampled ``size`` x ``size`` grayscale signature of a frame, in [0, 1].
+
+    Frames are decoded with Pillow (JPEG decoding is asked to scale down
+    while decoding). Returns None when the frame can't be decoded, or Pillow
+    is missing: a signature of the compressed bytes says nothing about the
+    scene, so such frames must go to detection. Read errors are raised.
+    """
+    with path.open("rb") as source:
+        if Image is None:
+            return None
+        try:
+            with Image.open(source) as img:
+                img.draft("L", (size * 8, size * 8))
+                gray = np.asarray(img.convert("L"), dtype=np.uint8)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+    return _block_means(gray, size) / 255.0
+
+
+def frame_change(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference between two signatures (0 = identical)."""
+    return float(np.abs(a - b).mean())
+
+
+@dataclass
+class GateStats:
+    frames_checked: int = 0
+    frames_carried: int = 0
+    frames_undecodable: int = 0
+    signature_errors: int = 0
+    signature_seconds: float = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "frames_checked": self.frames_checked,
+            "frames_carried": self.frames_carried,
+            "frames_detected": self.frames_checked - self.frames_carried,
+            "detection_saved_ratio": (
+                self.frames_carried / self.frames_checked if self.frames_checked else 0.0
+            ),
+            "frames_undecodable": self.frames_undecodable,
+            "signature_errors": self.signature_errors,
+            "signature_ms_per_frame": (
+                self.signature_seconds / self.frames_checked * 1000 if self.frames_checked else 0.0
+            ),
+        }
+
+
+@dataclass
+class _CameraState:
+    signature: np.ndarray
+    event_id: int
+    detections: list[dict] | None
+    carried: int = 0
+
+
+@dataclass
+class GateDecision:
+    # Event whose detections this frame reuses; None means run detection.
+    reference_event_id: int | None
+    change: float | None
+    # The reference's detections, or None while its own batch is still running.
+    detections: list[dict] | None = None
+
+
+class DuplicateGate:
+    """Skip detection for frames that barely differ from the camera's last one.
+
+    Per camera the gate keeps the signature and detections of the last frame
+    that actually went through detection. A frame whose signature differs
+    from it by less than ``threshold`` reuses those detections (marked as
+    carried forward) instead of running the pipeline. After ``max_carried``
+    consecutive carried frames the next frame is detected again, so a slowly
+    drifting scene is re-anchored. State lives in the worker process.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_CHANGE_THRESHOLD,
+        signature_size: int = DEFAULT_SIGNATURE_SIZE,
+        max_carried: int = DEFAULT_MAX_CARRIED,
+    ):
+        self.threshold = threshold
+        self.signature_size = signature_size
+        self.max_carried = max_carried
+        self.stats = GateStats()
+        self._cameras: dict[str, _CameraState] = {}
+
+    def check(self, camera_id: str, frame_path: Path) -> tuple[GateDecision, np.ndarray | None]:
+        """Compare a frame with the camera's reference frame.
+
+        Returns the decision and the frame's signature (None if the frame
+        could not be read or decoded, which always means detection); a
+        frame that goes to detection should be passed to ``record`` so it
+        becomes the new reference.
+        """
+        started = time.perf_counter()
+        try:
+            signature = frame_signature(frame_path, self.signature_size)
+        except OSError:
+            self.stats.signature_errors += 1
+            return GateDecision(None, None), None
+        finally:
+            self.stats.signature_seconds += time.perf_counter() - started
+        self.stats.frames_checked += 1
+        if signature is None:
+            self.stats.frames_undecodable += 1
+            return GateDecision(None, None), None
+
+        state = self._cameras.get(camera_id)
+        if state is None or state.carried >= self.max_carried:
+            return GateDecision(None, None), signature
+        change = frame_change(signature, state.signature)
+        if change >= self.threshold:
+            return GateDecision(None, change), signature
+        state.carried += 1
+        self.stats.frames_carried += 1
+        return GateDecision(state.event_id, change, state.detections), signature
+
+    def record(
+        self,
+        camera_id: str,
+        signature: np.ndarray,
+        event_id: int,
+        detections: list[dict] | None = None,
+    ) -> None:
+        """Make a detected frame the camera's new reference.
+
+        ``detections`` may be filled in later via ``set_detections`` when the
+        frame is still waiting for its batch to run.
+        """
+        self._cameras[camera_id] = _CameraState(signature, event_id, detections)
+
+    def set_detections(self, camera_id: str, event_id: int, detections: list[dict]) -> None:
+        state = self._cameras.get(camera_id)
+        if state is not None and state.event_id == event_id:
+            state.detections = detections
+
+    def forget(self, camera_id: str, event_id: int) -> None:
+        """Drop a reference whose detection failed."""
+        state = self._cameras.get(camera_id)
+        if state is not None and state.event_id == event_id:
+            del self._cameras[camera_id]
@@ -1,8 +1,22 @@
 from __future__ import annotations
 
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
 from dataclasses import dataclass
 from pathlib import Path
 
+from server.monitoring.metrics import REGISTRY, stage_timer
+
+# Bump whenever detection output changes; cached results from other versions
+# are ignored and frames are re-run.
+PIPELINE_VERSION = "v0"
+
+_DETECTION = stage_timer("detection")
+_FRAMES_DETECTED = REGISTRY.counter(
+    "stableguard_frames_detected_total", "Frames passed to the detector backend"
+).labels()
+
 
 @dataclass
 class DetectionRecord:
@@ -13,6 +27,26 @@ class DetectionRecord:
     features: dict
 
 
+@dataclass
+class FrameInput:
+    path: Path
+    size_bytes: int
+
+
+class DetectorBackend(ABC):
+    """A detection model that is called with a whole batch of frames at once.
+
+    ``version`` feeds the detection cache key, so it must change whenever the
+    backend's output for the same frame can change.
+    """
+
+    version: str = PIPELINE_VERSION
+
+    @abstractmethod
+    def detect_batch(self, frames: Sequence[FrameInput]) -> list[list[DetectionRecord]]:
+        """Return one list of detections per input frame, in input order."""
+
+
 def _infer_activity_from_frame_size(size_bytes: int) -> tuple[str, float]:
     # Placeholder heuristic for MVP wiring. Replace with model inference later.
     idx = size_bytes % 3
@@ -23,24 +57,105 @@ def _infer_activity_from_frame_size(size_bytes: int) -> tuple[str, float]:
     return "eating", 0.66
 
 
-def run_detection_pipeline(frame_path: Path) -> list[DetectionRecord]:
+class HeuristicBackend(DetectorBackend):
+    """Deterministic CPU-only stand-in for a real model.
+
+    ``batch_overhead_seconds`` and ``per_frame_seconds`` optionally simulate
+    the cost shape of batched inference (fixed cost per call plus a smaller
+    per-frame cost) for tests and benchmarks.
+    """
+
+    def __init__(self, batch_overhead_seconds: float = 0.0, per_frame_seconds: float = 0.0):
+        self.batch_overhead_seconds = batch_overhead_seconds
+        self.per_frame_seconds = per_frame_seconds
+        self.calls = 0
+
+    def detect_batch(self, frames: Sequence[FrameInput]) -> list[list[DetectionRecord]]:
+        self.calls += 1
+        cost = self.batch_overhead_seconds + self.per_frame_seconds * len(frames)
+        if cost > 0:
+            time.sleep(cost)
+        return [self._detect(frame) for frame in frames]
+
+    def _detect(self, frame: FrameInput) -> list[DetectionRecord]:
+        if frame.size_bytes == 0:
+            return []
+        activity_label, confidence = _infer_activity_from_frame_size(frame.size_bytes)
+        return [
+            DetectionRecord(
+                detection_type="activity",
+                label=activity_label,
+                confidence=confidence,
+                horse_id=None,
+                features={
+                    "frame_size_bytes": frame.size_bytes,
+                    "pipeline_version": self.version,
+                },
+            )
+        ]
+
+
+_backend: DetectorBackend = HeuristicBackend()
+
+
+def get_backend() -> DetectorBackend:
+    return _backend
+
+
+def set_backend(backend: DetectorBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def pipeline_version() -> str:
+    return _backend.version
+
+
+def load_frame(frame_path: Path) -> FrameInput:
     if not frame_path.exists():
         raise FileNotFoundError(f"Frame not found: {frame_path}")
+    return FrameInput(path=frame_path, size_bytes=frame_path.stat().st_size)
+
+
+def run_detection_pipeline_batch(
+    frame_paths: Sequence[Path],
+    backend: DetectorBackend | None = None,
+) -> list[list[DetectionRecord] | Exception]:
+    """Run ``backend`` (default: the active one) once over every loadable frame.
 
-    size_bytes = frame_path.stat().st_size
-    if size_bytes == 0:
-        return []
-
-    activity_label, confidence = _infer_activity_from_frame_size(size_bytes)
-    return [
-        DetectionRecord(
-            detection_type="activity",
-            label=activity_label,
-            confidence=confidence,
-            horse_id=None,
-            features={
-                "frame_size_bytes": size_bytes,
-                "pipeline_version": "v0",
-            },
-        )
-    ]
+    Frames that cannot be loaded get their exception in place of a result;
+    the rest go to the backend in a single ``detect_batch`` call.
+    """
+    backend = backend or _backend
+    results: list[list[DetectionRecord] | Exception] = []
+    loaded: list[tuple[int, FrameInput]] = []
+    for i, frame_path in enumerate(frame_paths):
+        try:
+            loaded.append((i, load_frame(frame_path)))
+            results.append([])
+        except OSError as exc:
+            results.append(exc)
+
+    if loaded:
+        _FRAMES_DETECTED.inc(len(loaded))
+        try:
+            with _DETECTION.time():
+                outputs = backend.detect_batch([frame for _, frame in loaded])
+            if len(outputs) != len(loaded):
+                raise RuntimeError(
+                    f"Backend returned {len(outputs)} results for {len(loaded)} frames"
+                )
+        except Exception as exc:
+            for i, _ in loaded:
+                results[i] = exc
+        else:
+            for (i, _), detections in zip(loaded, outputs):
+                results[i] = detections
+    return results
+
+
+def run_detection_pipeline(frame_path: Path) -> list[DetectionRecord]:
+    result = run_detection_pipeline_batch([frame_path])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
@@ -1,52 +1,512 @@
 from __future__ import annotations
 
 import argparse
+import multiprocessing
+import signal
+import threading
 import time
+from dataclasses import asdict
 from pathlib import Path
 
-from server.detection.pipeline import run_detection_pipeline
+from server.analysis.anomaly_scorer import AnomalyScorer
+from server.analysis.baseline_engine import BaselineIndex
+from server.analysis.behaviour_logs import BEHAVIOUR_DETECTION_TYPES, BehaviourAggregator
+from server.detection.batcher import MicroBatcher
+from server.detection.gate import DEFAULT_CHANGE_THRESHOLD, DuplicateGate, GateDecision
+from server.detection.pipeline import (
+    DetectionRecord,
+    DetectorBackend,
+    get_backend,
+    run_detection_pipeline_batch,
+)
+from server.monitoring.metrics import REGISTRY, PeriodicDump, stage_timer
+from server.monitoring.queue import register_queue_collector
 from server.storage.db import (
-    claim_pending_job,
-    get_event,
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_MAX_ATTEMPTS,
+    claim_pending_jobs_with_events,
+    default_worker_id,
+    get_cached_detections,
     init_db,
-    insert_detection,
-    mark_event_status,
-    mark_job_done,
-    mark_job_failed,
+    insert_alerts,
+    insert_detections,
+    iso_to_epoch_ms,
+    mark_events_status,
+    mark_jobs_done,
+    mark_jobs_failed,
+    open_conn,
+    pin_frame_blobs,
+    release_worker_leases,
+    renew_job_leases,
+    store_cached_detections,
+    transaction,
+    worker_id_for_pid,
+)
+from server.storage.wakeup import JobWakeup, notify_feed
+
+# Print this process's metrics this often when running as a CLI worker.
+DEFAULT_METRICS_SECONDS = 60.0
+# Frames per backend call; claims bigger than this are split into several.
+# The worker's claim loop is the batcher's only producer and waits for its
+# results, so frames are grouped within one claim, never across claims, and
+# a partial call is dispatched at once.
+DEFAULT_INFERENCE_BATCH_SIZE = 16
+
+_CLAIM = stage_timer("claim")
+_GATE = stage_timer("gate")
+_SCORING = stage_timer("scoring")
+_RESULT_COMMIT = stage_timer("result_commit")
+_BATCH = stage_timer("batch")
+_JOB_AGE = REGISTRY.histogram(
+    "stableguard_job_age_at_claim_seconds",
+    "Time from a job being queued to a worker claiming it",
+).labels()
+_JOBS = REGISTRY.counter("stableguard_jobs_total", "Jobs finished by workers", ("outcome",))
+_FRAMES = REGISTRY.counter(
+    "stableguard_worker_frames_total",
+    "Frames processed by workers, by where their detections came from",
+    ("source",),
 )
+_ALERTS = REGISTRY.counter("stableguard_alerts_total", "Alerts raised", ("severity",))
+
+
+class LeaseHeartbeat:
+    """Keep extending the leases on claimed jobs while they are being processed.
+
+    The thread lives for one batch, so it uses its own connection rather than
+    a pooled per-thread one, and closes it on exit.
+    """
+
+    def __init__(self, job_ids: list[int], worker_id: str, lease_seconds: float):
+        self.job_ids = job_ids
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        interval = max(self.lease_seconds / 3, 0.05)
+        conn = None
+        try:
+            while not self._stop.wait(interval):
+                # Opened on the first renewal; most batches finish before one is due.
+                conn = conn or open_conn()
+                renew_job_leases(self.job_ids, self.worker_id, self.lease_seconds, conn=conn)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def __enter__(self) -> LeaseHeartbeat:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def process_detection_batch(
+    batch_size: int = 1,
+    worker_id: str | None = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    gate: DuplicateGate | None = None,
+    aggregator: BehaviourAggregator | None = None,
+    scorer: AnomalyScorer | None = None,
+    supersede_after_seconds: float | None = None,
+    detector: DetectorBackend | None = None,
+) -> int:
+    """Claim up to ``batch_size`` detect jobs and process them.
+
+    Claiming is one transaction and all results (detections, event statuses,
+    job completions) are written in a second one. With a ``gate``, frames
+    that barely differ from their camera's previous frame reuse its
+    detections; with an ``aggregator``, committed behaviour detections are
+    folded into its windows; with a ``scorer``, alerts it raises are written
+    with the detections. With ``supersede_after_seconds``, a camera that is
+    that far behind has only its newest frame processed (see
+    ``claim_pending_jobs_with_events``). Inference runs on ``detector``
+    (default: the active backend), normally the worker's ``MicroBatcher``.
+    Returns the number of jobs claimed.
+    The caller initializes the database once beforehand (``init_db``).
+    """
+    worker_id = worker_id or default_worker_id()
+    with _CLAIM.time():
+        jobs = claim_pending_jobs_with_events(
+            "detect",
+            batch_size,
+            worker_id=worker_id,
+            lease_seconds=lease_seconds,
+            max_attempts=max_attempts,
+            supersede_after_seconds=supersede_after_seconds,
+        )
+    if not jobs:
+        return 0
+
+    now_ms = time.time() * 1000
+    for job in jobs:
+        created_ms = iso_to_epoch_ms(job["created_at"])
+        if created_ms is not None:
+            _JOB_AGE.observe(max(now_ms - created_ms, 0.0) / 1000)
+    with _BATCH.time(), LeaseHeartbeat([int(job["id"]) for job in jobs], worker_id, lease_seconds):
+        _process_claimed_jobs(jobs, gate, aggregator, scorer, detector)
+    return len(jobs)
+
+
+def _cached_records(cached: list[dict]) -> list[DetectionRecord]:
+    return [
+        DetectionRecord(**{**det, "features": {**det["features"], "cache_hit": True}})
+        for det in cached
+    ]
+
+
+def _carried_records(decision: GateDecision) -> list[DetectionRecord]:
+    marker = {
+        "carried_forward": True,
+        "carried_from_event_id": decision.reference_event_id,
+        "frame_change": round(decision.change, 4),
+    }
+    return [
+        DetectionRecord(**{**det, "features": {**det["features"], **marker}})
+        for det in decision.detections
+    ]
+
+
+def _gate_jobs(jobs: list, cache: dict, gate: DuplicateGate) -> dict[int, GateDecision]:
+    """Check frames headed for inference against the gate, in claim order.
+
+    Returns {job_id: decision} for frames that can reuse a reference frame's
+    detections; every other readable frame becomes its camera's reference.
+    """
+    carried: dict[int, GateDecision] = {}
+    for job in jobs:
+        if job["frame_path"] is None or job["sha256"] in cache:
+            continue
+        decision, signature = gate.check(job["camera_id"], Path(job["frame_path"]))
+        if decision.reference_event_id is not None:
+            carried[int(job["id"])] = decision
+        elif signature is not None:
+            gate.record(job["camera_id"], signature, int(job["event_id"]))
+    return carried
+
+
+def _run_pipeline_for_jobs(
+    jobs: list, cache: dict[str, list[dict]], detector: DetectorBackend
+) -> dict[int, object]:
+    """Run the backend once over every claimed frame that needs inference.
+
+    Returns {job_id: detections or exception}. Frames whose hash is cached,
+    or repeated within this batch, are only inferred once.
+    """
+    to_run: dict[str, str] = {}
+    unhashed: list = []
+    for job in jobs:
+        if job["frame_path"] is None or job["sha256"] in cache:
+            continue
+        if job["sha256"] is None:
+            unhashed.append(job)
+        else:
+            to_run.setdefault(job["sha256"], job["frame_path"])
+
+    keys = [("sha", sha256) for sha256 in to_run] + [("job", int(job["id"])) for job in unhashed]
+    paths = [Path(p) for p in to_run.values()] + [Path(job["frame_path"]) for job in unhashed]
+    outputs = dict(zip(keys, run_detection_pipeline_batch(paths, detector)))
+
+    results: dict[int, object] = {}
+    for job in jobs:
+        if job["frame_path"] is None or job["sha256"] in cache:
+            continue
+        key = ("job", int(job["id"])) if job["sha256"] is None else ("sha", job["sha256"])
+        results[int(job["id"])] = outputs[key]
+    return results
+
+
+def _resolve_carried(
+    jobs: list,
+    carried: dict[int, GateDecision],
+    inferred: dict[int, object],
+    cache: dict,
+    gate: DuplicateGate,
+    detector: DetectorBackend,
+) -> dict[int, GateDecision]:
+    """Fill in reference detections that were produced in this same batch.
+
+    References from this batch that failed are dropped from the gate, and the
+    frames that pointed at them are run through the pipeline after all.
+    """
+    by_event: dict[int, object] = {}
+    for job in jobs:
+        result = inferred.get(int(job["id"]))
+        if result is None:
+            continue
+        by_event[int(job["event_id"])] = result
+        if isinstance(result, Exception):
+            gate.forget(job["camera_id"], int(job["event_id"]))
+        else:
+            gate.set_detections(
+                job["camera_id"], int(job["event_id"]), [asdict(det) for det in result]
+            )
+
+    rerun: list = []
+    for job in jobs:
+        decision = carried.get(int(job["id"]))
+        if decision is None or decision.detections is not None:
+            continue
+        reference = by_event.get(decision.reference_event_id)
+        if isinstance(reference, list):
+            decision.detections = [asdict(det) for det in reference]
+        else:
+            rerun.append(job)
+    if rerun:
+        gate.stats.frames_carried -= len(rerun)
+        for job in rerun:
+            del carried[int(job["id"])]
+        inferred.update(_run_pipeline_for_jobs(rerun, cache, detector))
+    return carried
+
+
+def _process_claimed_jobs(
+    jobs: list,
+    gate: DuplicateGate | None = None,
+    aggregator: BehaviourAggregator | None = None,
+    scorer: AnomalyScorer | None = None,
+    detector: DetectorBackend | None = None,
+) -> None:
+    detector = detector or get_backend()
+    detection_rows: list[tuple] = []
+    event_updates: list[tuple[int, str, str | None]] = []
+    done_job_ids: list[int] = []
+    failed_jobs: list[tuple[int, str]] = []
+    behaviour: list[tuple[str, int | None, str, float, int, int]] = []
+
+    # Byte-identical frames (same sha256) reuse the pipeline output already
+    # stored for this pipeline version instead of running it again.
+    version = detector.version
+    hashes = sorted({job["sha256"] for job in jobs if job["sha256"] is not None})
+    cache = get_cached_detections(hashes, version)
+    new_cache_entries: list[tuple[str, list[dict]]] = []
+    evidence_hashes: set[str] = set()
+    if gate is not None:
+        with _GATE.time():
+            carried = _gate_jobs(jobs, cache, gate)
+    else:
+        carried = {}
+    inferred = _run_pipeline_for_jobs(
+        [job for job in jobs if int(job["id"]) not in carried], cache, detector
+    )
+    if gate is not None:
+        carried = _resolve_carried(jobs, carried, inferred, cache, gate, detector)
+
+    for job in jobs:
+        job_id = int(job["id"])
+        event_id = int(job["event_id"])
+        if job["frame_path"] is None:
+            failed_jobs.append((job_id, f"Missing event for job {job_id}: event_id={event_id}"))
+            continue
+
+        sha256 = job["sha256"]
+        if job_id in carried:
+            detections = _carried_records(carried[job_id])
+            _FRAMES.labels("carried").inc()
+        elif job_id not in inferred:
+            detections = _cached_records(cache[sha256])
+            _FRAMES.labels("cache").inc()
+        else:
+            _FRAMES.labels("inferred").inc()
+            result = inferred[job_id]
+            if isinstance(result, Exception):
+                event_updates.append((event_id, "failed", str(result)))
+                failed_jobs.append((job_id, str(result)))
+                continue
+            detections = result
+            if sha256 is not None and sha256 not in cache:
+                cache[sha256] = [asdict(det) for det in detections]
+                new_cache_entries.append((sha256, cache[sha256]))
+
+        detection_rows.extend(
+            (
+                event_id,
+                det.detection_type,
+                det.label,
+                det.confidence,
+                det.horse_id,
+                det.features,
+            )
+            for det in detections
+        )
+        if job["event_ts"] is not None:
+            behaviour.extend(
+                (
+                    job["camera_id"],
+                    det.horse_id,
+                    det.label,
+                    det.confidence,
+                    event_id,
+                    job["event_ts"],
+                )
+                for det in detections
+                if det.detection_type in BEHAVIOUR_DETECTION_TYPES
+            )
+        if detections and sha256 is not None:
+            evidence_hashes.add(sha256)
+        event_updates.append((event_id, "detected", None))
+        done_job_ids.append(job_id)
+
+    alerts = []
+    if scorer is not None:
+        with _SCORING.time():
+            for camera_id, horse_id, label, _confidence, event_id, event_ts in behaviour:
+                alert = scorer.observe(camera_id, horse_id, label, event_id, event_ts)
+                if alert is not None:
+                    alerts.append(alert.row())
+                    _ALERTS.labels(alert.severity).inc()
+
+    with _RESULT_COMMIT.time(), transaction() as conn:
+        store_cached_detections(new_cache_entries, version, conn=conn)
+        insert_detections(detection_rows, conn=conn)
+        insert_alerts(alerts, conn=conn)
+        pin_frame_blobs(sorted(evidence_hashes), conn=conn)
+        mark_events_status(event_updates, conn=conn)
+        mark_jobs_done(done_job_ids, conn=conn)
+        mark_jobs_failed(failed_jobs, conn=conn)
+    _JOBS.labels("done").inc(len(done_job_ids))
+    _JOBS.labels("failed").inc(len(failed_jobs))
+    if detection_rows or alerts:
+        notify_feed()
+
+    if aggregator is not None:
+        for camera_id, horse_id, label, confidence, _event_id, event_ts in behaviour:
+            aggregator.add(camera_id, horse_id, label, confidence, event_ts)
 
 
 def process_one_detection_job() -> bool:
+    return process_detection_batch(1) > 0
+
+
+def run_worker(
+    batch_size: int,
+    poll_seconds: float,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    change_threshold: float = DEFAULT_CHANGE_THRESHOLD,
+    metrics_seconds: float = DEFAULT_METRICS_SECONDS,
+    supersede_after_seconds: float | None = None,
+    inference_batch_size: int = DEFAULT_INFERENCE_BATCH_SIZE,
+) -> None:
+    """Process jobs until killed.
+
+    An idle worker blocks on its wakeup socket, so a newly queued job starts
+    within milliseconds; ``poll_seconds`` is only the fallback re-check.
+    Metrics (including queue depth) are printed every ``metrics_seconds``.
+    """
+    init_db()
+    worker_id = default_worker_id()
+    gate = DuplicateGate(change_threshold) if change_threshold > 0 else None
+    aggregator = BehaviourAggregator()
+    scorer = AnomalyScorer(BaselineIndex())
+    batcher = MicroBatcher(get_backend(), inference_batch_size, max_wait_seconds=0.0)
+    reported_checked = 0
+    register_queue_collector()
+    with JobWakeup() as wakeup, PeriodicDump(metrics_seconds, worker_id):
+        try:
+            while True:
+                processed = process_detection_batch(
+                    batch_size,
+                    worker_id=worker_id,
+                    lease_seconds=lease_seconds,
+                    max_attempts=max_attempts,
+                    gate=gate,
+                    aggregator=aggregator,
+                    scorer=scorer,
+                    supersede_after_seconds=supersede_after_seconds,
+                    detector=batcher,
+                )
+                if processed:
+                    continue
+                # Idle: let wall-clock time close windows of cameras that
+                # have gone quiet, then write them out.
+                aggregator.advance(int(time.time() * 1000) - aggregator.lateness_ms)
+                aggregator.flush()
+                if gate is not None and gate.stats.frames_checked != reported_checked:
+                    reported_checked = gate.stats.frames_checked
+                    print(f"Duplicate gate: {gate.stats.summary()}")
+                wakeup.wait(poll_seconds)
+        finally:
+            aggregator.flush(close_all=True)
+            batcher.close()
+
+
+def _worker_process_main(*args) -> None:
+    # The supervisor owns SIGINT handling; children stop on SIGTERM (the
+    # supervisor's own SIGTERM handler is inherited across fork, so reset it).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    run_worker(*args)
+
+
+def run_worker_pool(
+    workers: int,
+    batch_size: int,
+    poll_seconds: float,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    change_threshold: float = DEFAULT_CHANGE_THRESHOLD,
+    metrics_seconds: float = DEFAULT_METRICS_SECONDS,
+    supersede_after_seconds: float | None = None,
+    inference_batch_size: int = DEFAULT_INFERENCE_BATCH_SIZE,
+) -> None:
+    """Fork ``workers`` worker processes on the shared queue and keep them alive.
+
+    When a child dies its leases are expired straight away, so the surviving
+    workers pick its jobs back up on their next claim instead of waiting for
+    the lease timeout.
+    """
     init_db()
-    job = claim_pending_job("detect")
-    if job is None:
-        return False
+    worker_args = (
+        batch_size,
+        poll_seconds,
+        lease_seconds,
+        max_attempts,
+        change_threshold,
+        metrics_seconds,
+        supersede_after_seconds,
+        inference_batch_size,
+    )
+    ctx = multiprocessing.get_context()
+
+    def spawn() -> multiprocessing.process.BaseProcess:
+        process = ctx.Process(target=_worker_process_main, args=worker_args, daemon=True)
+        process.start()
+        return process
+
+    stopping = False
 
-    event_id = int(job["event_id"])
-    event = get_event(event_id)
-    if event is None:
-        error = f"Missing event for job {job['id']}: event_id={event_id}"
-        mark_job_failed(int(job["id"]), error)
-        return True
+    def stop(_signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
 
+    signal.signal(signal.SIGTERM, stop)
+    processes: list[multiprocessing.process.BaseProcess] = [spawn() for _ in range(workers)]
     try:
-        frame_path = Path(event["frame_path"])
-        detections = run_detection_pipeline(frame_path)
-        for det in detections:
-            insert_detection(
-                event_id=event_id,
-                detection_type=det.detection_type,
-                label=det.label,
-                confidence=det.confidence,
-                horse_id=det.horse_id,
-                features=det.features,
-            )
-        mark_event_status(event_id, status="detected")
-        mark_job_done(int(job["id"]))
-    except Exception as exc:
-        mark_event_status(event_id, status="failed", error=str(exc))
-        mark_job_failed(int(job["id"]), str(exc))
-    return True
+        while not stopping:
+            for i, process in enumerate(processes):
+                if process.is_alive():
+                    continue
+                process.join()
+                released = release_worker_leases(worker_id_for_pid(process.pid))
+                print(
+                    f"Worker pid={process.pid} exited with code {process.exitcode}; "
+                    f"released {released} job lease(s), restarting"
+                )
+                processes[i] = spawn()
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
 
 
 def main() -> None:
@@ -54,26 +514,121 @@ def main() -> None:
     parser.add_argument(
         "--once",
         action="store_true",
-        help="Process at most one pending detection job and exit",
+        help="Process at most one batch of pending detection jobs and exit",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Maximum number of detection jobs claimed and committed together",
     )
     parser.add_argument(
         "--poll-seconds",
         type=float,
-        default=1.0,
-        help="Polling interval while waiting for jobs",
+        default=5.0,
+        help="Fallback polling interval; idle workers are woken when a job is queued",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes sharing the job queue",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help="How long a claimed job stays owned without a heartbeat",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help="Fail a job instead of reclaiming it after this many expired leases",
+    )
+    parser.add_argument(
+        "--change-threshold",
+        type=float,
+        default=DEFAULT_CHANGE_THRESHOLD,
+        help=(
+            "Frames whose signature differs from the camera's last detected frame by "
+            "less than this reuse its detections; 0 disables the gate"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-seconds",
+        type=float,
+        default=DEFAULT_METRICS_SECONDS,
+        help="Print each worker's metrics this often; 0 disables",
+    )
+    parser.add_argument(
+        "--skip-superseded-after",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help=(
+            "When a camera's oldest pending frame has waited this long, process only its "
+            "newest frame and mark the older ones superseded"
+        ),
+    )
+    parser.add_argument(
+        "--inference-batch-size",
+        type=int,
+        default=DEFAULT_INFERENCE_BATCH_SIZE,
+        help="Maximum frames per detector backend call",
     )
     args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.inference_batch_size < 1:
+        parser.error("--inference-batch-size must be at least 1")
 
     if args.once:
-        processed = process_one_detection_job()
+        init_db()
+        aggregator = BehaviourAggregator()
+        batcher = MicroBatcher(get_backend(), args.inference_batch_size, max_wait_seconds=0.0)
+        processed = process_detection_batch(
+            args.batch_size,
+            lease_seconds=args.lease_seconds,
+            max_attempts=args.max_attempts,
+            gate=DuplicateGate(args.change_threshold) if args.change_threshold > 0 else None,
+            aggregator=aggregator,
+            scorer=AnomalyScorer(BaselineIndex()),
+            supersede_after_seconds=args.skip_superseded_after,
+            detector=batcher,
+        )
+        batcher.close()
+        aggregator.flush(close_all=True)
         if not processed:
             print("No pending detection jobs")
         return
 
-    while True:
-        processed = process_one_detection_job()
-        if not processed:
-            time.sleep(args.poll_seconds)
+    if args.workers > 1:
+        run_worker_pool(
+            args.workers,
+            args.batch_size,
+            args.poll_seconds,
+            args.lease_seconds,
+            args.max_attempts,
+            args.change_threshold,
+            args.metrics_seconds,
+            args.skip_superseded_after,
+            args.inference_batch_size,
+        )
+        return
+
+    run_worker(
+        args.batch_size,
+        args.poll_seconds,
+        args.lease_seconds,
+        args.max_attempts,
+        args.change_threshold,
+        args.metrics_seconds,
+        args.skip_superseded_after,
+        args.inference_batch_size,
+    )
 
 
 if __name__ == "__main__":
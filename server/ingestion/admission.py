@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from server.monitoring.metrics import REGISTRY
+from server.storage.db import (
+    JOB_PRIORITY_ALERT,
+    JOB_PRIORITY_BACKFILL,
+    JOB_PRIORITY_MOTION,
+    JOB_PRIORITY_NORMAL,
+    job_queue_stats,
+    list_alerting_cameras,
+    list_recent_mqtt_cameras,
+)
+
+OVERLOAD_MODES = ("reject", "store_only")
+
+_DECISIONS = REGISTRY.counter(
+    "stableguard_admission_total", "Ingestion admission decisions per frame", ("decision",)
+)
+
+
+@dataclass
+class AdmissionPolicy:
+    # The detect queue counts as overloaded past either limit.
+    max_pending_jobs: int = 5000
+    max_oldest_pending_seconds: float = 120.0
+    # Cameras with recent motion keep detection until the queue reaches
+    # this multiple of max_pending_jobs.
+    motion_headroom: float = 2.0
+    motion_window_seconds: float = 60.0
+    # Jobs of cameras with an unacknowledged alert this recent run first.
+    alert_window_seconds: float = 30 * 60.0
+    # Frames captured this long before they arrive are backfill and run last.
+    backfill_after_seconds: float = 300.0
+    # Per-camera token bucket; 0 disables rate limiting.
+    camera_frames_per_second: float = 10.0
+    camera_burst_frames: int = 40
+    # "store_only" keeps overload frames without a job; "reject" answers 429.
+    overload_mode: str = "store_only"
+    overload_retry_after_seconds: float = 5.0
+    # How stale the cached queue depth and motion set may get.
+    refresh_seconds: float = 1.0
+
+    def __post_init__(self):
+        if self.overload_mode not in OVERLOAD_MODES:
+            raise ValueError(f"overload_mode must be one of {OVERLOAD_MODES}")
+
+
+@dataclass
+class Admission:
+    # Whether the frames get detection jobs; False means store only.
+    detect: bool = True
+    # Set when the request is refused: seconds for the Retry-After header.
+    retry_after: float | None = None
+    reason: str = ""
+
+    @property
+    def rejected(self) -> bool:
+        return self.retry_after is not None
+
+    def retry_after_header(self) -> dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after or 0)))}
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated: float
+
+
+@dataclass
+class QueueSnapshot:
+    pending: int = 0
+    oldest_pending_seconds: float = 0.0
+    motion_cameras: set[str] = field(default_factory=set)
+    alert_cameras: set[str] = field(default_factory=set)
+    taken_at: float = 0.0
+
+
+class AdmissionController:
+    """Decide per upload whether to queue detection, store only, or refuse.
+
+    Queue depth, the oldest pending job's age and the cameras with recent
+    MQTT motion are read from SQLite at most once per ``refresh_seconds``
+    (``refresh``); in between, admitted jobs are added to the cached depth so
+    a burst is still seen. Token buckets live in this process: with several
+    API processes each enforces the per-camera rate on its own share.
+    """
+
+    def __init__(self, policy: AdmissionPolicy | None = None, job_type: str = "detect"):
+        self.policy = policy or AdmissionPolicy()
+        self.job_type = job_type
+        self.snapshot = QueueSnapshot()
+        self._buckets: dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def stale(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return now - self.snapshot.taken_at >= self.policy.refresh_seconds
+
+    def refresh(self) -> None:
+        """Re-read queue stats, motion and alerting cameras; blocking, run off the event loop."""
+        stats = job_queue_stats(self.job_type)
+        now = datetime.now(timezone.utc)
+        motion_since = now - timedelta(seconds=self.policy.motion_window_seconds)
+        alert_since = now.timestamp() - self.policy.alert_window_seconds
+        self.snapshot = QueueSnapshot(
+            stats["pending"],
+            stats["oldest_pending_age_seconds"],
+            list_recent_mqtt_cameras("motion", motion_since.isoformat()),
+            list_alerting_cameras(int(alert_since * 1000)),
+            time.monotonic(),
+        )
+
+    def priority(self, camera_id: str, captured_ms: int | None, received_ms: int) -> int:
+        """Job priority for one admitted frame."""
+        if (
+            captured_ms is not None
+            and received_ms - captured_ms > self.policy.backfill_after_seconds * 1000
+        ):
+            return JOB_PRIORITY_BACKFILL
+        if camera_id in self.snapshot.alert_cameras:
+            return JOB_PRIORITY_ALERT
+        if camera_id in self.snapshot.motion_cameras:
+            return JOB_PRIORITY_MOTION
+        return JOB_PRIORITY_NORMAL
+
+    def _take_tokens(self, camera_id: str, count: int, now: float) -> float:
+        """Take ``count`` tokens; return 0, or the seconds until they'd be available.
+
+        A batch larger than the burst is let through on a full bucket and
+        leaves it in debt, so buffered uploads aren't refused forever.
+        """
+        rate = self.policy.camera_frames_per_second
+        if rate <= 0:
+            return 0.0
+        burst = max(self.policy.camera_burst_frames, 1)
+        bucket = self._buckets.get(camera_id)
+        if bucket is None:
+            bucket = self._buckets[camera_id] = _Bucket(burst, now)
+        bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        needed = min(count, burst)
+        if bucket.tokens >= needed:
+            bucket.tokens -= count
+            return 0.0
+        return (needed - bucket.tokens) / rate
+
+    def admit(self, frames_by_camera: dict[str, int], now: float | None = None) -> Admission:
+        """Admit one request carrying ``frames_by_camera`` frames.
+
+        A request is refused whole if any camera is over its rate. Otherwise
+        it is queued for detection unless the queue is overloaded; cameras
+        with recent motion only lose detection past ``motion_headroom``.
+        """
+        now = time.monotonic() if now is None else now
+        policy = self.policy
+        frames = sum(frames_by_camera.values())
+        with self._lock:
+            waits = {
+                camera: self._take_tokens(camera, n, now) for camera, n in frames_by_camera.items()
+            }
+            wait = max(waits.values(), default=0.0)
+            if wait > 0:
+                self._refund(frames_by_camera, waits)
+                _DECISIONS.labels("rate_limited").inc(frames)
+                return Admission(False, wait, "rate_limited")
+
+            snapshot = self.snapshot
+            if frames_by_camera.keys() & snapshot.motion_cameras:
+                overloaded = snapshot.pending >= policy.max_pending_jobs * policy.motion_headroom
+            else:
+                overloaded = (
+                    snapshot.pending >= policy.max_pending_jobs
+                    or snapshot.oldest_pending_seconds >= policy.max_oldest_pending_seconds
+                )
+            if not overloaded:
+                snapshot.pending += frames
+                _DECISIONS.labels("detect").inc(frames)
+                return Admission(True)
+            if policy.overload_mode == "reject":
+                self._refund(frames_by_camera)
+                _DECISIONS.labels("overloaded").inc(frames)
+                return Admission(False, policy.overload_retry_after_seconds, "overloaded")
+        _DECISIONS.labels("store_only").inc(frames)
+        return Admission(False, None, "store_only")
+
+    def _refund(self, frames_by_camera: dict[str, int], waits: dict | None = None) -> None:
+        # A refused request gives back what its cameras were charged.
+        for camera, n in frames_by_camera.items():
+            bucket = self._buckets.get(camera)
+            if bucket is not None and not (waits or {}).get(camera):
+                bucket.tokens += n
@@ -1,28 +1,260 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import functools
+import hashlib
+import os
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import BinaryIO
 from uuid import uuid4
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
 
-from server.storage.db import (
-    get_event,
-    init_db,
-    insert_ingestion_event,
-    insert_job,
-    list_detections_for_event,
-)
+from server.ingestion.admission import Admission, AdmissionController
+from server.monitoring.metrics import REGISTRY, stage_timer
+from server.storage import async_db
+from server.storage.db import iso_to_epoch_ms
+from server.storage.frames import commit_frame_blob, incoming_path, preallocate, upload_path
+from server.storage.wakeup import notify_job_available
+
+
+class BoundedBodyRoute(APIRoute):
+    """Refuse bodies larger than the endpoint's ``max_body_bytes`` before parsing.
+
+    Content-Length is checked up front and streamed bodies are counted as
+    they arrive, so the multipart parser never spools more than the limit.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if not hasattr(self.endpoint, "max_body_bytes"):
+            return handler
+
+        async def bounded_handler(request: Request) -> Response:
+            limit = self.endpoint.max_body_bytes
+
+            def too_large() -> HTTPException:
+                _UPLOADS_REJECTED.labels("too_large").inc()
+                return HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                raise too_large()
+            received = 0
+
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise too_large()
+                return message
+
+            return await handler(Request(request.scope, receive))
+
+        return bounded_handler
+
+
+def max_body_bytes(limit: int):
+    """Cap an endpoint's request body; applied below the route decorator."""
+
+    def mark(endpoint):
+        endpoint.max_body_bytes = limit
+        return endpoint
+
+    return mark
 
-router = APIRouter(prefix="/ingestion", tags=["ingestion"])
+
+router = APIRouter(prefix="/ingestion", tags=["ingestion"], route_class=BoundedBodyRoute)
 
 FRAMES_DIR = Path("data/frames")
-FRAMES_DIR.mkdir(parents=True, exist_ok=True)
-init_db()
+
+MAX_FRAME_BYTES = 20 * 1024 * 1024
+MAX_BATCH_FRAMES = 256
+MAX_BATCH_BYTES = 256 * 1024 * 1024
+# Room for form fields and part headers around the frame bytes.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+# Resumable uploads (frames or short clips sent in chunks). A session that
+# receives no chunk for UPLOAD_SESSION_SECONDS is abandoned; abandoned
+# sessions are swept at most every UPLOAD_GC_SECONDS when new ones start.
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+UPLOAD_SESSION_SECONDS = 3600.0
+UPLOAD_GC_SECONDS = 60.0
+_last_upload_gc = 0.0
+
+# File and SQLite work for uploads runs here rather than on the event loop.
+# The pool is bounded so a burst of uploads queues instead of opening an
+# unbounded number of files and database connections.
+IO_WORKERS = 8
+_io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="ingestion-io")
+
+# Tune through ADMISSION.policy (see server/ingestion/admission.py).
+ADMISSION = AdmissionController()
+REFUSED_DETAIL = {
+    "rate_limited": "Camera is over its frame rate",
+    "overloaded": "Detection queue is overloaded",
+}
+
+_UPLOAD_READ = stage_timer("upload_read")
+_FRAME_WRITE = stage_timer("frame_write")
+_BLOB_COMMIT = stage_timer("blob_commit")
+_EVENT_INSERT = stage_timer("event_insert")
+_FRAMES_RECEIVED = REGISTRY.counter(
+    "stableguard_frames_received_total", "Frames stored by the ingestion API", ("duplicate",)
+)
+_FRAME_BYTES = REGISTRY.counter(
+    "stableguard_frame_bytes_received_total", "Bytes of frames stored by the ingestion API"
+).labels()
+_UPLOADS_REJECTED = REGISTRY.counter(
+    "stableguard_uploads_rejected_total", "Uploads refused by the ingestion API", ("reason",)
+)
+_UPLOADS_ABANDONED = REGISTRY.counter(
+    "stableguard_upload_sessions_abandoned_total", "Resumable uploads that expired unfinished"
+).labels()
+
+
+class FrameTooLarge(Exception):
+    pass
+
+
+async def run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_pool, functools.partial(func, *args, **kwargs))
+
+
+def stream_to_disk(
+    source: BinaryIO, out_path: Path, max_bytes: int, chunk_bytes: int | None = None
+) -> tuple[int, str]:
+    """Copy ``source`` to ``out_path`` chunk by chunk; return (size, sha256 hex).
+
+    Raises FrameTooLarge once more than ``max_bytes`` have been read. The
+    partial file is removed on any failure.
+    """
+    chunk_bytes = chunk_bytes or UPLOAD_CHUNK_BYTES
+    hasher = hashlib.sha256()
+    size = 0
+    read_seconds = 0.0
+    started = time.perf_counter()
+    try:
+        with out_path.open("wb") as out:
+            while True:
+                read_started = time.perf_counter()
+                chunk = source.read(chunk_bytes)
+                read_seconds += time.perf_counter() - read_started
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise FrameTooLarge(f"Frame exceeds {max_bytes} bytes")
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        out_path.unlink(missing_ok=True)
+        raise
+    # Everything that isn't reading the upload: hashing, writing and closing.
+    _UPLOAD_READ.observe(read_seconds)
+    _FRAME_WRITE.observe(time.perf_counter() - started - read_seconds)
+    if size == 0:
+        out_path.unlink(missing_ok=True)
+    return size, hasher.hexdigest()
+
+
+def frame_ext(filename: str) -> str:
+    return Path(filename).suffix or ".jpg"
+
+
+def store_upload(
+    source: BinaryIO, filename: str, camera_id: str, received_at: datetime, max_bytes: int
+) -> tuple[Path, int, str, bool]:
+    """Stream an upload to scratch space, then into content-addressed storage.
+
+    Returns (stored path, size, sha256, duplicate). Empty uploads are
+    discarded and returned with size 0.
+    """
+    temp_path = incoming_path(FRAMES_DIR)
+    size_bytes, sha256 = stream_to_disk(source, temp_path, max_bytes)
+    if size_bytes == 0:
+        return temp_path, 0, sha256, False
+    with _BLOB_COMMIT.time():
+        stored_path, duplicate = commit_frame_blob(
+            temp_path, sha256, frame_ext(filename), FRAMES_DIR, camera_id, received_at
+        )
+    _FRAMES_RECEIVED.labels(str(duplicate).lower()).inc()
+    _FRAME_BYTES.inc(size_bytes)
+    return stored_path, size_bytes, sha256, duplicate
+
+
+def _store_batch(
+    sources: list[BinaryIO],
+    filenames: list[str],
+    camera_ids: list[str],
+    received_at: datetime,
+    max_bytes: int,
+) -> list[tuple[Path, int, str, bool]]:
+    stored: list[tuple[Path, int, str, bool]] = []
+    try:
+        for source, filename, camera_id in zip(sources, filenames, camera_ids):
+            result = store_upload(source, filename, camera_id, received_at, max_bytes)
+            if result[1] == 0:
+                raise ValueError(f"Empty frame payload: {filename}")
+            stored.append(result)
+    except BaseException:
+        _discard_new_blobs(stored)
+        raise
+    return stored
+
+
+def _discard_new_blobs(stored: list[tuple[Path, int, str, bool]]) -> None:
+    for path, _size, _sha256, duplicate in stored:
+        if not duplicate:
+            path.unlink(missing_ok=True)
+
+
+async def admit(frames_by_camera: dict[str, int]) -> Admission:
+    """Apply admission control; raises 429 with Retry-After when refused."""
+    if ADMISSION.stale():
+        await async_db.read(ADMISSION.refresh)
+    admission = ADMISSION.admit(frames_by_camera)
+    if admission.rejected:
+        _UPLOADS_REJECTED.labels(admission.reason).inc()
+        raise HTTPException(
+            status_code=429,
+            detail=REFUSED_DETAIL[admission.reason],
+            headers=admission.retry_after_header(),
+        )
+    return admission
+
+
+def _job_priority(camera_id: str, timestamp: str | None, received_at: datetime) -> int:
+    captured_ms = iso_to_epoch_ms(timestamp) if timestamp else None
+    return ADMISSION.priority(camera_id, captured_ms, int(received_at.timestamp() * 1000))
+
+
+def _broadcast_field(values: list[str] | None, count: int, name: str) -> list[str | None]:
+    if not values:
+        return [None] * count
+    if len(values) == 1:
+        return values * count
+    if len(values) != count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected 1 or {count} '{name}' values, got {len(values)}",
+        )
+    return list(values)
 
 
 @router.post("/frame")
+@max_body_bytes(MAX_FRAME_BYTES + MULTIPART_OVERHEAD_BYTES)
 async def upload_frame(
     camera_id: str = Form(...),
     timestamp: str | None = Form(None),
@@ -30,37 +262,393 @@ async def upload_frame(
 ) -> dict:
     if not frame.filename:
         raise HTTPException(status_code=400, detail="Missing filename")
+    admission = await admit({camera_id: 1})
 
-    ext = Path(frame.filename).suffix or ".jpg"
-    safe_camera = camera_id.replace("/", "_").replace(" ", "_")
     received_at = datetime.now(timezone.utc)
 
-    # Keep naming simple and sortable: camera + receive time + random suffix.
-    out_name = f"{safe_camera}_{received_at.strftime('%Y%m%dT%H%M%S%fZ')}_{uuid4().hex[:8]}{ext}"
-    out_path = FRAMES_DIR / out_name
-
-    payload = await frame.read()
-    if not payload:
+    # The multipart parser has already spooled the part; copy it to storage
+    # in chunks on the I/O pool so other cameras' uploads keep flowing.
+    try:
+        out_path, size_bytes, sha256, duplicate = await run_io(
+            store_upload, frame.file, frame.filename, camera_id, received_at, MAX_FRAME_BYTES
+        )
+    except FrameTooLarge as exc:
+        _UPLOADS_REJECTED.labels("too_large").inc()
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    if size_bytes == 0:
+        _UPLOADS_REJECTED.labels("empty").inc()
         raise HTTPException(status_code=400, detail="Empty frame payload")
 
-    out_path.write_bytes(payload)
-    event_id = insert_ingestion_event(
-        camera_id=camera_id,
-        captured_at=timestamp,
-        frame_path=str(out_path),
-        size_bytes=len(payload),
-    )
-    job_id = insert_job(job_type="detect", event_id=event_id)
+    try:
+        with _EVENT_INSERT.time():
+            event_id, job_id = await async_db.insert_event_with_job(
+                camera_id,
+                timestamp,
+                str(out_path),
+                size_bytes,
+                "detect",
+                sha256=sha256,
+                queue=admission.detect,
+                priority=_job_priority(camera_id, timestamp, received_at),
+            )
+    except BaseException:
+        _discard_new_blobs([(out_path, size_bytes, sha256, duplicate)])
+        raise
+    if job_id is not None:
+        notify_job_available()
 
     return {
         "ok": True,
         "event_id": event_id,
         "job_id": job_id,
+        "store_only": not admission.detect,
         "camera_id": camera_id,
         "timestamp": timestamp,
         "received_at": received_at.isoformat(),
         "saved_path": str(out_path),
-        "size_bytes": len(payload),
+        "size_bytes": size_bytes,
+        "sha256": sha256,
+        "duplicate": duplicate,
+    }
+
+
+@router.post("/frames")
+@max_body_bytes(MAX_BATCH_BYTES)
+async def upload_frames(
+    camera_id: list[str] = Form(...),
+    timestamp: list[str] | None = Form(None),
+    frames: list[UploadFile] = File(...),
+) -> dict:
+    """Upload many frames in one request, e.g. a node flushing its buffer.
+
+    ``camera_id`` and ``timestamp`` are given once (applying to every frame)
+    or once per frame, in the same order as ``frames``. The batch is
+    all-or-nothing: events and jobs are written in a single transaction.
+    The whole request is capped at ``MAX_BATCH_BYTES``.
+    """
+    if len(frames) > MAX_BATCH_FRAMES:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BATCH_FRAMES} frames per request"
+        )
+    if any(not frame.filename for frame in frames):
+        raise HTTPException(status_code=400, detail="Missing filename")
+    camera_ids = _broadcast_field(camera_id, len(frames), "camera_id")
+    timestamps = _broadcast_field(timestamp, len(frames), "timestamp")
+    admission = await admit(Counter(camera_ids))
+
+    received_at = datetime.now(timezone.utc)
+    try:
+        stored = await run_io(
+            _store_batch,
+            [frame.file for frame in frames],
+            [frame.filename for frame in frames],
+            camera_ids,
+            received_at,
+            MAX_FRAME_BYTES,
+        )
+    except FrameTooLarge as exc:
+        _UPLOADS_REJECTED.labels("too_large").inc()
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    except ValueError as exc:
+        _UPLOADS_REJECTED.labels("empty").inc()
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    rows = [
+        (cam, ts, str(out_path), size_bytes, sha256)
+        for cam, ts, (out_path, size_bytes, sha256, _dup) in zip(camera_ids, timestamps, stored)
+    ]
+    try:
+        with _EVENT_INSERT.time():
+            ids = await async_db.insert_events_with_jobs(
+                rows,
+                "detect",
+                queue=[admission.detect] * len(rows),
+                priorities=[
+                    _job_priority(cam, ts, received_at) for cam, ts in zip(camera_ids, timestamps)
+                ],
+            )
+    except BaseException:
+        _discard_new_blobs(stored)
+        raise
+    if admission.detect:
+        notify_job_available()
+
+    return {
+        "ok": True,
+        "store_only": not admission.detect,
+        "received_at": received_at.isoformat(),
+        "frames": [
+            {
+                "event_id": event_id,
+                "job_id": job_id,
+                "camera_id": cam,
+                "timestamp": ts,
+                "filename": frame.filename,
+                "saved_path": str(out_path),
+                "size_bytes": size_bytes,
+                "sha256": sha256,
+                "duplicate": duplicate,
+            }
+            for frame, (cam, ts, out_path, size_bytes, sha256), (*_, duplicate), (
+                event_id,
+                job_id,
+            ) in zip(frames, rows, stored, ids)
+        ],
+    }
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def hash_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as source:
+        while chunk := source.read(UPLOAD_CHUNK_BYTES):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _upload_status(session, ranges: list[tuple[int, int]], expires_at: float) -> dict:
+    return {
+        "upload_id": session["id"],
+        "camera_id": session["camera_id"],
+        "size_bytes": session["size_bytes"],
+        "received": [list(r) for r in ranges],
+        "complete": ranges == [(0, session["size_bytes"])],
+        "expires_at": expires_at,
+    }
+
+
+class _UploadGuard:
+    """Orders chunk writes against finalize for one upload."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.finalizing = False
+
+
+_UPLOAD_GUARDS: weakref.WeakValueDictionary[str, _UploadGuard] = weakref.WeakValueDictionary()
+
+
+def _upload_guard(upload_id: str) -> _UploadGuard:
+    guard = _UPLOAD_GUARDS.get(upload_id)
+    if guard is None:
+        guard = _UPLOAD_GUARDS[upload_id] = _UploadGuard()
+    return guard
+
+
+async def _get_upload(upload_id: str):
+    session = await async_db.get_upload_session(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+async def collect_abandoned_uploads(now: float | None = None) -> int:
+    """Delete expired upload sessions and their partial files; returns how many."""
+    now = time.time() if now is None else now
+    removed = 0
+    while upload_ids := await async_db.delete_expired_upload_sessions(now):
+        for upload_id in upload_ids:
+            await run_io(upload_path(FRAMES_DIR, upload_id).unlink, missing_ok=True)
+        removed += len(upload_ids)
+    _UPLOADS_ABANDONED.inc(removed)
+    return removed
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    camera_id: str = Form(...),
+    filename: str = Form(...),
+    size_bytes: int = Form(..., gt=0),
+    timestamp: str | None = Form(None),
+) -> dict:
+    """Start a resumable upload of ``size_bytes``; chunks follow with PUT."""
+    global _last_upload_gc
+    if size_bytes > MAX_UPLOAD_BYTES:
+        _UPLOADS_REJECTED.labels("too_large").inc()
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_BYTES} bytes")
+    if time.monotonic() - _last_upload_gc >= UPLOAD_GC_SECONDS:
+        _last_upload_gc = time.monotonic()
+        await collect_abandoned_uploads()
+
+    upload_id = uuid4().hex
+    path = upload_path(FRAMES_DIR, upload_id)
+    try:
+        await run_io(preallocate, path, size_bytes)
+    except OSError as exc:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=507, detail="No space for upload") from exc
+    expires_at = time.time() + UPLOAD_SESSION_SECONDS
+    try:
+        await async_db.insert_upload_session(
+            upload_id, camera_id, timestamp, filename, size_bytes, expires_at
+        )
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return {
+        "upload_id": upload_id,
+        "camera_id": camera_id,
+        "size_bytes": size_bytes,
+        "received": [],
+        "complete": False,
+        "expires_at": expires_at,
+    }
+
+
+@router.put("/uploads/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Write the request body at ``offset`` of the upload's file.
+
+    Bytes written before a dropped connection still count as received, so
+    the client resumes from what ``GET`` reports rather than the chunk start.
+    """
+    session = await _get_upload(upload_id)
+    guard = _upload_guard(upload_id)
+    size_bytes = session["size_bytes"]
+    position = offset
+    pending = bytearray()
+    try:
+        fd = await run_io(os.open, upload_path(FRAMES_DIR, upload_id), os.O_WRONLY)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="Upload not found") from exc
+
+    async def write_pending() -> None:
+        nonlocal position
+        # Finalize sets the flag under the lock before it verifies the file,
+        # so no write lands after the checksum is taken.
+        async with guard.lock:
+            if guard.finalizing:
+                raise HTTPException(status_code=409, detail="Upload is being finalized")
+            await run_io(_pwrite_all, fd, bytes(pending), position)
+        position += len(pending)
+        pending.clear()
+
+    try:
+        async for data in request.stream():
+            if position + len(pending) + len(data) > size_bytes:
+                raise HTTPException(status_code=416, detail="Chunk runs past the upload size")
+            pending += data
+            if len(pending) >= UPLOAD_CHUNK_BYTES:
+                await write_pending()
+        if pending:
+            await write_pending()
+    finally:
+        await run_io(os.close, fd)
+        expires_at = time.time() + UPLOAD_SESSION_SECONDS
+        recorded = position == offset or await async_db.add_upload_chunk(
+            upload_id, offset, position, expires_at
+        )
+    if not recorded:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    ranges = await async_db.list_upload_ranges(upload_id)
+    return _upload_status(session, ranges, expires_at)
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str) -> dict:
+    session = await _get_upload(upload_id)
+    ranges = await async_db.list_upload_ranges(upload_id)
+    return _upload_status(session, ranges, session["expires_at"])
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str) -> dict:
+    if not await async_db.delete_upload_sessions([upload_id]):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    await run_io(upload_path(FRAMES_DIR, upload_id).unlink, missing_ok=True)
+    return {"ok": True, "upload_id": upload_id}
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, sha256: str = Form(...)) -> dict:
+    """Check the upload is complete and matches ``sha256``, then store it as an event.
+
+    A checksum mismatch discards the session; the client starts over.
+    """
+    session = await _get_upload(upload_id)
+    guard = _upload_guard(upload_id)
+    async with guard.lock:
+        if guard.finalizing:
+            raise HTTPException(status_code=409, detail="Upload is already being finalized")
+        guard.finalizing = True
+    size_bytes = session["size_bytes"]
+    camera_id, timestamp = session["camera_id"], session["captured_at"]
+    path = upload_path(FRAMES_DIR, upload_id)
+    # Chunks are accepted again if finalize gives up before the blob is committed.
+    try:
+        if await async_db.list_upload_ranges(upload_id) != [(0, size_bytes)]:
+            raise HTTPException(status_code=409, detail="Upload is incomplete")
+        admission = await admit({camera_id: 1})
+        try:
+            actual = await run_io(hash_file, path)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=404, detail="Upload not found") from exc
+    except BaseException:
+        guard.finalizing = False
+        raise
+    if actual != sha256.lower():
+        await abort_upload(upload_id)
+        _UPLOADS_REJECTED.labels("checksum").inc()
+        raise HTTPException(status_code=422, detail="Checksum mismatch; upload discarded")
+
+    received_at = datetime.now(timezone.utc)
+    # The file vanishes if the session expires meanwhile.
+    try:
+        with _BLOB_COMMIT.time():
+            out_path, duplicate = await run_io(
+                commit_frame_blob,
+                path,
+                actual,
+                frame_ext(session["filename"]),
+                FRAMES_DIR,
+                camera_id,
+                received_at,
+            )
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail="Upload not found") from exc
+    try:
+        with _EVENT_INSERT.time():
+            ids = await async_db.finalize_upload(
+                upload_id,
+                str(out_path),
+                size_bytes,
+                actual,
+                "detect",
+                queue=admission.detect,
+                priority=_job_priority(camera_id, timestamp, received_at),
+            )
+    except BaseException:
+        _discard_new_blobs([(out_path, size_bytes, actual, duplicate)])
+        raise
+    if ids is None:
+        _discard_new_blobs([(out_path, size_bytes, actual, duplicate)])
+        raise HTTPException(status_code=404, detail="Upload not found")
+    event_id, job_id = ids
+    _FRAMES_RECEIVED.labels(str(duplicate).lower()).inc()
+    _FRAME_BYTES.inc(size_bytes)
+    if job_id is not None:
+        notify_job_available()
+
+    return {
+        "ok": True,
+        "upload_id": upload_id,
+        "event_id": event_id,
+        "job_id": job_id,
+        "store_only": not admission.detect,
+        "camera_id": camera_id,
+        "timestamp": timestamp,
+        "received_at": received_at.isoformat(),
+        "saved_path": str(out_path),
+        "size_bytes": size_bytes,
+        "sha256": actual,
+        "duplicate": duplicate,
     }
 
 
@@ -70,22 +658,15 @@ def health() -> dict:
 
 
 @router.get("/events/{event_id}")
-def get_ingestion_event(event_id: int) -> dict:
-    row = get_event(event_id)
+async def get_ingestion_event(event_id: int) -> dict:
+    row = await async_db.get_event(event_id)
     if row is None:
         raise HTTPException(status_code=404, detail="Event not found")
     return dict(row)
 
 
 @router.get("/events/{event_id}/detections")
-def get_event_detections(event_id: int) -> dict:
-    output: list[dict] = []
-    for row in list_detections_for_event(event_id):
-        record = dict(row)
-        features_raw = record.get("features_json")
-        try:
-            record["features"] = json.loads(features_raw) if features_raw else {}
-        except json.JSONDecodeError:
-            record["features"] = {}
-        output.append(record)
-    return {"event_id": event_id, "detections": output}
+async def get_event_detections(event_id: int) -> Response:
+    rows = await async_db.list_detections_for_event(event_id, as_json=True)
+    body = f'{{"event_id":{event_id},"detections":[' + ",".join(r["json"] for r in rows) + "]}"
+    return Response(body, media_type="application/json")
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import gzip
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from server.monitoring.metrics import REGISTRY, stage_timer
+from server.storage.db import insert_mqtt_messages
+
+_MESSAGES = REGISTRY.counter("stableguard_mqtt_messages_total", "MQTT messages received", ("kind",))
+_LOG_FLUSH = stage_timer("mqtt_log_flush")
+_DB_FLUSH = stage_timer("mqtt_db_flush")
+_DB_FLUSH_FAILURES = REGISTRY.counter(
+    "stableguard_mqtt_db_flush_failures_total", "MQTT batch writes that failed and were requeued"
+)
+
+
+@dataclass
+class MqttMessage:
+    topic: str
+    camera_id: str | None
+    kind: str
+    payload: str
+    received_at: str
+
+
+def parse_topic(topic: str) -> tuple[str | None, str]:
+    """Split ``stableguard/<camera_id>/<kind>`` into (camera_id, kind)."""
+    parts = topic.split("/")
+    if len(parts) == 3 and parts[0] == "stableguard":
+        return parts[1], parts[2]
+    return None, parts[-1]
+
+
+class RotatingEventLog:
+    """Append-only text log with an in-memory write buffer and rotation.
+
+    Lines are appended to an open handle; the buffer goes to disk when it
+    reaches ``flush_bytes`` or on ``flush()``. When the file passes
+    ``max_bytes`` (or is older than ``rotate_seconds``) it is renamed to
+    ``<name>.<UTC timestamp>`` (gzipped when ``compress`` is set) and only
+    the newest ``backup_count`` rotated files are kept.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_bytes: int = 64 * 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        backup_count: int = 10,
+        compress: bool = False,
+        rotate_seconds: float | None = None,
+    ):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.rotate_seconds = rotate_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._buffer: list[str] = []
+        self._buffered_bytes = 0
+        self._file = self.path.open("a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened_at = time.monotonic()
+
+    def write(self, line: str) -> None:
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        if self._buffered_bytes >= self.flush_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        data = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_bytes = 0
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data.encode("utf-8"))
+        too_old = (
+            self.rotate_seconds is not None
+            and time.monotonic() - self._opened_at >= self.rotate_seconds
+        )
+        if self._size >= self.max_bytes or too_old:
+            self.rotate()
+
+    def rotate(self) -> Path:
+        self._file.close()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        rotated = self.path.with_name(f"{self.path.name}.{stamp}")
+        self.path.rename(rotated)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._size = 0
+        self._opened_at = time.monotonic()
+        if self.compress:
+            threading.Thread(target=self._compress_and_prune, args=(rotated,), daemon=True).start()
+        else:
+            self._prune()
+        return rotated
+
+    def _compress_and_prune(self, rotated: Path) -> None:
+        with rotated.open("rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
+        self._prune()
+
+    def _prune(self) -> None:
+        backups = sorted(self.path.parent.glob(f"{self.path.name}.*"))
+        for old in backups[: max(len(backups) - self.backup_count, 0)]:
+            old.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+class EventSink:
+    """Constant-cost sink for MQTT messages.
+
+    Every message goes to the rotating text log; with ``persist`` set they are
+    also queued for a batched SQLite write (events are appended, heartbeats
+    update one row per camera). Both are flushed when the buffered count
+    reaches ``flush_messages`` or every ``flush_seconds`` by a background
+    thread, whichever comes first. A batch whose write fails stays queued
+    and is retried by the next flush.
+    """
+
+    def __init__(
+        self,
+        log: RotatingEventLog,
+        persist: bool = False,
+        flush_messages: int = 500,
+        flush_seconds: float = 1.0,
+        db_path: Path | None = None,
+    ):
+        self.log = log
+        self.persist = persist
+        self.flush_messages = flush_messages
+        self.flush_seconds = flush_seconds
+        self.db_path = db_path
+        self._pending: list[MqttMessage] = []
+        self._flush_at = flush_messages
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def record(self, topic: str, payload: str) -> MqttMessage:
+        camera_id, kind = parse_topic(topic)
+        message = MqttMessage(
+            topic=topic,
+            camera_id=camera_id,
+            kind=kind,
+            payload=payload,
+            received_at=datetime.now(timezone.utc).isoformat(),
+        )
+        _MESSAGES.labels(kind).inc()
+        with self._lock:
+            self.log.write(f"{topic} {payload}\n")
+            if self.persist:
+                self._pending.append(message)
+                if len(self._pending) >= self._flush_at:
+                    try:
+                        self._flush_locked()
+                    except Exception as exc:
+                        print(f"MQTT DB flush failed, will retry: {exc}")
+        return message
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        with _LOG_FLUSH.time():
+            self.log.flush()
+        if self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                with _DB_FLUSH.time():
+                    insert_mqtt_messages(
+                        [(m.topic, m.camera_id, m.kind, m.payload, m.received_at) for m in batch],
+                        db_path=self.db_path,
+                    )
+            except Exception:
+                _DB_FLUSH_FAILURES.inc()
+                self._pending = batch + self._pending
+                # Leave retries to the periodic flush until another batch piles up.
+                self._flush_at = len(self._pending) + self.flush_messages
+                raise
+            self._flush_at = self.flush_messages
+
+    def _flush_periodically(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"MQTT DB flush failed, will retry: {exc}")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._flusher.join()
+        with self._lock:
+            self._flush_locked()
+            self.log.close()
@@ -5,8 +5,11 @@ from pathlib import Path
 
 import paho.mqtt.client as mqtt
 
+from server.ingestion.event_sink import EventSink, RotatingEventLog
+from server.monitoring.metrics import PeriodicDump
+from server.storage.db import init_db
+
 EVENTS_LOG = Path("data/events/mqtt_events.log")
-EVENTS_LOG.parent.mkdir(parents=True, exist_ok=True)
 
 
 def on_connect(client: mqtt.Client, _userdata, _flags, rc: int):
@@ -18,26 +21,69 @@ def on_connect(client: mqtt.Client, _userdata, _flags, rc: int):
     client.subscribe("stableguard/+/heartbeat")
 
 
-def on_message(_client: mqtt.Client, _userdata, msg: mqtt.MQTTMessage):
-    line = f"{msg.topic} {msg.payload.decode(errors='replace')}\n"
-    EVENTS_LOG.write_text(
-        EVENTS_LOG.read_text() + line if EVENTS_LOG.exists() else line
-    )
-    print(line.strip())
+def on_message(_client: mqtt.Client, sink: EventSink, msg: mqtt.MQTTMessage):
+    message = sink.record(msg.topic, msg.payload.decode(errors="replace"))
+    print(f"{message.topic} {message.payload}")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="StableGuard MQTT listener")
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument(
+        "--flush-seconds",
+        type=float,
+        default=1.0,
+        help="Flush buffered log lines and DB rows at least this often",
+    )
+    parser.add_argument(
+        "--max-log-mb",
+        type=float,
+        default=64.0,
+        help="Rotate the event log once it grows past this size",
+    )
+    parser.add_argument(
+        "--rotate-hours",
+        type=float,
+        default=None,
+        help="Also rotate the event log after this many hours",
+    )
+    parser.add_argument("--backup-count", type=int, default=10, help="Rotated logs to keep")
+    parser.add_argument("--compress", action="store_true", help="Gzip rotated logs")
+    parser.add_argument(
+        "--persist-db",
+        action="store_true",
+        help="Also store events and latest heartbeats in SQLite",
+    )
+    parser.add_argument(
+        "--metrics-seconds",
+        type=float,
+        default=60.0,
+        help="Print the listener's metrics this often; 0 disables",
+    )
     args = parser.parse_args()
+    if args.persist_db:
+        init_db()
+
+    log = RotatingEventLog(
+        EVENTS_LOG,
+        max_bytes=int(args.max_log_mb * 1024 * 1024),
+        backup_count=args.backup_count,
+        compress=args.compress,
+        rotate_seconds=args.rotate_hours * 3600 if args.rotate_hours else None,
+    )
+    sink = EventSink(log, persist=args.persist_db, flush_seconds=args.flush_seconds)
 
-    client = mqtt.Client()
+    client = mqtt.Client(userdata=sink)
     client.on_connect = on_connect
     client.on_message = on_message
 
     client.connect(args.host, args.port, keepalive=60)
-    client.loop_forever()
+    try:
+        with PeriodicDump(args.metrics_seconds, "mqtt-listener"):
+            client.loop_forever()
+    finally:
+        sink.close()
 
 
 if __name__ == "__main__":
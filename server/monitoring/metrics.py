@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+# Seconds; spans a cached SQLite read up to a stuck detection batch.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    60.0, 300.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def reset(self) -> None:
+        self.value = 0.0
+
+
+class GaugeValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def reset(self) -> None:
+        self.value = 0.0
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: HistogramValue):
+        self._histogram = histogram
+
+    def __enter__(self) -> _Timer:
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class HistogramValue:
+    """Fixed-bucket histogram: observing is a bisect and three additions."""
+
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bound plus the +Inf overflow; not cumulative.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile by interpolating inside its bucket.
+
+        Like Prometheus' ``histogram_quantile``, the result is only as precise
+        as the buckets; values past the last bound report that bound.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class _Family(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh value for one label combination."""
+
+    def labels(self, *values: str):
+        """Child for one label combination; bind it once for hot paths."""
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        with self._lock:
+            return self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+
+    def children(self) -> list[tuple[tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self.children():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class Gauge(_Family):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self.children():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(child.value)}"
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self.children():
+            with child._lock:
+                counts = list(child.counts)
+                total, value_sum = child.count, child.sum
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(value_sum)}"
+            yield f"{self.name}_count{labels} {total}"
+
+
+class Registry:
+    """Process-wide set of metric families.
+
+    Metrics are registered get-or-create, so modules declare what they use at
+    import time. ``collectors`` run right before each export and refresh
+    gauges whose value is cheaper to read on demand (e.g. queue depth).
+    """
+
+    def __init__(self):
+        self._families: dict[str, _Family] = {}
+        self._collectors: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, help: str, labelnames: Iterable[str], **kwargs):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(family, cls) or family.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return family
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def collect(self) -> list[_Family]:
+        with self._lock:
+            collectors = list(self._collectors)
+            families = sorted(self._families.values(), key=lambda f: f.name)
+        for collector in collectors:
+            collector()
+        return families
+
+    def render_prometheus(self) -> str:
+        """Text exposition format (version 0.0.4)."""
+        lines: list[str] = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(family.samples())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """Flat {name{labels}: value} view with p50/p99 per histogram, for logs."""
+        output: dict = {}
+        for family in self.collect():
+            for values, child in family.children():
+                key = family.name + _format_labels(family.labelnames, values)
+                if isinstance(child, HistogramValue):
+                    if child.count:
+                        output[key] = {
+                            "count": child.count,
+                            "p50_ms": round(child.quantile(0.50) * 1000, 3),
+                            "p99_ms": round(child.quantile(0.99) * 1000, 3),
+                        }
+                else:
+                    output[key] = child.value
+        return output
+
+    def summary_lines(self) -> list[str]:
+        return [f"  {key} {value}" for key, value in self.summary().items()]
+
+    def reset(self) -> None:
+        """Zero every recorded value in place (tests); bound children stay valid."""
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            for _values, child in family.children():
+                child.reset()
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "stableguard_stage_seconds",
+    "Wall time spent in each processing stage",
+    ("stage",),
+)
+
+
+def stage_timer(stage: str) -> HistogramValue:
+    """The ``stableguard_stage_seconds`` child for ``stage``; use ``.time()``."""
+    return STAGE_SECONDS.labels(stage)
+
+
+class PeriodicDump:
+    """Print the registry summary every ``interval`` seconds from a daemon thread.
+
+    For CLI processes (worker, MQTT listener) that are not scraped; a final
+    dump is printed on exit.
+    """
+
+    def __init__(self, interval: float, label: str, registry: Registry = REGISTRY):
+        self.interval = interval
+        self.label = label
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def dump(self) -> None:
+        lines = self.registry.summary_lines()
+        if lines:
+            print("\n".join([f"Metrics {self.label}:", *lines]), flush=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def __enter__(self) -> PeriodicDump:
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        if self.interval > 0:
+            self._stop.set()
+            self._thread.join()
+            self.dump()
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from server.monitoring.metrics import REGISTRY
+from server.storage.db import job_queue_stats
+
+JOB_TYPES = ("detect",)
+
+QUEUE_DEPTH = REGISTRY.gauge("stableguard_jobs", "Jobs in the queue by status", ("type", "status"))
+OLDEST_PENDING_AGE = REGISTRY.gauge(
+    "stableguard_oldest_pending_job_age_seconds",
+    "Age of the oldest non-backfill job still waiting to be claimed",
+    ("type",),
+)
+
+
+def collect_queue_metrics() -> None:
+    for job_type in JOB_TYPES:
+        stats = job_queue_stats(job_type)
+        for status in ("pending", "processing", "failed"):
+            QUEUE_DEPTH.labels(job_type, status).set(stats[status])
+        OLDEST_PENDING_AGE.labels(job_type).set(round(stats["oldest_pending_age_seconds"], 3))
+
+
+def register_queue_collector() -> None:
+    """Read queue depth from SQLite whenever metrics are exported.
+
+    Call at process startup; registering again is a no-op.
+    """
+    REGISTRY.add_collector(collect_queue_metrics)
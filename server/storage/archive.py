@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import argparse
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from server.storage import db as storage_db
+from server.storage.db import (
+    delete_events_with_detections,
+    delete_jobs,
+    enable_incremental_vacuum,
+    get_conn,
+    incremental_vacuum,
+    init_db,
+    list_archivable_events,
+    list_finished_jobs,
+    open_conn,
+    transaction,
+)
+
+ARCHIVE_DIR = Path("data/archive")
+ARCHIVE_NAME = re.compile(r"^stableguard-(\d{4}-\d{2})\.db$")
+ARCHIVED_TABLES = ("ingestion_events", "detections", "jobs")
+COMPACTED_JOB_TYPES = ("detect",)
+
+# Archive files already widened to the hot schema by this process.
+_migrated_archives: set[str] = set()
+_migrate_lock = threading.Lock()
+
+MAIN_INDEXES_SQL = """
+    SELECT sql FROM main.sqlite_master
+    WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+"""
+
+
+@dataclass
+class CompactionPolicy:
+    # Done and failed jobs leave the hot database this long after finishing.
+    job_max_age_seconds: float = 24 * 3600
+    # Events and their detections follow once they are this old by event
+    # time and no job or alert refers to them.
+    event_max_age_seconds: float = 30 * 24 * 3600
+    # Free pages handed back to the filesystem per pass.
+    vacuum_pages: int = 4096
+
+
+@dataclass
+class CompactionStats:
+    jobs: int = 0
+    events: int = 0
+    detections: int = 0
+    pages_freed: int = 0
+
+
+def archive_path(month: str, archive_dir: Path | None = None) -> Path:
+    return (archive_dir or ARCHIVE_DIR) / f"stableguard-{month}.db"
+
+
+def archive_months(archive_dir: Path | None = None) -> list[str]:
+    """``YYYY-MM`` of every archive file, newest first."""
+    directory = archive_dir or ARCHIVE_DIR
+    if not directory.is_dir():
+        return []
+    months = [m.group(1) for p in directory.iterdir() if (m := ARCHIVE_NAME.match(p.name))]
+    return sorted(months, reverse=True)
+
+
+def month_bounds_ms(month: str) -> tuple[int, int]:
+    """[start, end) of a ``YYYY-MM`` month in epoch ms, UTC."""
+    start = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def _ensure_archive_table(conn: sqlite3.Connection, table: str) -> list[str]:
+    """Create or widen ``archive.<table>`` to match the hot table; return its columns.
+
+    Archive tables carry the hot table's columns and indexes but no foreign
+    keys or defaults: rows arrive fully formed and are never updated.
+    """
+    columns = conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+    names = [col["name"] for col in columns]
+    existing = {row["name"] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+    if not existing:
+        defs = [
+            f"{col['name']} {col['type']}" + (" PRIMARY KEY" if col["pk"] else "")
+            for col in columns
+        ]
+        conn.execute(f"CREATE TABLE archive.{table} ({', '.join(defs)})")
+    else:
+        for col in columns:
+            if col["name"] not in existing:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {col['name']} {col['type']}")
+    for (sql,) in conn.execute(MAIN_INDEXES_SQL, (table,)).fetchall():
+        conn.execute(
+            re.sub(
+                r"^CREATE\s+(UNIQUE\s+)?INDEX\s+(IF\s+NOT\s+EXISTS\s+)?",
+                r"CREATE \1INDEX IF NOT EXISTS archive.",
+                sql,
+                flags=re.IGNORECASE,
+            )
+        )
+    return names
+
+
+def _copy_to_archive(
+    conn: sqlite3.Connection,
+    month: str,
+    copies: list[tuple[str, str, list[int]]],
+    archive_dir: Path | None,
+) -> None:
+    """Copy rows into one month's archive file in a single archive transaction.
+
+    ``copies`` is (table, key column, key values). Rows are copied with
+    INSERT OR REPLACE, so repeating a copy after a crash is harmless.
+    """
+    path = archive_path(month, archive_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+    try:
+        with transaction(conn=conn):
+            # Every file gets every table, so readers can query any month.
+            columns = {table: _ensure_archive_table(conn, table) for table in ARCHIVED_TABLES}
+            for table, key, values in copies:
+                placeholders = ",".join("?" * len(values))
+                names = ", ".join(columns[table])
+                conn.execute(
+                    f"INSERT OR REPLACE INTO archive.{table} ({names}) "
+                    f"SELECT {names} FROM main.{table} WHERE {key} IN ({placeholders})",
+                    values,
+                )
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+
+def migrate_archive(path: Path, db_path: Path | None = None) -> None:
+    """Add the columns and indexes the hot schema gained since ``path`` was written.
+
+    Readers select archive rows with the hot database's column list, so a
+    month archived before a migration must be widened before it is queried.
+    Detections archived before the typed feature columns are promoted the
+    same way the hot table was. Each file is checked once per process.
+    """
+    key = str(path.resolve())
+    with _migrate_lock:
+        if key in _migrated_archives:
+            return
+        archive = open_conn(path)
+        try:
+            if storage_db._columns(archive, "detections"):
+                with transaction(conn=archive):
+                    storage_db._promote_detection_features(archive)
+        finally:
+            archive.close()
+        conn = open_conn(db_path)
+        try:
+            conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+            try:
+                with transaction(conn=conn):
+                    for table in ARCHIVED_TABLES:
+                        _ensure_archive_table(conn, table)
+            finally:
+                conn.execute("DETACH DATABASE archive")
+        finally:
+            conn.close()
+        _migrated_archives.add(key)
+
+
+def _by_month(rows: list[tuple[int, str]]) -> dict[str, list[int]]:
+    grouped: dict[str, list[int]] = defaultdict(list)
+    for row_id, month in rows:
+        grouped[month].append(row_id)
+    return grouped
+
+
+def compact_once(
+    policy: CompactionPolicy,
+    batch_size: int = 500,
+    now: datetime | None = None,
+    archive_dir: Path | None = None,
+    db_path: Path | None = None,
+) -> CompactionStats:
+    """Move one bounded batch of finished jobs and of old events to the archive.
+
+    Rows are first copied into the month's archive file and committed there,
+    then deleted from the hot database in a second transaction. A crash in
+    between leaves the rows in both places; readers prefer the hot copy and
+    the next pass copies them again before deleting. Events only go once none
+    of their jobs are left, so jobs always leave first.
+    """
+    now = now or datetime.now(timezone.utc)
+    stats = CompactionStats()
+    conn = open_conn(db_path)
+    try:
+        job_cutoff = (now - timedelta(seconds=policy.job_max_age_seconds)).isoformat()
+        jobs = [
+            row
+            for job_type in COMPACTED_JOB_TYPES
+            for row in list_finished_jobs(job_type, job_cutoff, batch_size, conn=conn)
+        ]
+        for month, job_ids in _by_month(jobs).items():
+            _copy_to_archive(conn, month, [("jobs", "id", job_ids)], archive_dir)
+            stats.jobs += delete_jobs(job_ids, conn=conn)
+
+        event_cutoff = int((now.timestamp() - policy.event_max_age_seconds) * 1000)
+        events = list_archivable_events(event_cutoff, batch_size, conn=conn)
+        for month, event_ids in _by_month(events).items():
+            _copy_to_archive(
+                conn,
+                month,
+                [("ingestion_events", "id", event_ids), ("detections", "event_id", event_ids)],
+                archive_dir,
+            )
+            removed_events, removed_detections = delete_events_with_detections(
+                event_ids, conn=conn
+            )
+            stats.events += removed_events
+            stats.detections += removed_detections
+
+        if stats.jobs or stats.events:
+            stats.pages_freed = incremental_vacuum(policy.vacuum_pages, conn=conn) or 0
+    finally:
+        conn.close()
+    return stats
+
+
+def run_compaction(
+    policy: CompactionPolicy,
+    interval_seconds: float = 300.0,
+    batch_size: int = 500,
+    stop: threading.Event | None = None,
+) -> None:
+    """Compact in small passes; back-to-back while there is a backlog, then idle."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        stats = compact_once(policy, batch_size)
+        if stats.jobs or stats.events:
+            print(
+                f"Compaction archived {stats.jobs} job(s), {stats.events} event(s), "
+                f"{stats.detections} detection(s); freed {stats.pages_freed} page(s)"
+            )
+        if stats.jobs < batch_size and stats.events < batch_size:
+            stop.wait(interval_seconds)
+
+
+def list_with_archive(
+    list_rows: Callable[..., list[sqlite3.Row]],
+    since_ts: int | None = None,
+    until_ts: int | None = None,
+    before: tuple[int, int] | None = None,
+    limit: int = 100,
+    archive_dir: Path | None = None,
+    **filters,
+) -> list[sqlite3.Row]:
+    """Run a newest-first listing (``list_events``/``list_detections``) across partitions.
+
+    The hot database is read first. Archive months are only opened when they
+    overlap the requested range and could still hold rows that sort ahead of
+    the page's last row, so recent pages never touch the archive. Rows present
+    in both (mid-compaction) are taken from the hot database.
+    """
+    page = list_rows(
+        since_ts=since_ts, until_ts=until_ts, before=before, limit=limit, **filters
+    )
+    upper = until_ts
+    if before is not None:
+        upper = before[0] + 1 if upper is None else min(upper, before[0] + 1)
+
+    for month in archive_months(archive_dir):
+        start, end = month_bounds_ms(month)
+        if upper is not None and start >= upper:
+            continue
+        if since_ts is not None and end <= since_ts:
+            break
+        # Months are newest first: once the page is full and this month ends
+        # at or before its last row, no older month can contribute either.
+        if len(page) >= limit and end <= page[-1]["event_ts"]:
+            break
+        path = archive_path(month, archive_dir)
+        migrate_archive(path)
+        archived = list_rows(
+            since_ts=since_ts,
+            until_ts=until_ts,
+            before=before,
+            limit=limit,
+            conn=get_conn(path),
+            **filters,
+        )
+        if archived:
+            seen = {row["id"] for row in page}
+            merged = page + [row for row in archived if row["id"] not in seen]
+            merged.sort(key=lambda row: (row["event_ts"], row["id"]), reverse=True)
+            page = merged[:limit]
+    return page
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="StableGuard job and event compaction")
+    parser.add_argument("--job-max-age-hours", type=float, default=24.0)
+    parser.add_argument("--event-max-age-days", type=float, default=30.0)
+    parser.add_argument("--vacuum-pages", type=int, default=4096)
+    parser.add_argument("--interval-seconds", type=float, default=300.0)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="Rewrite an existing database once so freed pages can be returned (stop writers)",
+    )
+    args = parser.parse_args()
+    if args.job_max_age_hours * 3600 > args.event_max_age_days * 24 * 3600:
+        parser.error("--job-max-age-hours must not exceed --event-max-age-days")
+
+    init_db()
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+        print(f"Enabled incremental vacuum on {storage_db.DB_PATH}")
+        return
+    if incremental_vacuum(0) is None:
+        print("Note: freed pages are only reused; run once with --enable-incremental-vacuum")
+
+    policy = CompactionPolicy(
+        job_max_age_seconds=args.job_max_age_hours * 3600,
+        event_max_age_seconds=args.event_max_age_days * 24 * 3600,
+        vacuum_pages=args.vacuum_pages,
+    )
+    if args.once:
+        stats = compact_once(policy, args.batch_size)
+        print(
+            f"Compaction archived {stats.jobs} job(s), {stats.events} event(s), "
+            f"{stats.detections} detection(s); freed {stats.pages_freed} page(s)"
+        )
+        return
+    run_compaction(policy, args.interval_seconds, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
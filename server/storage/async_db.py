@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from server.monitoring.metrics import REGISTRY, stage_timer
+from server.storage import db as storage_db
+
+READ_WORKERS = 8
+# Upper bound on requests per group commit, so one commit stays short.
+MAX_GROUP = 256
+
+_GROUP_SIZE = REGISTRY.histogram(
+    "stableguard_group_commit_requests",
+    "Write requests committed together by the async writer",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+).labels()
+_WRITE_WAIT = stage_timer("write_queue_wait")
+_GROUP_COMMIT = stage_timer("group_commit")
+
+
+@dataclass
+class _Request:
+    func: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    queued_at: float
+
+
+def _resolve(future: asyncio.Future, result: Any, error: BaseException | None) -> None:
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class Writer:
+    """The one thread that writes to a database file.
+
+    Requests queued while a commit is running are committed together as the
+    next group. Each runs in its own savepoint, so a failing request is
+    rolled back and raised to its caller without affecting the rest.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._queue: queue.SimpleQueue[_Request | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable[..., Any], args: tuple, kwargs: dict) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_Request(func, args, kwargs, loop, future, time.perf_counter()))
+        return future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        conn = storage_db.open_conn(self.db_path)
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    return
+                group = [first]
+                while len(group) < MAX_GROUP:
+                    try:
+                        request = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        self._commit(conn, group)
+                        return
+                    group.append(request)
+                self._commit(conn, group)
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, group: list[_Request]) -> None:
+        started = time.perf_counter()
+        for request in group:
+            _WRITE_WAIT.observe(started - request.queued_at)
+        _GROUP_SIZE.observe(len(group))
+        outcomes: list[tuple[Any, BaseException | None]] = []
+        try:
+            with _GROUP_COMMIT.time(), storage_db.transaction(conn=conn, immediate=True):
+                for request in group:
+                    conn.execute("SAVEPOINT request")
+                    try:
+                        result = request.func(*request.args, conn=conn, **request.kwargs)
+                    except Exception as exc:
+                        conn.execute("ROLLBACK TO request")
+                        outcomes.append((None, exc))
+                    else:
+                        outcomes.append((result, None))
+                    conn.execute("RELEASE request")
+        except Exception as exc:
+            # The commit itself failed: nothing in the group was written.
+            outcomes = [(None, exc)] * len(group)
+        for request, (result, error) in zip(group, outcomes):
+            try:
+                request.loop.call_soon_threadsafe(_resolve, request.future, result, error)
+            except RuntimeError:
+                pass  # The caller's event loop has closed.
+
+
+_writers: dict[str, Writer] = {}
+_writers_lock = threading.Lock()
+_read_pool: ThreadPoolExecutor | None = None
+
+
+def _writer() -> Writer:
+    path = storage_db._resolve_path(None)
+    key = str(path.resolve())
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = _writers[key] = Writer(path)
+    return writer
+
+
+def _readers() -> ThreadPoolExecutor:
+    global _read_pool
+    if _read_pool is None:
+        with _writers_lock:
+            if _read_pool is None:
+                _read_pool = ThreadPoolExecutor(READ_WORKERS, thread_name_prefix="sqlite-read")
+    return _read_pool
+
+
+async def write(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run ``func(*args, conn=..., **kwargs)`` in the writer's next group commit."""
+    return await _writer().submit(func, args, kwargs)
+
+
+async def read(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a read-only ``func`` on the read pool, with that thread's connection."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown() -> None:
+    """Stop the writer threads (after draining their queues) and the read pool."""
+    global _read_pool
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+        pool, _read_pool = _read_pool, None
+    for writer in writers:
+        writer.close()
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def _reset_after_fork() -> None:
+    # Threads don't survive fork(); the child starts its own on first use.
+    global _writers, _writers_lock, _read_pool
+    _writers = {}
+    _writers_lock = threading.Lock()
+    _read_pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _writing(func: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await write(func, *args, **kwargs)
+
+    return wrapper
+
+
+def _reading(func: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await read(func, *args, **kwargs)
+
+    return wrapper
+
+
+# Async mirrors of server.storage.db, used by the API handlers.
+insert_ingestion_event = _writing(storage_db.insert_ingestion_event)
+insert_job = _writing(storage_db.insert_job)
+insert_event_with_job = _writing(storage_db.insert_event_with_job)
+insert_events_with_jobs = _writing(storage_db.insert_events_with_jobs)
+insert_detection = _writing(storage_db.insert_detection)
+insert_detections = _writing(storage_db.insert_detections)
+insert_mqtt_messages = _writing(storage_db.insert_mqtt_messages)
+insert_alerts = _writing(storage_db.insert_alerts)
+mark_event_status = _writing(storage_db.mark_event_status)
+insert_upload_session = _writing(storage_db.insert_upload_session)
+add_upload_chunk = _writing(storage_db.add_upload_chunk)
+delete_upload_sessions = _writing(storage_db.delete_upload_sessions)
+delete_expired_upload_sessions = _writing(storage_db.delete_expired_upload_sessions)
+finalize_upload = _writing(storage_db.finalize_upload)
+
+get_event = _reading(storage_db.get_event)
+get_frame_blob = _reading(storage_db.get_frame_blob)
+list_events = _reading(storage_db.list_events)
+list_detections = _reading(storage_db.list_detections)
+list_detections_for_event = _reading(storage_db.list_detections_for_event)
+list_timeline = _reading(storage_db.list_timeline)
+job_queue_stats = _reading(storage_db.job_queue_stats)
+get_upload_session = _reading(storage_db.get_upload_session)
+list_upload_ranges = _reading(storage_db.list_upload_ranges)
@@ -1,85 +1,387 @@
 from __future__ import annotations
 
+import itertools
 import json
+import os
+import socket
 import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 
+from server.monitoring.metrics import REGISTRY, stage_timer
+
 DB_PATH = Path("data/stableguard.db")
 
+# Applied once per pooled connection. WAL lets the API keep writing while the
+# worker reads, and synchronous=NORMAL drops the fsync from every commit (WAL
+# still fsyncs on checkpoint, so a power cut can only lose the tail).
+# auto_vacuum only takes effect on a brand-new file (it must precede the WAL
+# switch, which writes the header); it lets compaction hand freed pages back
+# with PRAGMA incremental_vacuum.
+CONNECTION_PRAGMAS = (
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+
+# A claimed job belongs to its worker until the lease runs out; the worker
+# extends it while still busy. Expired leases are handed back to the queue
+# until a job has been attempted DEFAULT_MAX_ATTEMPTS times.
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_BEGIN_TIMER = stage_timer("sqlite_begin")
+_COMMIT_TIMER = stage_timer("sqlite_commit")
+_TRANSACTION_TIMER = stage_timer("sqlite_transaction")
+_SUPERSEDED = REGISTRY.counter(
+    "stableguard_jobs_superseded_total", "Pending jobs skipped for a newer frame of their camera"
+).labels()
+_ROLLBACKS = REGISTRY.counter(
+    "stableguard_sqlite_rollbacks_total", "Transactions rolled back after an error"
+).labels()
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_registry: list[sqlite3.Connection] = []
+_generation = 0
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def get_conn(db_path: Path | None = None) -> sqlite3.Connection:
-    path = db_path or DB_PATH
+def iso_to_epoch_ms(value: str | None) -> int | None:
+    """Epoch milliseconds for an ISO 8601 timestamp (naive means UTC), or None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return round(parsed.timestamp() * 1000)
+
+
+def event_epoch_ms(captured_at: str | None, received_at: str) -> int:
+    captured = iso_to_epoch_ms(captured_at)
+    return captured if captured is not None else iso_to_epoch_ms(received_at)
+
+
+def _resolve_path(db_path: Path | None) -> Path:
+    return Path(db_path or DB_PATH)
+
+
+def open_conn(db_path: Path | None = None) -> sqlite3.Connection:
+    path = _resolve_path(db_path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(path)
+    # isolation_level=None: transactions are opened explicitly by transaction(),
+    # so helpers can join a caller's transaction instead of committing it.
+    conn = sqlite3.connect(
+        path,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_db(db_path: Path | None = None) -> None:
-    conn = get_conn(db_path)
+def get_conn(db_path: Path | None = None) -> sqlite3.Connection:
+    """Return this thread's long-lived connection to ``db_path``."""
+    key = str(_resolve_path(db_path).resolve())
+    conns: dict[str, sqlite3.Connection] | None = getattr(_local, "conns", None)
+    if conns is None or getattr(_local, "generation", None) != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+    conn = conns.get(key)
+    if conn is None:
+        conn = open_conn(db_path)
+        conns[key] = conn
+        with _registry_lock:
+            _registry.append(conn)
+    return conn
+
+
+# Connections inherited across fork(), kept referenced so the child never
+# finalizes (and so closes) handles the parent is still using.
+_inherited: list[tuple[threading.local, list[sqlite3.Connection]]] = []
+
+
+def _reset_after_fork() -> None:
+    # SQLite connections must not be used across fork(); the child abandons
+    # (without closing) everything it inherited and opens its own.
+    global _local, _registry, _generation
+    _inherited.append((_local, _registry))
+    _local = threading.local()
+    _registry = []
+    _generation += 1
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def close_all_conns() -> None:
+    """Close every pooled connection (all threads). Used on shutdown and in tests."""
+    global _generation
+    with _registry_lock:
+        conns = list(_registry)
+        _registry.clear()
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+@contextmanager
+def transaction(
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    immediate: bool = False,
+) -> Iterator[sqlite3.Connection]:
+    """Run a block in one transaction on a shared connection.
+
+    Nested use (or a helper called with a connection that is already inside a
+    transaction) joins the outer transaction; only the outermost block commits.
+    """
+    conn = conn or get_conn(db_path)
+    if conn.in_transaction:
+        yield conn
+        return
+    # BEGIN IMMEDIATE waits for the write lock, so its time is lock contention.
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    began = time.perf_counter()
+    _BEGIN_TIMER.observe(began - started)
     try:
-        conn.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS ingestion_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                camera_id TEXT NOT NULL,
-                captured_at TEXT,
-                received_at TEXT NOT NULL,
-                frame_path TEXT NOT NULL,
-                size_bytes INTEGER NOT NULL,
-                status TEXT NOT NULL DEFAULT 'received',
-                last_error TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS jobs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT NOT NULL,
-                event_id INTEGER NOT NULL,
-                status TEXT NOT NULL DEFAULT 'pending',
-                attempts INTEGER NOT NULL DEFAULT 0,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                last_error TEXT,
-                FOREIGN KEY(event_id) REFERENCES ingestion_events(id)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_jobs_type_status ON jobs(type, status, id);
-            CREATE INDEX IF NOT EXISTS idx_ingestion_events_status ON ingestion_events(status, id);
-
-            CREATE TABLE IF NOT EXISTS detections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_id INTEGER NOT NULL,
-                detection_type TEXT NOT NULL DEFAULT 'object',
-                label TEXT NOT NULL,
-                horse_id INTEGER,
-                confidence REAL NOT NULL,
-                features_json TEXT NOT NULL DEFAULT '{}',
-                class_name TEXT,
-                bbox_x REAL,
-                bbox_y REAL,
-                bbox_w REAL,
-                bbox_h REAL,
-                detected_at TEXT NOT NULL,
-                FOREIGN KEY(event_id) REFERENCES ingestion_events(id)
-            );
-            """
-        )
-        _migrate_detections_table(conn)
-        conn.commit()
-    finally:
-        conn.close()
+        yield conn
+    except BaseException:
+        conn.rollback()
+        _ROLLBACKS.inc()
+        raise
+    committing = time.perf_counter()
+    conn.commit()
+    finished = time.perf_counter()
+    _COMMIT_TIMER.observe(finished - committing)
+    _TRANSACTION_TIMER.observe(finished - started)
 
 
-def _migrate_detections_table(conn: sqlite3.Connection) -> None:
-    columns = {
-        row["name"] for row in conn.execute("PRAGMA table_info(detections)").fetchall()
-    }
+# The tables as first created. Later columns and indexes are added by the
+# numbered steps in MIGRATIONS, so old and new databases end up identical.
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS ingestion_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camera_id TEXT NOT NULL,
+        captured_at TEXT,
+        received_at TEXT NOT NULL,
+        frame_path TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'received',
+        last_error TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        event_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        last_error TEXT,
+        FOREIGN KEY(event_id) REFERENCES ingestion_events(id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_jobs_type_status ON jobs(type, status, id);
+    CREATE INDEX IF NOT EXISTS idx_ingestion_events_status ON ingestion_events(status, id);
+
+    CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event_id INTEGER NOT NULL,
+        detection_type TEXT NOT NULL DEFAULT 'object',
+        label TEXT NOT NULL,
+        horse_id INTEGER,
+        confidence REAL NOT NULL,
+        features_json TEXT NOT NULL DEFAULT '{}',
+        class_name TEXT,
+        bbox_x REAL,
+        bbox_y REAL,
+        bbox_w REAL,
+        bbox_h REAL,
+        detected_at TEXT NOT NULL,
+        FOREIGN KEY(event_id) REFERENCES ingestion_events(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS mqtt_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT NOT NULL,
+        camera_id TEXT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        received_at TEXT NOT NULL
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_mqtt_events_camera ON mqtt_events(camera_id, id);
+    CREATE INDEX IF NOT EXISTS idx_mqtt_events_kind ON mqtt_events(kind, received_at);
+
+    CREATE TABLE IF NOT EXISTS frame_blobs (
+        sha256 TEXT PRIMARY KEY,
+        frame_path TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        pinned INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    );
+
+    -- Running total of stored frame bytes so retention never has to SUM
+    -- the blob table or walk the frames directory.
+    CREATE TABLE IF NOT EXISTS storage_totals (
+        name TEXT PRIMARY KEY,
+        bytes INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS detection_cache (
+        sha256 TEXT NOT NULL,
+        pipeline_version TEXT NOT NULL,
+        detections_json TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (sha256, pipeline_version)
+    );
+
+    -- Per camera/horse/behaviour counts over fixed event-time windows,
+    -- folded in by the worker (see server/analysis/behaviour_logs.py).
+    CREATE TABLE IF NOT EXISTS behaviour_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camera_id TEXT NOT NULL,
+        horse_id INTEGER,
+        behaviour_type TEXT NOT NULL,
+        window_start_ts INTEGER NOT NULL,
+        window_end_ts INTEGER NOT NULL,
+        detections INTEGER NOT NULL,
+        confidence_sum REAL NOT NULL,
+        confidence REAL NOT NULL,
+        first_seen_ts INTEGER NOT NULL,
+        last_seen_ts INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_behaviour_logs_window ON behaviour_logs(
+        camera_id, IFNULL(horse_id, -1), window_start_ts, behaviour_type
+    );
+    CREATE INDEX IF NOT EXISTS idx_behaviour_logs_horse
+        ON behaviour_logs(horse_id, window_start_ts);
+    CREATE INDEX IF NOT EXISTS idx_behaviour_logs_ts ON behaviour_logs(window_start_ts);
+
+    -- Detection counts per camera, horse and label in 1-minute, 1-hour
+    -- and 1-day event-time buckets (resolution in seconds), added to as
+    -- detections are inserted. Charts read these instead of detections.
+    CREATE TABLE IF NOT EXISTS detection_rollups (
+        resolution INTEGER NOT NULL,
+        bucket_ts INTEGER NOT NULL,
+        camera_id TEXT NOT NULL,
+        horse_id INTEGER,
+        label TEXT NOT NULL,
+        detections INTEGER NOT NULL,
+        confidence_sum REAL NOT NULL
+    );
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_detection_rollups_bucket ON detection_rollups(
+        resolution, bucket_ts, camera_id, IFNULL(horse_id, -1), label
+    );
+    CREATE INDEX IF NOT EXISTS idx_detection_rollups_horse
+        ON detection_rollups(resolution, horse_id, bucket_ts);
+    CREATE INDEX IF NOT EXISTS idx_detection_rollups_camera
+        ON detection_rollups(resolution, camera_id, bucket_ts);
+
+    -- Minutes per subject (horse, or camera when the horse is unknown),
+    -- UTC day, hour and behaviour; only non-zero cells are stored.
+    CREATE TABLE IF NOT EXISTS behaviour_daily (
+        subject TEXT NOT NULL,
+        day TEXT NOT NULL,
+        hour_of_day INTEGER NOT NULL,
+        behaviour_type TEXT NOT NULL,
+        minutes REAL NOT NULL,
+        PRIMARY KEY (day, subject, hour_of_day, behaviour_type)
+    );
+
+    CREATE TABLE IF NOT EXISTS baselines (
+        subject TEXT NOT NULL,
+        hour_of_day INTEGER NOT NULL,
+        behaviour_type TEXT NOT NULL,
+        days INTEGER NOT NULL,
+        mean_minutes REAL NOT NULL,
+        var_minutes REAL NOT NULL,
+        computed_date TEXT NOT NULL,
+        PRIMARY KEY (subject, hour_of_day, behaviour_type)
+    );
+
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject TEXT NOT NULL,
+        camera_id TEXT NOT NULL,
+        horse_id INTEGER,
+        event_id INTEGER NOT NULL,
+        event_ts INTEGER NOT NULL,
+        severity TEXT NOT NULL,
+        alert_type TEXT NOT NULL,
+        behaviour_type TEXT,
+        risk_score REAL NOT NULL,
+        observed_minutes REAL,
+        expected_minutes REAL,
+        created_at TEXT NOT NULL,
+        acknowledged INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(event_id) REFERENCES ingestion_events(id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_alerts_subject ON alerts(subject, event_ts);
+    CREATE INDEX IF NOT EXISTS idx_alerts_event ON alerts(event_id);
+    CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts(event_ts);
+
+    CREATE TABLE IF NOT EXISTS camera_heartbeats (
+        camera_id TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        last_seen_at TEXT NOT NULL
+    );
+"""
+
+
+def _sql_statements(script: str) -> Iterator[str]:
+    # executescript() commits on its own, so the schema is run statement by
+    # statement inside the migration transaction instead.
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row["name"] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    for statement in _sql_statements(SCHEMA_SQL):
+        conn.execute(statement)
+
+
+def _add_detection_labels(conn: sqlite3.Connection) -> None:
+    columns = _columns(conn, "detections")
     if "detection_type" not in columns:
         conn.execute(
             "ALTER TABLE detections ADD COLUMN detection_type TEXT NOT NULL DEFAULT 'object'"
@@ -93,6 +395,554 @@ def _migrate_detections_table(conn: sqlite3.Connection) -> None:
         )
     if "horse_id" not in columns:
         conn.execute("ALTER TABLE detections ADD COLUMN horse_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_event ON detections(event_id, id)")
+
+
+def _add_frame_blobs(conn: sqlite3.Connection) -> None:
+    columns = _columns(conn, "ingestion_events")
+    if "sha256" not in columns:
+        conn.execute("ALTER TABLE ingestion_events ADD COLUMN sha256 TEXT")
+    if "frame_pruned_at" not in columns:
+        conn.execute("ALTER TABLE ingestion_events ADD COLUMN frame_pruned_at TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingestion_events_sha256 ON ingestion_events(sha256)"
+    )
+    if "pinned" not in _columns(conn, "frame_blobs"):
+        conn.execute("ALTER TABLE frame_blobs ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_frame_blobs_retention ON frame_blobs(pinned, created_at)"
+    )
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO storage_totals (name, bytes)
+        SELECT 'frames', COALESCE(SUM(size_bytes), 0) FROM frame_blobs
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_frame_blobs_insert AFTER INSERT ON frame_blobs
+        BEGIN
+            UPDATE storage_totals SET bytes = bytes + NEW.size_bytes WHERE name = 'frames';
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_frame_blobs_delete AFTER DELETE ON frame_blobs
+        BEGIN
+            UPDATE storage_totals SET bytes = bytes - OLD.size_bytes WHERE name = 'frames';
+        END
+        """
+    )
+
+
+def _add_event_timestamps(conn: sqlite3.Connection) -> None:
+    # Epoch milliseconds of captured_at, falling back to received_at when the
+    # camera sent no (or an unparseable) timestamp. Range scans use this
+    # instead of comparing ISO strings.
+    if "event_ts" not in _columns(conn, "ingestion_events"):
+        conn.execute("ALTER TABLE ingestion_events ADD COLUMN event_ts INTEGER")
+        conn.execute(
+            """
+            UPDATE ingestion_events SET event_ts = CAST(ROUND((COALESCE(
+                julianday(captured_at), julianday(received_at)
+            ) - 2440587.5) * 86400000) AS INTEGER)
+            """
+        )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingestion_events_ts ON ingestion_events(event_ts, id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_ingestion_events_camera_ts "
+        "ON ingestion_events(camera_id, event_ts, id)"
+    )
+    # camera_id and event_ts are copied from the event so that filtered
+    # listings are answered from one index without joining events.
+    columns = _columns(conn, "detections")
+    if "camera_id" not in columns:
+        conn.execute("ALTER TABLE detections ADD COLUMN camera_id TEXT")
+    if "event_ts" not in columns:
+        conn.execute("ALTER TABLE detections ADD COLUMN event_ts INTEGER")
+        conn.execute(
+            """
+            UPDATE detections SET
+                camera_id = (SELECT camera_id FROM ingestion_events e WHERE e.id = event_id),
+                event_ts = (SELECT event_ts FROM ingestion_events e WHERE e.id = event_id)
+            """
+        )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections(event_ts, id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_detections_camera_ts ON detections(camera_id, event_ts, id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_detections_label_ts ON detections(label, event_ts, id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_detections_horse_ts ON detections(horse_id, event_ts, id)"
+    )
+
+
+def _add_job_leases(conn: sqlite3.Connection) -> None:
+    columns = _columns(conn, "jobs")
+    if "lease_expires_at" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+    if "worker_id" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT")
+    # Compaction only archives events that have no jobs left.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_event ON jobs(event_id)")
+
+
+def _promote_detection_features(conn: sqlite3.Connection) -> None:
+    # Hot features live in typed columns; features_json keeps only the rest.
+    if "frame_size_bytes" not in _columns(conn, "detections"):
+        conn.execute("ALTER TABLE detections ADD COLUMN frame_size_bytes INTEGER")
+        conn.execute("ALTER TABLE detections ADD COLUMN pipeline_version TEXT")
+        conn.execute(PROMOTE_FEATURES_SQL)
+
+
+def _add_job_priorities(conn: sqlite3.Connection) -> None:
+    columns = _columns(conn, "jobs")
+    if "priority" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+    if "camera_id" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN camera_id TEXT NOT NULL DEFAULT ''")
+        conn.execute(
+            """
+            UPDATE jobs SET camera_id = COALESCE(
+                (SELECT camera_id FROM ingestion_events e WHERE e.id = event_id), ''
+            )
+            WHERE status IN ('pending', 'processing')
+            """
+        )
+    # Every step of a claim (top priority, next camera, a camera's oldest or
+    # newest job) is one seek on this index.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(type, status, priority, camera_id, id)"
+    )
+
+
+def _add_upload_sessions(conn: sqlite3.Connection) -> None:
+    # Resumable uploads: one row per session, one per chunk received. A
+    # session with no chunk before expires_at (epoch seconds) is abandoned.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            camera_id TEXT NOT NULL,
+            captured_at TEXT,
+            filename TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires ON upload_sessions(expires_at)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS upload_chunks (
+            upload_id TEXT NOT NULL,
+            start_byte INTEGER NOT NULL,
+            end_byte INTEGER NOT NULL,
+            PRIMARY KEY (upload_id, start_byte, end_byte)
+        )
+        """
+    )
+
+
+def _track_blob_references(conn: sqlite3.Connection) -> None:
+    # Retention ages a blob from its newest reference, not its first upload.
+    if "last_referenced_at" not in _columns(conn, "frame_blobs"):
+        conn.execute("ALTER TABLE frame_blobs ADD COLUMN last_referenced_at TEXT")
+        conn.execute(
+            """
+            UPDATE frame_blobs SET last_referenced_at = COALESCE(
+                (
+                    SELECT MAX(received_at) FROM ingestion_events e
+                    WHERE e.sha256 = frame_blobs.sha256
+                ),
+                created_at
+            )
+            """
+        )
+    conn.execute("DROP INDEX IF EXISTS idx_frame_blobs_retention")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_frame_blobs_referenced "
+        "ON frame_blobs(pinned, last_referenced_at)"
+    )
+
+
+def _recount_blob_references(conn: sqlite3.Connection) -> None:
+    # refcount counts hot events still holding the blob's file; earlier
+    # releases only ever added to it.
+    conn.execute(
+        """
+        UPDATE frame_blobs SET refcount = (
+            SELECT COUNT(*) FROM ingestion_events e
+            WHERE e.sha256 = frame_blobs.sha256 AND e.frame_pruned_at IS NULL
+        )
+        """
+    )
+
+
+def _count_failed_jobs(conn: sqlite3.Connection) -> None:
+    # Failed jobs stay until compaction archives them, so counting them for
+    # every admission refresh would walk an ever larger range. Triggers keep
+    # a total per job type instead; they only fire when a job enters or
+    # leaves 'failed'. Jobs are always inserted as pending.
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS job_failures (type TEXT PRIMARY KEY, jobs INTEGER NOT NULL)"
+    )
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO job_failures (type, jobs)
+        SELECT type, COUNT(*) FROM jobs WHERE status = 'failed' GROUP BY type
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_failed AFTER UPDATE OF status ON jobs
+        WHEN NEW.status = 'failed' AND OLD.status != 'failed'
+        BEGIN
+            INSERT INTO job_failures (type, jobs) VALUES (NEW.type, 1)
+            ON CONFLICT(type) DO UPDATE SET jobs = jobs + 1;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_unfailed AFTER UPDATE OF status ON jobs
+        WHEN OLD.status = 'failed' AND NEW.status != 'failed'
+        BEGIN
+            UPDATE job_failures SET jobs = jobs - 1 WHERE type = OLD.type;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_failed_delete AFTER DELETE ON jobs
+        WHEN OLD.status = 'failed'
+        BEGIN
+            UPDATE job_failures SET jobs = jobs - 1 WHERE type = OLD.type;
+        END
+        """
+    )
+
+
+def _add_claim_turns(conn: sqlite3.Connection) -> None:
+    # The turn (a counter per job type) at which each camera last had a job
+    # claimed, so cameras keep taking turns from one claim to the next.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS claim_turns (
+            type TEXT NOT NULL,
+            camera_id TEXT NOT NULL,
+            turn INTEGER NOT NULL,
+            PRIMARY KEY (type, camera_id)
+        )
+        """
+    )
+
+
+# Step n brings a database from user_version n to n + 1. Append new steps;
+# never reorder or edit released ones. Each step also tolerates finding its
+# changes already made, since databases from before user_version was kept
+# start at 0 whatever their actual shape.
+MIGRATIONS = (
+    _create_schema,
+    _add_detection_labels,
+    _add_frame_blobs,
+    _add_event_timestamps,
+    _add_job_leases,
+    _promote_detection_features,
+    _add_job_priorities,
+    _add_upload_sessions,
+    _track_blob_references,
+    _recount_blob_references,
+    _count_failed_jobs,
+    _add_claim_turns,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db(db_path: Path | None = None, conn: sqlite3.Connection | None = None) -> None:
+    """Migrate the database to SCHEMA_VERSION.
+
+    Run once at process startup. An up-to-date database costs a single
+    PRAGMA read; a database from a newer release is left alone.
+    """
+    conn = conn or get_conn(db_path)
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return
+    # IMMEDIATE: the migrations read before they write, and a deferred
+    # transaction can't upgrade to a write lock once another connection has
+    # committed, so concurrent callers would fail with "database is locked".
+    with transaction(conn=conn, immediate=True):
+        # Re-read under the write lock: another process may have just migrated.
+        version = schema_version(conn)
+        for migrate in MIGRATIONS[version:]:
+            migrate(conn)
+        conn.execute(f"PRAGMA user_version = {max(version, SCHEMA_VERSION)}")
+
+
+# SQL is kept in module constants so every call hands sqlite3 the identical
+# string and hits the per-connection prepared-statement cache.
+INSERT_EVENT_SQL = """
+    INSERT INTO ingestion_events (
+        camera_id, captured_at, received_at, frame_path, size_bytes, sha256, event_ts, status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Jobs carry their event's camera so per-camera claiming needs no join.
+INSERT_JOB_SQL = """
+    INSERT INTO jobs (
+        type, event_id, status, attempts, created_at, updated_at, priority, camera_id
+    )
+    SELECT ?, ?, 'pending', 0, ?, ?, ?, COALESCE(e.camera_id, '')
+    FROM (SELECT 1) LEFT JOIN ingestion_events e ON e.id = ?
+"""
+
+SELECT_EVENT_SQL = "SELECT * FROM ingestion_events WHERE id = ?"
+
+# Detections used to store every feature in features_json and a 0,0,1,1
+# placeholder box. Runs once, when the typed columns are added.
+PROMOTE_FEATURES_SQL = """
+    UPDATE detections SET
+        frame_size_bytes = CASE json_type(features_json, '$.frame_size_bytes')
+            WHEN 'integer' THEN json_extract(features_json, '$.frame_size_bytes') END,
+        pipeline_version = CASE json_type(features_json, '$.pipeline_version')
+            WHEN 'text' THEN json_extract(features_json, '$.pipeline_version') END,
+        features_json = json_remove(features_json, '$.frame_size_bytes', '$.pipeline_version'),
+        bbox_x = NULL, bbox_y = NULL, bbox_w = NULL, bbox_h = NULL
+    WHERE json_valid(features_json)
+"""
+
+DETECTION_FIELDS = (
+    "id",
+    "event_id",
+    "camera_id",
+    "event_ts",
+    "detection_type",
+    "label",
+    "horse_id",
+    "confidence",
+    "detected_at",
+)
+
+# The API shape of a detection, built by SQLite so that responses can be
+# assembled from row text without decoding and re-encoding every row.
+# Typed feature columns are merged with features_json the same way
+# detection_to_dict does: null values are dropped, features_json wins.
+DETECTION_JSON_SQL = """
+    json_object(
+        'id', id, 'event_id', event_id, 'camera_id', camera_id, 'event_ts', event_ts,
+        'detection_type', detection_type, 'label', label, 'horse_id', horse_id,
+        'confidence', confidence, 'detected_at', detected_at,
+        'features', json_patch(
+            json_patch('{}', json_object(
+                'frame_size_bytes', frame_size_bytes,
+                'pipeline_version', pipeline_version,
+                'bbox', CASE WHEN bbox_x IS NOT NULL
+                    THEN json_array(bbox_x, bbox_y, bbox_w, bbox_h) END
+            )),
+            features_json
+        )
+    )
+"""
+
+DETECTION_JSON_COLUMNS = f"id, event_ts, {DETECTION_JSON_SQL} AS json"
+
+SELECT_EVENT_DETECTIONS_SQL = "SELECT * FROM detections WHERE event_id = ? ORDER BY id ASC"
+
+SELECT_EVENT_DETECTIONS_JSON_SQL = f"""
+    SELECT {DETECTION_JSON_COLUMNS} FROM detections WHERE event_id = ? ORDER BY id ASC
+"""
+
+# Listings are newest first and paged by keyset on (event_ts, id), so every
+# page is a bounded range scan on one of the *_ts indexes.
+LIST_EVENTS_SQL = """
+    SELECT {columns} FROM ingestion_events WHERE {where} ORDER BY event_ts DESC, id DESC LIMIT ?
+"""
+
+LIST_DETECTIONS_SQL = """
+    SELECT {columns} FROM detections WHERE {where} ORDER BY event_ts DESC, id DESC LIMIT ?
+"""
+
+# Exports walk forwards, resuming after the last (event_ts, id) sent.
+EXPORT_DETECTIONS_SQL = """
+    SELECT {columns} FROM detections WHERE {where} ORDER BY event_ts ASC, id ASC LIMIT ?
+"""
+
+# Higher runs first. Backfilled frames (captured long before upload) run last.
+JOB_PRIORITY_BACKFILL = -1
+JOB_PRIORITY_NORMAL = 0
+JOB_PRIORITY_MOTION = 1
+JOB_PRIORITY_ALERT = 2
+
+CLAIM_TOP_PRIORITY_SQL = """
+    SELECT MAX(priority) FROM jobs WHERE type = ? AND status = 'pending' AND priority < ?
+"""
+
+# Distinct cameras as a loose index scan: one seek per camera rather than a
+# walk over every pending job.
+CLAIM_CAMERAS_SQL = """
+    WITH RECURSIVE cameras(camera_id) AS (
+        SELECT MIN(camera_id) FROM jobs WHERE type = ?1 AND status = 'pending' AND priority = ?2
+        UNION ALL
+        SELECT (
+            SELECT MIN(j.camera_id) FROM jobs j
+            WHERE j.type = ?1 AND j.status = 'pending' AND j.priority = ?2
+                AND j.camera_id > cameras.camera_id
+        )
+        FROM cameras WHERE camera_id IS NOT NULL
+    )
+    SELECT camera_id FROM cameras WHERE camera_id IS NOT NULL
+"""
+
+CLAIM_CAMERA_JOBS_SQL = """
+    SELECT id, created_at FROM jobs
+    WHERE type = ? AND status = 'pending' AND priority = ? AND camera_id = ?
+    ORDER BY id ASC
+    LIMIT ?
+"""
+
+CLAIM_TURNS_SQL = "SELECT camera_id, turn FROM claim_turns WHERE type = ?"
+
+UPSERT_CLAIM_TURN_SQL = """
+    INSERT INTO claim_turns (type, camera_id, turn) VALUES (?, ?, ?)
+    ON CONFLICT(type, camera_id) DO UPDATE SET turn = excluded.turn
+"""
+
+CLAIM_CAMERA_NEWEST_SQL = """
+    SELECT MAX(id) FROM jobs
+    WHERE type = ? AND status = 'pending' AND priority = ? AND camera_id = ?
+"""
+
+SUPERSEDE_EVENTS_SQL = """
+    UPDATE ingestion_events SET status = 'superseded'
+    WHERE id IN (
+        SELECT event_id FROM jobs
+        WHERE type = ? AND status = 'pending' AND priority = ? AND camera_id = ? AND id < ?
+    )
+"""
+
+SUPERSEDE_JOBS_SQL = """
+    UPDATE jobs SET status = 'superseded', updated_at = ?
+    WHERE type = ? AND status = 'pending' AND priority = ? AND camera_id = ? AND id < ?
+"""
+
+CLAIM_UPDATE_SQL = """
+    UPDATE jobs
+    SET status = 'processing', attempts = attempts + 1, updated_at = ?,
+        lease_expires_at = ?, worker_id = ?
+    WHERE id = ?
+"""
+
+# Runs inside the claim transaction, which already holds the write lock.
+# The processing set is tiny, so idx_jobs_type_status covers the scan.
+RECLAIM_EXPIRED_SQL = """
+    UPDATE jobs
+    SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+        last_error = CASE
+            WHEN attempts >= ? THEN 'Lease expired after ' || attempts || ' attempts'
+            ELSE last_error
+        END,
+        lease_expires_at = NULL,
+        worker_id = NULL,
+        updated_at = ?
+    WHERE type = ? AND status = 'processing' AND lease_expires_at < ?
+"""
+
+RENEW_LEASE_SQL = """
+    UPDATE jobs SET lease_expires_at = ?
+    WHERE id = ? AND worker_id = ? AND status = 'processing'
+"""
+
+RELEASE_WORKER_SQL = """
+    UPDATE jobs SET lease_expires_at = 0
+    WHERE worker_id = ? AND status = 'processing'
+"""
+
+SELECT_JOB_SQL = "SELECT * FROM jobs WHERE id = ?"
+
+JOB_DONE_SQL = """
+    UPDATE jobs
+    SET status = 'done', updated_at = ?, last_error = NULL,
+        lease_expires_at = NULL, worker_id = NULL
+    WHERE id = ?
+"""
+
+JOB_FAILED_SQL = """
+    UPDATE jobs
+    SET status = 'failed', updated_at = ?, last_error = ?,
+        lease_expires_at = NULL, worker_id = NULL
+    WHERE id = ?
+"""
+
+EVENT_STATUS_SQL = """
+    UPDATE ingestion_events
+    SET status = ?, last_error = ?
+    WHERE id = ?
+"""
+
+INSERT_DETECTION_SQL = """
+    INSERT INTO detections (
+        event_id,
+        detection_type,
+        label,
+        horse_id,
+        confidence,
+        features_json,
+        frame_size_bytes,
+        pipeline_version,
+        class_name,
+        bbox_x,
+        bbox_y,
+        bbox_w,
+        bbox_h,
+        detected_at,
+        camera_id,
+        event_ts
+    )
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, e.camera_id, e.event_ts
+    FROM (SELECT 1) LEFT JOIN ingestion_events e ON e.id = ?
+"""
+
+
+# Bucket widths in seconds, finest first.
+ROLLUP_RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+# One grouped statement per resolution, so a batch of detections costs a few
+# upserts rather than one each. {where} selects the detections to add.
+UPSERT_ROLLUPS_SQL = """
+    INSERT INTO detection_rollups (
+        resolution, bucket_ts, camera_id, horse_id, label, detections, confidence_sum
+    )
+    SELECT ?1, event_ts - event_ts % (?1 * 1000), camera_id, horse_id, label,
+        COUNT(*), SUM(confidence)
+    FROM detections
+    WHERE {where} AND camera_id IS NOT NULL AND event_ts IS NOT NULL
+    GROUP BY 2, camera_id, horse_id, label
+    ON CONFLICT(resolution, bucket_ts, camera_id, IFNULL(horse_id, -1), label)
+    DO UPDATE SET
+        detections = detections + excluded.detections,
+        confidence_sum = confidence_sum + excluded.confidence_sum
+"""
+
+SELECT_TIMELINE_SQL = """
+    SELECT bucket_ts, label, SUM(detections) AS detections,
+        SUM(confidence_sum) AS confidence_sum
+    FROM detection_rollups
+    WHERE {where}
+    GROUP BY bucket_ts, label
+    ORDER BY bucket_ts ASC, label ASC
+"""
 
 
 def insert_ingestion_event(
@@ -101,138 +951,712 @@ def insert_ingestion_event(
     frame_path: str,
     size_bytes: int,
     db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    sha256: str | None = None,
 ) -> int:
     received_at = utc_now_iso()
-    conn = get_conn(db_path)
-    try:
+    with transaction(db_path, conn) as conn:
         cur = conn.execute(
-            """
-            INSERT INTO ingestion_events (
-                camera_id, captured_at, received_at, frame_path, size_bytes, status
-            ) VALUES (?, ?, ?, ?, ?, 'received')
-            """,
-            (camera_id, captured_at, received_at, frame_path, size_bytes),
+            INSERT_EVENT_SQL,
+            (
+                camera_id,
+                captured_at,
+                received_at,
+                frame_path,
+                size_bytes,
+                sha256,
+                event_epoch_ms(captured_at, received_at),
+                "received",
+            ),
         )
-        conn.commit()
         return int(cur.lastrowid)
-    finally:
-        conn.close()
 
 
-def insert_job(job_type: str, event_id: int, db_path: Path | None = None) -> int:
+def insert_job(
+    job_type: str,
+    event_id: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    priority: int = JOB_PRIORITY_NORMAL,
+) -> int:
     now = utc_now_iso()
-    conn = get_conn(db_path)
-    try:
-        cur = conn.execute(
-            """
-            INSERT INTO jobs (type, event_id, status, attempts, created_at, updated_at)
-            VALUES (?, ?, 'pending', 0, ?, ?)
-            """,
-            (job_type, event_id, now, now),
-        )
-        conn.commit()
+    with transaction(db_path, conn) as conn:
+        cur = conn.execute(INSERT_JOB_SQL, (job_type, event_id, now, now, priority, event_id))
         return int(cur.lastrowid)
-    finally:
-        conn.close()
 
 
-def get_event(event_id: int, db_path: Path | None = None) -> sqlite3.Row | None:
-    conn = get_conn(db_path)
-    try:
-        cur = conn.execute("SELECT * FROM ingestion_events WHERE id = ?", (event_id,))
-        return cur.fetchone()
-    finally:
-        conn.close()
+UPSERT_FRAME_BLOB_SQL = """
+    INSERT INTO frame_blobs
+        (sha256, frame_path, size_bytes, refcount, created_at, last_referenced_at)
+    VALUES (?1, ?2, ?3, 1, ?4, ?4)
+    ON CONFLICT(sha256) DO UPDATE SET
+        refcount = refcount + 1,
+        frame_path = excluded.frame_path,
+        last_referenced_at = excluded.last_referenced_at
+"""
+
+SELECT_FRAME_BLOB_SQL = "SELECT * FROM frame_blobs WHERE sha256 = ?"
+
+
+def get_frame_blob(
+    sha256: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> sqlite3.Row | None:
+    conn = conn or get_conn(db_path)
+    return conn.execute(SELECT_FRAME_BLOB_SQL, (sha256,)).fetchone()
+
+
+def insert_event_with_job(
+    camera_id: str,
+    captured_at: str | None,
+    frame_path: str,
+    size_bytes: int,
+    job_type: str,
+    sha256: str | None = None,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    queue: bool = True,
+    priority: int = JOB_PRIORITY_NORMAL,
+) -> tuple[int, int | None]:
+    """Insert an event and its job atomically; returns (event_id, job_id).
+
+    With ``queue`` false the event is only stored and job_id is None.
+    """
+    return insert_events_with_jobs(
+        [(camera_id, captured_at, frame_path, size_bytes, sha256)],
+        job_type,
+        db_path=db_path,
+        conn=conn,
+        queue=[queue],
+        priorities=[priority],
+    )[0]
+
+
+def insert_events_with_jobs(
+    frames: list[tuple[str, str | None, str, int, str | None]],
+    job_type: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    queue: list[bool] | None = None,
+    priorities: list[int] | None = None,
+) -> list[tuple[int, int | None]]:
+    """Bulk form of insert_event_with_job in a single transaction.
+
+    Each frame is (camera_id, captured_at, frame_path, size_bytes, sha256).
+    Frames with a sha256 take a reference on the frame_blobs entry for that
+    content, and the event points at the blob's stored path. ``queue``
+    (default all true) says per frame whether to queue a job; frames without
+    one are stored with status ``stored``. ``priorities`` sets each job's
+    priority (default JOB_PRIORITY_NORMAL). Returns (event_id, job_id) per
+    frame, in order, with job_id None where no job was queued.
+    """
+    received_at = utc_now_iso()
+    ids: list[tuple[int, int | None]] = []
+    queue = queue if queue is not None else [True] * len(frames)
+    priorities = priorities if priorities is not None else [JOB_PRIORITY_NORMAL] * len(frames)
+    with transaction(db_path, conn) as conn:
+        for (camera_id, captured_at, frame_path, size_bytes, sha256), queued, priority in zip(
+            frames, queue, priorities
+        ):
+            if sha256 is not None:
+                conn.execute(
+                    UPSERT_FRAME_BLOB_SQL, (sha256, frame_path, size_bytes, received_at)
+                )
+                frame_path = conn.execute(SELECT_FRAME_BLOB_SQL, (sha256,)).fetchone()[
+                    "frame_path"
+                ]
+            event_ts = event_epoch_ms(captured_at, received_at)
+            event_id = int(
+                conn.execute(
+                    INSERT_EVENT_SQL,
+                    (
+                        camera_id,
+                        captured_at,
+                        received_at,
+                        frame_path,
+                        size_bytes,
+                        sha256,
+                        event_ts,
+                        "received" if queued else "stored",
+                    ),
+                ).lastrowid
+            )
+            if not queued:
+                ids.append((event_id, None))
+                continue
+            job_id = int(
+                conn.execute(
+                    INSERT_JOB_SQL,
+                    (job_type, event_id, received_at, received_at, priority, event_id),
+                ).lastrowid
+            )
+            ids.append((event_id, job_id))
+    return ids
+
+
+INSERT_MQTT_EVENT_SQL = """
+    INSERT INTO mqtt_events (topic, camera_id, kind, payload, received_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+RECENT_MQTT_CAMERAS_SQL = """
+    SELECT DISTINCT camera_id FROM mqtt_events
+    WHERE kind = ? AND received_at >= ? AND camera_id IS NOT NULL
+"""
+
+UPSERT_HEARTBEAT_SQL = """
+    INSERT INTO camera_heartbeats (camera_id, payload, last_seen_at) VALUES (?, ?, ?)
+    ON CONFLICT(camera_id) DO UPDATE SET
+        payload = excluded.payload, last_seen_at = excluded.last_seen_at
+"""
+
+
+def insert_mqtt_messages(
+    messages: list[tuple[str, str | None, str, str, str]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Persist a batch of (topic, camera_id, kind, payload, received_at).
+
+    Heartbeats only keep the latest row per camera; everything else is
+    appended to mqtt_events.
+    """
+    heartbeats = [
+        (camera_id, payload, received_at)
+        for _topic, camera_id, kind, payload, received_at in messages
+        if kind == "heartbeat" and camera_id is not None
+    ]
+    events = [
+        message for message in messages if message[2] != "heartbeat" or message[1] is None
+    ]
+    with transaction(db_path, conn) as conn:
+        conn.executemany(INSERT_MQTT_EVENT_SQL, events)
+        conn.executemany(UPSERT_HEARTBEAT_SQL, heartbeats)
+
+
+def list_recent_mqtt_cameras(
+    kind: str,
+    since: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> set[str]:
+    """Cameras with a ``kind`` MQTT message received at or after ``since`` (ISO 8601)."""
+    conn = conn or get_conn(db_path)
+    return {row[0] for row in conn.execute(RECENT_MQTT_CAMERAS_SQL, (kind, since))}
+
+
+def list_alerting_cameras(
+    since_ts: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> set[str]:
+    """Cameras with an unacknowledged alert at or after ``since_ts`` (epoch ms)."""
+    conn = conn or get_conn(db_path)
+    return {
+        row[0]
+        for row in conn.execute(
+            "SELECT DISTINCT camera_id FROM alerts WHERE event_ts >= ? AND acknowledged = 0",
+            (since_ts,),
+        )
+    }
+
+
+def get_event(
+    event_id: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> sqlite3.Row | None:
+    conn = conn or get_conn(db_path)
+    return conn.execute(SELECT_EVENT_SQL, (event_id,)).fetchone()
 
 
 def list_detections_for_event(
-    event_id: int, db_path: Path | None = None
+    event_id: int,
+    as_json: bool = False,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
 ) -> list[sqlite3.Row]:
-    conn = get_conn(db_path)
+    """Detections of one event; ``as_json`` selects (id, event_ts, json) rows."""
+    sql = SELECT_EVENT_DETECTIONS_JSON_SQL if as_json else SELECT_EVENT_DETECTIONS_SQL
+    conn = conn or get_conn(db_path)
+    return conn.execute(sql, (event_id,)).fetchall()
+
+
+def detection_to_dict(row: sqlite3.Row) -> dict:
+    """A detection row in its API shape, with typed and stored features merged."""
+    record = {name: row[name] for name in DETECTION_FIELDS}
+    features = {}
+    if row["frame_size_bytes"] is not None:
+        features["frame_size_bytes"] = row["frame_size_bytes"]
+    if row["pipeline_version"] is not None:
+        features["pipeline_version"] = row["pipeline_version"]
+    if row["bbox_x"] is not None:
+        features["bbox"] = [row["bbox_x"], row["bbox_y"], row["bbox_w"], row["bbox_h"]]
     try:
-        cur = conn.execute(
-            "SELECT * FROM detections WHERE event_id = ? ORDER BY id ASC", (event_id,)
+        stored = json.loads(row["features_json"] or "{}")
+    except json.JSONDecodeError:
+        stored = {}
+    features.update((key, value) for key, value in stored.items() if value is not None)
+    record["features"] = features
+    return record
+
+
+def _listing_query(
+    sql: str,
+    equals: dict[str, object],
+    since_ts: int | None,
+    until_ts: int | None,
+    before: tuple[int, int] | None,
+    limit: int,
+    columns: str = "*",
+    after: tuple[int, int] | None = None,
+) -> tuple[str, list]:
+    clauses: list[str] = []
+    params: list = []
+    for column, value in equals.items():
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since_ts is not None:
+        clauses.append("event_ts >= ?")
+        params.append(since_ts)
+    if until_ts is not None:
+        clauses.append("event_ts < ?")
+        params.append(until_ts)
+    if before is not None:
+        # The plain upper bound is what the index seeks on; the OR only
+        # filters the rows that share the cursor's timestamp.
+        clauses.append("event_ts <= ? AND (event_ts < ? OR id < ?)")
+        params.extend((before[0], before[0], before[1]))
+    if after is not None:
+        clauses.append("event_ts >= ? AND (event_ts > ? OR id > ?)")
+        params.extend((after[0], after[0], after[1]))
+    return sql.format(columns=columns, where=" AND ".join(clauses) or "1"), [*params, limit]
+
+
+def list_events(
+    camera_id: str | None = None,
+    since_ts: int | None = None,
+    until_ts: int | None = None,
+    before: tuple[int, int] | None = None,
+    limit: int = 100,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    """Events newest first, optionally within [since_ts, until_ts) epoch ms.
+
+    ``before`` is the (event_ts, id) of the last row of the previous page.
+    """
+    sql, params = _listing_query(
+        LIST_EVENTS_SQL, {"camera_id": camera_id}, since_ts, until_ts, before, limit
+    )
+    conn = conn or get_conn(db_path)
+    return conn.execute(sql, params).fetchall()
+
+
+def list_detections(
+    camera_id: str | None = None,
+    label: str | None = None,
+    horse_id: int | None = None,
+    since_ts: int | None = None,
+    until_ts: int | None = None,
+    before: tuple[int, int] | None = None,
+    limit: int = 100,
+    as_json: bool = False,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    """Detections newest first by event time; paged like list_events.
+
+    With ``as_json`` rows are (id, event_ts, json), ``json`` being the
+    detection already serialised as ``detection_to_dict`` would return it.
+    """
+    sql, params = _listing_query(
+        LIST_DETECTIONS_SQL,
+        {"camera_id": camera_id, "label": label, "horse_id": horse_id},
+        since_ts,
+        until_ts,
+        before,
+        limit,
+        columns=DETECTION_JSON_COLUMNS if as_json else "*",
+    )
+    conn = conn or get_conn(db_path)
+    return conn.execute(sql, params).fetchall()
+
+
+def iter_detections_json(
+    camera_id: str | None = None,
+    label: str | None = None,
+    horse_id: int | None = None,
+    since_ts: int | None = None,
+    until_ts: int | None = None,
+    chunk_size: int = 1000,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> Iterator[sqlite3.Row]:
+    """(id, event_ts, json) rows oldest first, read in keyset chunks.
+
+    No read transaction is held between chunks, so long exports don't pin
+    the WAL; rows committed meanwhile ahead of the position are included.
+    """
+    conn = conn or get_conn(db_path)
+    after = None
+    while True:
+        sql, params = _listing_query(
+            EXPORT_DETECTIONS_SQL,
+            {"camera_id": camera_id, "label": label, "horse_id": horse_id},
+            since_ts,
+            until_ts,
+            None,
+            chunk_size,
+            columns=DETECTION_JSON_COLUMNS,
+            after=after,
         )
-        return cur.fetchall()
-    finally:
-        conn.close()
+        rows = conn.execute(sql, params).fetchall()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["event_ts"], rows[-1]["id"])
+
+
+def worker_id_for_pid(pid: int) -> str:
+    return f"{socket.gethostname()}:{pid}"
+
+
+def default_worker_id() -> str:
+    return worker_id_for_pid(os.getpid())
+
+
+def _reclaim_expired(
+    conn: sqlite3.Connection, job_type: str, max_attempts: int, now: float
+) -> int:
+    cur = conn.execute(
+        RECLAIM_EXPIRED_SQL, (max_attempts, max_attempts, utc_now_iso(), job_type, now)
+    )
+    return cur.rowcount
+
+
+def reclaim_expired_jobs(
+    job_type: str,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    with transaction(db_path, conn, immediate=True) as conn:
+        return _reclaim_expired(conn, job_type, max_attempts, time.time())
+
+
+# Only live jobs are counted; done and failed jobs accumulate until compaction.
+QUEUE_DEPTH_SQL = """
+    SELECT status, COUNT(*) FROM jobs
+    WHERE type = ? AND status IN ('pending', 'processing')
+    GROUP BY status
+"""
+
+FAILED_JOBS_SQL = "SELECT jobs FROM job_failures WHERE type = ?"
+
+# Backfill jobs run last by design, so their age says nothing about load.
+# MIN(id) over idx_jobs_claim reads only index entries above that priority.
+OLDEST_PENDING_JOB_SQL = """
+    SELECT created_at FROM jobs WHERE id = (
+        SELECT MIN(id) FROM jobs WHERE type = ? AND status = 'pending' AND priority > ?
+    )
+"""
+
+
+def job_queue_stats(
+    job_type: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> dict:
+    """Queue depth by status and the age of the oldest pending job, in seconds.
+
+    The age leaves out backfill jobs, which wait behind everything else.
+    Live jobs are counted on ``idx_jobs_type_status``; the failed count comes
+    from the trigger-maintained ``job_failures`` total.
+    """
+    conn = conn or get_conn(db_path)
+    stats = {"pending": 0, "processing": 0, "failed": 0}
+    stats.update(conn.execute(QUEUE_DEPTH_SQL, (job_type,)).fetchall())
+    failed = conn.execute(FAILED_JOBS_SQL, (job_type,)).fetchone()
+    stats["failed"] = failed[0] if failed else 0
+    row = conn.execute(OLDEST_PENDING_JOB_SQL, (job_type, JOB_PRIORITY_BACKFILL)).fetchone()
+    created_ms = iso_to_epoch_ms(row[0]) if row else None
+    stats["oldest_pending_age_seconds"] = (
+        max(time.time() - created_ms / 1000, 0.0) if created_ms is not None else 0.0
+    )
+    return stats
+
+
+def _select_claimable(
+    conn: sqlite3.Connection,
+    job_type: str,
+    limit: int,
+    supersede_after_seconds: float | None,
+    now: float,
+) -> list[int]:
+    """Pick up to ``limit`` pending job ids: by priority, then fairly per camera.
+
+    Within a priority level cameras take turns, one job each per round,
+    starting with the camera served longest ago (cameras never served first,
+    then the one whose oldest job has waited longest), so a chatty camera
+    cannot hold back the others. Turns are recorded in ``claim_turns`` and
+    carry over between claims, so this holds for one job per claim too. With
+    ``supersede_after_seconds``, a camera whose oldest job at that level is
+    older than that is behind: only its newest job is taken and the older
+    ones are marked ``superseded`` along with their events.
+    """
+    job_ids: list[int] = []
+    turns = dict(conn.execute(CLAIM_TURNS_SQL, (job_type,)).fetchall())
+    turn = max(turns.values(), default=0)
+    served: dict[str, int] = {}
+    priority = float("inf")
+    while len(job_ids) < limit:
+        (priority,) = conn.execute(CLAIM_TOP_PRIORITY_SQL, (job_type, priority)).fetchone()
+        if priority is None:
+            break
+        wanted = limit - len(job_ids)
+        queues: list[tuple[str, list[int]]] = []
+        for (camera_id,) in conn.execute(CLAIM_CAMERAS_SQL, (job_type, priority)).fetchall():
+            rows = conn.execute(
+                CLAIM_CAMERA_JOBS_SQL, (job_type, priority, camera_id, wanted)
+            ).fetchall()
+            queue = [row["id"] for row in rows]
+            created_ms = iso_to_epoch_ms(rows[0]["created_at"])
+            if (
+                supersede_after_seconds is not None
+                and created_ms is not None
+                and now - created_ms / 1000 > supersede_after_seconds
+            ):
+                # Looked up separately: the newest job may lie past ``wanted``.
+                (newest,) = conn.execute(
+                    CLAIM_CAMERA_NEWEST_SQL, (job_type, priority, camera_id)
+                ).fetchone()
+                if newest != queue[0]:
+                    key = (job_type, priority, camera_id, newest)
+                    conn.execute(SUPERSEDE_EVENTS_SQL, key)
+                    _SUPERSEDED.inc(
+                        conn.execute(SUPERSEDE_JOBS_SQL, (utc_now_iso(), *key)).rowcount
+                    )
+                    queue = [newest]
+            queues.append((camera_id, queue))
+        queues.sort(key=lambda item: (turns.get(item[0], 0), item[1][0]))
+        cameras = [camera_id for camera_id, _queue in queues]
+        for round_ids in itertools.zip_longest(*(queue for _camera, queue in queues)):
+            for camera_id, job_id in zip(cameras, round_ids):
+                if job_id is not None and len(job_ids) < limit:
+                    job_ids.append(job_id)
+                    turn += 1
+                    turns[camera_id] = served[camera_id] = turn
+            if len(job_ids) == limit:
+                break
+    conn.executemany(
+        UPSERT_CLAIM_TURN_SQL, [(job_type, camera_id, t) for camera_id, t in served.items()]
+    )
+    return job_ids
 
 
 def claim_pending_job(
-    job_type: str, db_path: Path | None = None
+    job_type: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    worker_id: str | None = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
 ) -> sqlite3.Row | None:
-    conn = get_conn(db_path)
-    try:
-        conn.execute("BEGIN IMMEDIATE")
-        cur = conn.execute(
-            """
-            SELECT * FROM jobs
-            WHERE type = ? AND status = 'pending'
-            ORDER BY id ASC
-            LIMIT 1
-            """,
-            (job_type,),
-        )
-        row = cur.fetchone()
-        if row is None:
-            conn.rollback()
+    with transaction(db_path, conn, immediate=True) as conn:
+        now = time.time()
+        _reclaim_expired(conn, job_type, max_attempts, now)
+        job_ids = _select_claimable(conn, job_type, 1, None, now)
+        if not job_ids:
             return None
-
         conn.execute(
-            """
-            UPDATE jobs
-            SET status = 'processing', attempts = attempts + 1, updated_at = ?
-            WHERE id = ?
-            """,
-            (utc_now_iso(), row["id"]),
+            CLAIM_UPDATE_SQL,
+            (utc_now_iso(), now + lease_seconds, worker_id or default_worker_id(), job_ids[0]),
         )
-        conn.commit()
-        updated = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
-        return updated
-    finally:
-        conn.close()
+        return conn.execute(SELECT_JOB_SQL, (job_ids[0],)).fetchone()
 
 
-def mark_job_done(job_id: int, db_path: Path | None = None) -> None:
-    conn = get_conn(db_path)
-    try:
-        conn.execute(
-            "UPDATE jobs SET status = 'done', updated_at = ?, last_error = NULL WHERE id = ?",
-            (utc_now_iso(), job_id),
+def claim_pending_jobs_with_events(
+    job_type: str,
+    limit: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    worker_id: str | None = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    supersede_after_seconds: float | None = None,
+) -> list[sqlite3.Row]:
+    """Claim up to ``limit`` pending jobs and return them joined to their events.
+
+    Expired leases are reclaimed first, in the same transaction. Jobs are
+    picked as in ``_select_claimable``. Each row carries the job columns
+    (``id`` is the job id) plus ``frame_path``, ``camera_id``,
+    ``captured_at``, ``event_ts`` and ``sha256`` from the event; those are
+    NULL when the event row is missing.
+    """
+    with transaction(db_path, conn, immediate=True) as conn:
+        now = time.time()
+        _reclaim_expired(conn, job_type, max_attempts, now)
+        job_ids = _select_claimable(conn, job_type, limit, supersede_after_seconds, now)
+        if not job_ids:
+            return []
+        updated_at = utc_now_iso()
+        lease = (now + lease_seconds, worker_id or default_worker_id())
+        conn.executemany(
+            CLAIM_UPDATE_SQL, [(updated_at, *lease, job_id) for job_id in job_ids]
         )
-        conn.commit()
-    finally:
-        conn.close()
+        placeholders = ",".join("?" * len(job_ids))
+        return conn.execute(
+            f"""
+            SELECT
+                jobs.*,
+                ingestion_events.frame_path AS frame_path,
+                ingestion_events.camera_id AS camera_id,
+                ingestion_events.captured_at AS captured_at,
+                ingestion_events.event_ts AS event_ts,
+                ingestion_events.sha256 AS sha256
+            FROM jobs
+            LEFT JOIN ingestion_events ON ingestion_events.id = jobs.event_id
+            WHERE jobs.id IN ({placeholders})
+            ORDER BY jobs.id ASC
+            """,
+            job_ids,
+        ).fetchall()
 
 
-def mark_job_failed(job_id: int, error: str, db_path: Path | None = None) -> None:
-    conn = get_conn(db_path)
-    try:
-        conn.execute(
-            "UPDATE jobs SET status = 'failed', updated_at = ?, last_error = ? WHERE id = ?",
-            (utc_now_iso(), error, job_id),
+def renew_job_leases(
+    job_ids: list[int],
+    worker_id: str,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    expires_at = time.time() + lease_seconds
+    with transaction(db_path, conn) as conn:
+        conn.executemany(
+            RENEW_LEASE_SQL, [(expires_at, job_id, worker_id) for job_id in job_ids]
         )
-        conn.commit()
-    finally:
-        conn.close()
+
+
+def release_worker_leases(
+    worker_id: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """Expire every lease held by ``worker_id`` so the next claim reclaims them."""
+    with transaction(db_path, conn) as conn:
+        return conn.execute(RELEASE_WORKER_SQL, (worker_id,)).rowcount
+
+
+def mark_job_done(
+    job_id: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    with transaction(db_path, conn) as conn:
+        conn.execute(JOB_DONE_SQL, (utc_now_iso(), job_id))
+
+
+def mark_job_failed(
+    job_id: int,
+    error: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    with transaction(db_path, conn) as conn:
+        conn.execute(JOB_FAILED_SQL, (utc_now_iso(), error, job_id))
 
 
 def mark_event_status(
-    event_id: int, status: str, error: str | None = None, db_path: Path | None = None
+    event_id: int,
+    status: str,
+    error: str | None = None,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
 ) -> None:
-    conn = get_conn(db_path)
-    try:
-        conn.execute(
-            """
-            UPDATE ingestion_events
-            SET status = ?, last_error = ?
-            WHERE id = ?
-            """,
-            (status, error, event_id),
+    with transaction(db_path, conn) as conn:
+        conn.execute(EVENT_STATUS_SQL, (status, error, event_id))
+
+
+def mark_jobs_done(
+    job_ids: list[int],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    now = utc_now_iso()
+    with transaction(db_path, conn) as conn:
+        conn.executemany(JOB_DONE_SQL, [(now, job_id) for job_id in job_ids])
+
+
+def mark_jobs_failed(
+    failures: list[tuple[int, str]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    now = utc_now_iso()
+    with transaction(db_path, conn) as conn:
+        conn.executemany(JOB_FAILED_SQL, [(now, error, job_id) for job_id, error in failures])
+
+
+def mark_events_status(
+    updates: list[tuple[int, str, str | None]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Bulk form of mark_event_status; ``updates`` is (event_id, status, error)."""
+    with transaction(db_path, conn) as conn:
+        conn.executemany(
+            EVENT_STATUS_SQL, [(status, error, event_id) for event_id, status, error in updates]
         )
-        conn.commit()
-    finally:
-        conn.close()
+
+
+def _is_bbox(value: object) -> bool:
+    return (
+        isinstance(value, (list, tuple))
+        and len(value) == 4
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+    )
+
+
+def _detection_params(
+    event_id: int,
+    detection_type: str,
+    label: str,
+    confidence: float,
+    horse_id: int | None,
+    features: dict | None,
+    detected_at: str,
+) -> tuple:
+    # Null features are not stored; the rest go to typed columns when they
+    # have the expected type and to features_json otherwise.
+    rest = {key: value for key, value in (features or {}).items() if value is not None}
+    frame_size = rest.get("frame_size_bytes")
+    if isinstance(frame_size, int) and not isinstance(frame_size, bool):
+        del rest["frame_size_bytes"]
+    else:
+        frame_size = None
+    version = rest.get("pipeline_version")
+    if isinstance(version, str):
+        del rest["pipeline_version"]
+    else:
+        version = None
+    bbox = rest.pop("bbox") if _is_bbox(rest.get("bbox")) else (None, None, None, None)
+    return (
+        event_id,
+        detection_type,
+        label,
+        horse_id,
+        confidence,
+        json.dumps(rest, separators=(",", ":")) if rest else "{}",
+        frame_size,
+        version,
+        label,
+        *bbox,
+        detected_at,
+        event_id,
+    )
 
 
 def insert_detection(
@@ -243,43 +1667,746 @@ def insert_detection(
     horse_id: int | None = None,
     features: dict | None = None,
     db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
 ) -> int:
-    conn = get_conn(db_path)
-    try:
-        feature_payload = json.dumps(features or {}, separators=(",", ":"))
-        cur = conn.execute(
-            """
-            INSERT INTO detections (
-                event_id,
-                detection_type,
-                label,
-                horse_id,
-                confidence,
-                features_json,
-                class_name,
-                bbox_x,
-                bbox_y,
-                bbox_w,
-                bbox_h,
-                detected_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                event_id,
-                detection_type,
-                label,
-                horse_id,
-                confidence,
-                feature_payload,
-                label,
-                0.0,
-                0.0,
-                1.0,
-                1.0,
-                utc_now_iso(),
-            ),
+    params = _detection_params(
+        event_id, detection_type, label, confidence, horse_id, features, utc_now_iso()
+    )
+    with transaction(db_path, conn) as conn:
+        cur = conn.execute(INSERT_DETECTION_SQL, params)
+        detection_id = int(cur.lastrowid)
+        roll_up_detections(detection_id, detection_id, conn=conn)
+        return detection_id
+
+
+def insert_detections(
+    rows: list[tuple[int, str, str, float, int | None, dict | None]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Bulk insert of detection rows.
+
+    Each row is (event_id, detection_type, label, confidence, horse_id, features).
+    """
+    if not rows:
+        return
+    now = utc_now_iso()
+    with transaction(db_path, conn) as conn:
+        conn.executemany(
+            INSERT_DETECTION_SQL, [_detection_params(*row, detected_at=now) for row in rows]
+        )
+        # The transaction holds the write lock, so the ids are contiguous.
+        (last_id,) = conn.execute("SELECT last_insert_rowid()").fetchone()
+        roll_up_detections(last_id - len(rows) + 1, last_id, conn=conn)
+
+
+def roll_up_detections(
+    first_id: int,
+    last_id: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Add detections ``first_id``..``last_id`` to every rollup resolution."""
+    sql = UPSERT_ROLLUPS_SQL.format(where="id BETWEEN ?2 AND ?3")
+    with transaction(db_path, conn) as conn:
+        for resolution in ROLLUP_RESOLUTIONS.values():
+            conn.execute(sql, (resolution, first_id, last_id))
+
+
+def rebuild_rollups(
+    since_ts: int,
+    until_ts: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """Recompute every resolution over [since_ts, until_ts) from stored detections.
+
+    Both bounds must be whole days so no bucket is only partly recounted.
+    Returns the number of rollup rows written.
+    """
+    day_ms = ROLLUP_RESOLUTIONS["1d"] * 1000
+    if since_ts % day_ms or until_ts % day_ms:
+        raise ValueError("Rollups are rebuilt in whole UTC days")
+    sql = UPSERT_ROLLUPS_SQL.format(where="event_ts >= ?2 AND event_ts < ?3")
+    written = 0
+    with transaction(db_path, conn, immediate=True) as conn:
+        conn.execute(
+            "DELETE FROM detection_rollups WHERE bucket_ts >= ? AND bucket_ts < ?",
+            (since_ts, until_ts),
+        )
+        for resolution in ROLLUP_RESOLUTIONS.values():
+            written += conn.execute(sql, (resolution, since_ts, until_ts)).rowcount
+    return written
+
+
+def list_timeline(
+    resolution: int,
+    since_ts: int,
+    until_ts: int,
+    camera_id: str | None = None,
+    horse_id: int | None = None,
+    label: str | None = None,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    """Per bucket and label sums of one rollup resolution over [since_ts, until_ts)."""
+    clauses = ["resolution = ?", "bucket_ts >= ?", "bucket_ts < ?"]
+    params: list = [resolution, since_ts, until_ts]
+    for column, value in (("camera_id", camera_id), ("horse_id", horse_id), ("label", label)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    conn = conn or get_conn(db_path)
+    return conn.execute(
+        SELECT_TIMELINE_SQL.format(where=" AND ".join(clauses)), params
+    ).fetchall()
+
+
+UPSERT_DETECTION_CACHE_SQL = """
+    INSERT OR REPLACE INTO detection_cache (sha256, pipeline_version, detections_json, created_at)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+def get_cached_detections(
+    sha256_values: list[str],
+    pipeline_version: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> dict[str, list[dict]]:
+    """Return cached pipeline output for each hash that has an entry for ``pipeline_version``."""
+    if not sha256_values:
+        return {}
+    conn = conn or get_conn(db_path)
+    placeholders = ",".join("?" * len(sha256_values))
+    rows = conn.execute(
+        f"""
+        SELECT sha256, detections_json FROM detection_cache
+        WHERE pipeline_version = ? AND sha256 IN ({placeholders})
+        """,
+        (pipeline_version, *sha256_values),
+    ).fetchall()
+    return {row["sha256"]: json.loads(row["detections_json"]) for row in rows}
+
+
+def store_cached_detections(
+    entries: list[tuple[str, list[dict]]],
+    pipeline_version: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    now = utc_now_iso()
+    with transaction(db_path, conn) as conn:
+        conn.executemany(
+            UPSERT_DETECTION_CACHE_SQL,
+            [
+                (sha256, pipeline_version, json.dumps(dets, separators=(",", ":")), now)
+                for sha256, dets in entries
+            ],
+        )
+
+
+def pin_frame_blobs(
+    sha256_values: list[str],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Mark frames as evidence (they produced detections) so retention keeps them longer."""
+    with transaction(db_path, conn) as conn:
+        conn.executemany(
+            "UPDATE frame_blobs SET pinned = 1 WHERE sha256 = ? AND pinned = 0",
+            [(sha256,) for sha256 in sha256_values],
+        )
+
+
+def get_frame_storage_bytes(
+    db_path: Path | None = None, conn: sqlite3.Connection | None = None
+) -> int:
+    conn = conn or get_conn(db_path)
+    row = conn.execute("SELECT bytes FROM storage_totals WHERE name = 'frames'").fetchone()
+    return int(row["bytes"]) if row else 0
+
+
+def list_expired_frame_blobs(
+    pinned: bool,
+    older_than: str,
+    limit: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    """Blobs last referenced before ``older_than``, least recently referenced first."""
+    conn = conn or get_conn(db_path)
+    return conn.execute(
+        """
+        SELECT sha256, frame_path, size_bytes FROM frame_blobs
+        WHERE pinned = ? AND last_referenced_at < ?
+        ORDER BY last_referenced_at ASC
+        LIMIT ?
+        """,
+        (int(pinned), older_than, limit),
+    ).fetchall()
+
+
+def list_oldest_frame_blobs(
+    limit: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    """Least recently referenced frames, unpinned before pinned: the eviction order."""
+    conn = conn or get_conn(db_path)
+    return conn.execute(
+        """
+        SELECT sha256, frame_path, size_bytes FROM frame_blobs
+        ORDER BY pinned ASC, last_referenced_at ASC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+
+
+SELECT_PRUNABLE_BLOB_SQL = """
+    SELECT 1 FROM frame_blobs
+    WHERE sha256 = ? AND frame_path = ? AND last_referenced_at < ?
+"""
+
+MARK_FRAME_PRUNED_SQL = """
+    UPDATE ingestion_events SET frame_pruned_at = ?
+    WHERE sha256 = ? AND frame_pruned_at IS NULL
+"""
+
+RELEASE_FRAME_BLOB_SQL = "UPDATE frame_blobs SET refcount = refcount - ? WHERE sha256 = ?"
+
+DELETE_UNREFERENCED_BLOB_SQL = "DELETE FROM frame_blobs WHERE sha256 = ? AND refcount <= 0"
+
+# Archived or deleted events give up their reference on the frame they hold.
+RELEASE_EVENT_BLOB_SQL = """
+    UPDATE frame_blobs SET refcount = refcount - 1
+    WHERE sha256 = (
+        SELECT sha256 FROM ingestion_events WHERE id = ? AND frame_pruned_at IS NULL
+    )
+"""
+
+
+def delete_frame_blobs(
+    victims: list[tuple[str, str, str]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[tuple[str, str]]:
+    """Prune blobs: flag the events holding them as pruned and drop the rows.
+
+    ``victims`` are (sha256, frame_path, referenced_before). A blob is only
+    touched while it still has that path and no reference newer than
+    ``referenced_before``, so a blob re-uploaded since it was picked is
+    kept; its row goes only once the released references bring its
+    refcount to 0. Returns (sha256, frame_path) of the rows deleted.
+    """
+    now = utc_now_iso()
+    deleted: list[tuple[str, str]] = []
+    with transaction(db_path, conn, immediate=True) as conn:
+        for sha256, frame_path, referenced_before in victims:
+            if not conn.execute(
+                SELECT_PRUNABLE_BLOB_SQL, (sha256, frame_path, referenced_before)
+            ).fetchone():
+                continue
+            released = conn.execute(MARK_FRAME_PRUNED_SQL, (now, sha256)).rowcount
+            conn.execute(RELEASE_FRAME_BLOB_SQL, (released, sha256))
+            if conn.execute(DELETE_UNREFERENCED_BLOB_SQL, (sha256,)).rowcount:
+                deleted.append((sha256, frame_path))
+    return deleted
+
+
+# Windows are merged additively, so partial windows flushed by several
+# workers (or a late frame after its window was written) add up correctly.
+UPSERT_BEHAVIOUR_WINDOW_SQL = """
+    INSERT INTO behaviour_logs (
+        camera_id, horse_id, behaviour_type, window_start_ts, window_end_ts,
+        detections, confidence_sum, confidence, first_seen_ts, last_seen_ts, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ? / ?, ?, ?, ?)
+    ON CONFLICT(camera_id, IFNULL(horse_id, -1), window_start_ts, behaviour_type)
+    DO UPDATE SET
+        detections = detections + excluded.detections,
+        confidence_sum = confidence_sum + excluded.confidence_sum,
+        confidence = (confidence_sum + excluded.confidence_sum)
+            / (detections + excluded.detections),
+        first_seen_ts = MIN(first_seen_ts, excluded.first_seen_ts),
+        last_seen_ts = MAX(last_seen_ts, excluded.last_seen_ts),
+        updated_at = excluded.updated_at
+"""
+
+SELECT_DETECTIONS_BY_TIME_SQL = """
+    SELECT id, camera_id, horse_id, detection_type, label, confidence, event_ts
+    FROM detections
+    WHERE event_ts >= ? AND event_ts < ? AND (event_ts > ? OR id > ?)
+    ORDER BY event_ts ASC, id ASC
+    LIMIT ?
+"""
+
+
+def upsert_behaviour_windows(
+    windows: list[tuple[str, int | None, str, int, int, int, float, int, int]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Merge windows into behaviour_logs.
+
+    Each window is (camera_id, horse_id, behaviour_type, window_start_ts,
+    window_end_ts, detections, confidence_sum, first_seen_ts, last_seen_ts).
+    """
+    now = utc_now_iso()
+    params = [(*w[:7], w[6], w[5], w[7], w[8], now) for w in windows]
+    with transaction(db_path, conn) as conn:
+        conn.executemany(UPSERT_BEHAVIOUR_WINDOW_SQL, params)
+
+
+def delete_behaviour_logs(
+    since_ts: int,
+    until_ts: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """Delete windows starting in [since_ts, until_ts); returns the row count."""
+    with transaction(db_path, conn) as conn:
+        return conn.execute(
+            "DELETE FROM behaviour_logs WHERE window_start_ts >= ? AND window_start_ts < ?",
+            (since_ts, until_ts),
+        ).rowcount
+
+
+def iter_detections_by_time(
+    since_ts: int,
+    until_ts: int,
+    chunk_size: int = 5000,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> Iterator[sqlite3.Row]:
+    """Stream detections in [since_ts, until_ts) in event-time order.
+
+    Rows are fetched in keyset-paged chunks on idx_detections_ts, so memory
+    stays bounded and no read statement is held open between chunks.
+    """
+    conn = conn or get_conn(db_path)
+    last_ts, last_id = since_ts, -1
+    while True:
+        rows = conn.execute(
+            SELECT_DETECTIONS_BY_TIME_SQL, (last_ts, until_ts, last_ts, last_id, chunk_size)
+        ).fetchall()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_ts, last_id = rows[-1]["event_ts"], rows[-1]["id"]
+
+
+# The subject expression matches server.analysis.baseline_engine.subject_key.
+SELECT_BEHAVIOUR_WINDOWS_SQL = """
+    SELECT
+        CASE WHEN horse_id IS NULL THEN 'camera:' || camera_id ELSE 'horse:' || horse_id END,
+        behaviour_type, window_start_ts, window_end_ts, detections
+    FROM behaviour_logs
+    WHERE window_start_ts >= ? AND window_start_ts < ?
+"""
+
+INSERT_BEHAVIOUR_DAILY_SQL = """
+    INSERT INTO behaviour_daily (subject, day, hour_of_day, behaviour_type, minutes)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+UPSERT_BASELINE_SQL = """
+    INSERT OR REPLACE INTO baselines (
+        subject, hour_of_day, behaviour_type, days, mean_minutes, var_minutes, computed_date
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def iter_behaviour_windows(
+    since_ts: int,
+    until_ts: int,
+    chunk_size: int = 10_000,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> Iterator[list[tuple]]:
+    """Yield behaviour_logs windows starting in [since_ts, until_ts) in chunks.
+
+    Chunks are lists of plain tuples (subject, behaviour_type,
+    window_start_ts, window_end_ts, detections), ready for bulk conversion.
+    The subject is ``horse:<id>``, or ``camera:<id>`` when the horse is unknown.
+    """
+    conn = conn or get_conn(db_path)
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(SELECT_BEHAVIOUR_WINDOWS_SQL, (since_ts, until_ts))
+    while True:
+        chunk = cur.fetchmany(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def replace_behaviour_daily(
+    day: str,
+    rows: list[tuple[str, int, str, float]],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Replace one day's summary; rows are (subject, hour_of_day, behaviour_type, minutes)."""
+    with transaction(db_path, conn) as conn:
+        conn.execute("DELETE FROM behaviour_daily WHERE day = ?", (day,))
+        conn.executemany(
+            INSERT_BEHAVIOUR_DAILY_SQL,
+            [(subject, day, *cell) for subject, *cell in rows],
+        )
+
+
+def list_behaviour_daily(
+    first_day: str,
+    last_day: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[tuple]:
+    """(subject, day, hour_of_day, behaviour_type, minutes) for days in [first_day, last_day]."""
+    conn = conn or get_conn(db_path)
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur.execute(
+        """
+        SELECT subject, day, hour_of_day, behaviour_type, minutes FROM behaviour_daily
+        WHERE day >= ? AND day <= ?
+        """,
+        (first_day, last_day),
+    ).fetchall()
+
+
+def replace_baselines(
+    rows: list[tuple[str, int, str, int, float, float]],
+    computed_date: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Replace the stored baselines with those computed for ``computed_date``.
+
+    Rows are (subject, hour_of_day, behaviour_type, days, mean_minutes,
+    var_minutes); subjects not seen in the baseline period disappear.
+    """
+    with transaction(db_path, conn) as conn:
+        conn.executemany(UPSERT_BASELINE_SQL, [(*row, computed_date) for row in rows])
+        conn.execute("DELETE FROM baselines WHERE computed_date <> ?", (computed_date,))
+
+
+def list_baselines(
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    conn = conn or get_conn(db_path)
+    return conn.execute("SELECT * FROM baselines").fetchall()
+
+
+INSERT_ALERT_SQL = """
+    INSERT INTO alerts (
+        subject, camera_id, horse_id, event_id, event_ts, severity, alert_type,
+        behaviour_type, risk_score, observed_minutes, expected_minutes, created_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# The live feed tails both tables by primary key.
+SELECT_DETECTIONS_AFTER_SQL = "SELECT * FROM detections WHERE id > ? ORDER BY id ASC LIMIT ?"
+
+SELECT_ALERTS_AFTER_SQL = "SELECT * FROM alerts WHERE id > ? ORDER BY id ASC LIMIT ?"
+
+
+def insert_alerts(
+    rows: list[tuple],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    """Bulk insert alerts.
+
+    Each row is (subject, camera_id, horse_id, event_id, event_ts, severity,
+    alert_type, behaviour_type, risk_score, observed_minutes, expected_minutes).
+    """
+    now = utc_now_iso()
+    with transaction(db_path, conn) as conn:
+        conn.executemany(INSERT_ALERT_SQL, [(*row, now) for row in rows])
+
+
+def list_detections_after(
+    after_id: int,
+    limit: int = 500,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    conn = conn or get_conn(db_path)
+    return conn.execute(SELECT_DETECTIONS_AFTER_SQL, (after_id, limit)).fetchall()
+
+
+def list_alerts_after(
+    after_id: int,
+    limit: int = 500,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[sqlite3.Row]:
+    conn = conn or get_conn(db_path)
+    return conn.execute(SELECT_ALERTS_AFTER_SQL, (after_id, limit)).fetchall()
+
+
+def latest_feed_ids(
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> tuple[int, int]:
+    """Highest (detection id, alert id) committed so far."""
+    conn = conn or get_conn(db_path)
+    row = conn.execute(
+        "SELECT (SELECT COALESCE(MAX(id), 0) FROM detections),"
+        " (SELECT COALESCE(MAX(id), 0) FROM alerts)"
+    ).fetchone()
+    return int(row[0]), int(row[1])
+
+
+# Finished jobs in id order; jobs finish roughly in the order they were
+# queued, so the scan stops at the first batch of old enough rows.
+SELECT_FINISHED_JOBS_SQL = """
+    SELECT id, substr(created_at, 1, 7) AS month FROM jobs
+    WHERE type = ? AND status = ? AND updated_at < ?
+    ORDER BY id ASC
+    LIMIT ?
+"""
+
+# Events still referenced by a job or an alert stay in the hot database.
+SELECT_ARCHIVABLE_EVENTS_SQL = """
+    SELECT e.id, strftime('%Y-%m', e.event_ts / 1000, 'unixepoch') AS month
+    FROM ingestion_events e
+    WHERE e.event_ts < ?
+      AND NOT EXISTS (SELECT 1 FROM jobs j WHERE j.event_id = e.id)
+      AND NOT EXISTS (SELECT 1 FROM alerts a WHERE a.event_id = e.id)
+    ORDER BY e.event_ts ASC
+    LIMIT ?
+"""
+
+
+def list_finished_jobs(
+    job_type: str,
+    updated_before: str,
+    limit: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[tuple[int, str]]:
+    """(job id, ``YYYY-MM`` of creation) for finished jobs last touched before a time."""
+    conn = conn or get_conn(db_path)
+    rows: list[tuple[int, str]] = []
+    for status in ("done", "failed", "superseded"):
+        rows.extend(
+            (row["id"], row["month"])
+            for row in conn.execute(
+                SELECT_FINISHED_JOBS_SQL, (job_type, status, updated_before, limit - len(rows))
+            )
+        )
+    return rows
+
+
+def list_archivable_events(
+    before_ts: int,
+    limit: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[tuple[int, str]]:
+    """(event id, ``YYYY-MM`` of event time) for old events nothing refers to any more."""
+    conn = conn or get_conn(db_path)
+    return [
+        (row["id"], row["month"])
+        for row in conn.execute(SELECT_ARCHIVABLE_EVENTS_SQL, (before_ts, limit))
+    ]
+
+
+def delete_jobs(
+    job_ids: list[int],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    with transaction(db_path, conn) as conn:
+        return conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in job_ids]).rowcount
+
+
+def delete_events_with_detections(
+    event_ids: list[int],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> tuple[int, int]:
+    """Delete events and their detections; returns (events, detections) removed.
+
+    Each event's reference on its frame blob is released; retention removes
+    blobs left unreferenced once they age out.
+    """
+    params = [(i,) for i in event_ids]
+    with transaction(db_path, conn) as conn:
+        conn.executemany(RELEASE_EVENT_BLOB_SQL, params)
+        detections = conn.executemany("DELETE FROM detections WHERE event_id = ?", params)
+        events = conn.executemany("DELETE FROM ingestion_events WHERE id = ?", params)
+        return events.rowcount, detections.rowcount
+
+
+def incremental_vacuum(
+    max_pages: int,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int | None:
+    """Return up to ``max_pages`` free pages to the filesystem.
+
+    Returns the number of pages freed, or None when the database was created
+    without ``auto_vacuum = INCREMENTAL`` (see ``enable_incremental_vacuum``).
+    """
+    conn = conn or get_conn(db_path)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return None
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def enable_incremental_vacuum(
+    db_path: Path | None = None, conn: sqlite3.Connection | None = None
+) -> None:
+    """Switch an existing database to incremental auto-vacuum.
+
+    Rewrites the whole file with VACUUM, so run it once with writers stopped.
+    """
+    conn = conn or get_conn(db_path)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+INSERT_UPLOAD_SQL = """
+    INSERT INTO upload_sessions
+        (id, camera_id, captured_at, filename, size_bytes, created_at, expires_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+SELECT_UPLOAD_SQL = "SELECT * FROM upload_sessions WHERE id = ?"
+
+TOUCH_UPLOAD_SQL = "UPDATE upload_sessions SET expires_at = ? WHERE id = ?"
+
+INSERT_UPLOAD_CHUNK_SQL = """
+    INSERT OR IGNORE INTO upload_chunks (upload_id, start_byte, end_byte) VALUES (?, ?, ?)
+"""
+
+SELECT_UPLOAD_CHUNKS_SQL = """
+    SELECT start_byte, end_byte FROM upload_chunks WHERE upload_id = ? ORDER BY start_byte
+"""
+
+SELECT_EXPIRED_UPLOADS_SQL = """
+    SELECT id FROM upload_sessions WHERE expires_at < ? ORDER BY expires_at LIMIT ?
+"""
+
+
+def insert_upload_session(
+    upload_id: str,
+    camera_id: str,
+    captured_at: str | None,
+    filename: str,
+    size_bytes: int,
+    expires_at: float,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> None:
+    with transaction(db_path, conn) as conn:
+        conn.execute(
+            INSERT_UPLOAD_SQL,
+            (upload_id, camera_id, captured_at, filename, size_bytes, utc_now_iso(), expires_at),
+        )
+
+
+def get_upload_session(
+    upload_id: str, db_path: Path | None = None, conn: sqlite3.Connection | None = None
+) -> sqlite3.Row | None:
+    conn = conn or get_conn(db_path)
+    return conn.execute(SELECT_UPLOAD_SQL, (upload_id,)).fetchone()
+
+
+def add_upload_chunk(
+    upload_id: str,
+    start: int,
+    end: int,
+    expires_at: float,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> bool:
+    """Record bytes [start, end) as received and push the session's expiry out.
+
+    Returns False when the session no longer exists (finalized or expired).
+    """
+    with transaction(db_path, conn) as conn:
+        if conn.execute(TOUCH_UPLOAD_SQL, (expires_at, upload_id)).rowcount == 0:
+            return False
+        conn.execute(INSERT_UPLOAD_CHUNK_SQL, (upload_id, start, end))
+        return True
+
+
+def list_upload_ranges(
+    upload_id: str, db_path: Path | None = None, conn: sqlite3.Connection | None = None
+) -> list[tuple[int, int]]:
+    """Received byte ranges of an upload as merged, sorted [start, end) pairs."""
+    conn = conn or get_conn(db_path)
+    ranges: list[tuple[int, int]] = []
+    for start, end in conn.execute(SELECT_UPLOAD_CHUNKS_SQL, (upload_id,)).fetchall():
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def delete_upload_sessions(
+    upload_ids: list[str],
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    params = [(i,) for i in upload_ids]
+    with transaction(db_path, conn) as conn:
+        conn.executemany("DELETE FROM upload_chunks WHERE upload_id = ?", params)
+        return conn.executemany("DELETE FROM upload_sessions WHERE id = ?", params).rowcount
+
+
+def delete_expired_upload_sessions(
+    now: float,
+    limit: int = 100,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+) -> list[str]:
+    """Delete up to ``limit`` sessions that expired before ``now``; returns their ids."""
+    with transaction(db_path, conn, immediate=True) as conn:
+        upload_ids = [
+            row[0] for row in conn.execute(SELECT_EXPIRED_UPLOADS_SQL, (now, limit)).fetchall()
+        ]
+        delete_upload_sessions(upload_ids, conn=conn)
+        return upload_ids
+
+
+def finalize_upload(
+    upload_id: str,
+    frame_path: str,
+    size_bytes: int,
+    sha256: str,
+    job_type: str,
+    db_path: Path | None = None,
+    conn: sqlite3.Connection | None = None,
+    queue: bool = True,
+    priority: int = JOB_PRIORITY_NORMAL,
+) -> tuple[int, int | None] | None:
+    """Close an upload session and insert its event and job in one transaction.
+
+    Returns (event_id, job_id) as ``insert_event_with_job`` does, or None
+    when the session no longer exists.
+    """
+    with transaction(db_path, conn, immediate=True) as conn:
+        session = conn.execute(SELECT_UPLOAD_SQL, (upload_id,)).fetchone()
+        if session is None:
+            return None
+        delete_upload_sessions([upload_id], conn=conn)
+        return insert_event_with_job(
+            session["camera_id"],
+            session["captured_at"],
+            frame_path,
+            size_bytes,
+            job_type,
+            sha256=sha256,
+            conn=conn,
+            queue=queue,
+            priority=priority,
         )
-        conn.commit()
-        return int(cur.lastrowid)
-    finally:
-        conn.close()
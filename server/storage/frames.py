@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+from server.storage.db import get_frame_blob
+
+INCOMING_DIRNAME = ".incoming"
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+
+
+def incoming_path(frames_dir: Path) -> Path:
+    """Scratch path for an upload whose content hash is not known yet."""
+    incoming = frames_dir / INCOMING_DIRNAME
+    incoming.mkdir(parents=True, exist_ok=True)
+    return incoming / f"{uuid4().hex}.part"
+
+
+def upload_path(frames_dir: Path, upload_id: str) -> Path:
+    """File that a resumable upload's chunks are written into, in place."""
+    incoming = frames_dir / INCOMING_DIRNAME
+    incoming.mkdir(parents=True, exist_ok=True)
+    return incoming / f"{upload_id}.upload"
+
+
+def preallocate(path: Path, size: int) -> None:
+    """Create ``path`` at its final size so chunks can be written at any offset.
+
+    Reserves the blocks where the platform allows, so a full disk fails the
+    upload up front rather than partway through.
+    """
+    with path.open("wb") as out:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(out.fileno(), 0, size)
+        else:
+            out.truncate(size)
+
+
+def safe_dirname(name: str) -> str:
+    """``name`` as a single path component that stays inside its parent.
+
+    Anything but letters, digits, ``.``, ``_`` and ``-`` becomes ``_``, and a
+    leading dot is escaped, so ``..`` or ``.incoming`` can't be produced.
+    """
+    safe = UNSAFE_NAME_CHARS.sub("_", name)
+    if not safe or safe.startswith("."):
+        safe = "_" + safe
+    return safe
+
+
+def shard_dir(frames_dir: Path, camera_id: str, received_at: datetime) -> Path:
+    """Directory for frames of one camera and hour: ``<camera>/<YYYY-MM-DD>/<HH>``."""
+    return (
+        frames_dir
+        / safe_dirname(camera_id)
+        / received_at.strftime("%Y-%m-%d")
+        / received_at.strftime("%H")
+    )
+
+
+def blob_path(
+    frames_dir: Path, camera_id: str, received_at: datetime, sha256: str, ext: str
+) -> Path:
+    return shard_dir(frames_dir, camera_id, received_at) / f"{sha256}{ext}"
+
+
+def commit_frame_blob(
+    temp_path: Path,
+    sha256: str,
+    ext: str,
+    frames_dir: Path,
+    camera_id: str,
+    received_at: datetime,
+) -> tuple[Path, bool]:
+    """Move an uploaded frame into content-addressed storage.
+
+    Returns (stored path, duplicate). When a frame with the same content is
+    already stored the upload is discarded and the existing file is reused;
+    the reference itself is taken when the event row is written.
+    """
+    existing = get_frame_blob(sha256)
+    if existing is not None and Path(existing["frame_path"]).exists():
+        temp_path.unlink(missing_ok=True)
+        return Path(existing["frame_path"]), True
+
+    final_path = blob_path(frames_dir, camera_id, received_at, sha256, ext)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, final_path)
+    return final_path, False
+
+
+def remove_frame_file(path: Path, frames_dir: Path) -> None:
+    """Delete a stored frame and any shard directories it leaves empty."""
+    path.unlink(missing_ok=True)
+    parent = path.parent
+    while parent != frames_dir and frames_dir in parent.parents:
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+        parent = parent.parent
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import argparse
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from server.storage.db import (
+    delete_frame_blobs,
+    get_frame_storage_bytes,
+    init_db,
+    list_expired_frame_blobs,
+    list_oldest_frame_blobs,
+)
+from server.storage.frames import remove_frame_file
+
+DEFAULT_FRAMES_DIR = Path("data/frames")
+
+
+@dataclass
+class RetentionPolicy:
+    # Frames that never produced a detection.
+    max_age_seconds: float | None = 7 * 24 * 3600
+    # Pinned frames (evidence for detections) are kept longer.
+    pinned_max_age_seconds: float | None = 30 * 24 * 3600
+    # Evict oldest frames, unpinned first, while stored bytes exceed this.
+    budget_bytes: int | None = None
+
+
+@dataclass
+class PruneStats:
+    files: int = 0
+    bytes: int = 0
+
+
+def _cutoff(now: datetime, max_age_seconds: float) -> str:
+    return (now - timedelta(seconds=max_age_seconds)).isoformat()
+
+
+def prune_once(
+    policy: RetentionPolicy,
+    frames_dir: Path = DEFAULT_FRAMES_DIR,
+    batch_size: int = 500,
+    now: datetime | None = None,
+) -> PruneStats:
+    """Run one bounded retention pass and return what it removed.
+
+    Candidates come from indexed queries on ``frame_blobs`` and the running
+    byte total in ``storage_totals``; the frames directory is never listed.
+    At most ``batch_size`` frames are removed per pass.
+    """
+    now = now or datetime.now(timezone.utc)
+    # sha256 -> (frame_path, size, referenced_before)
+    victims: dict[str, tuple[str, int, str]] = {}
+
+    for pinned, max_age in (
+        (False, policy.max_age_seconds),
+        (True, policy.pinned_max_age_seconds),
+    ):
+        if max_age is None or len(victims) >= batch_size:
+            continue
+        cutoff = _cutoff(now, max_age)
+        for row in list_expired_frame_blobs(pinned, cutoff, batch_size - len(victims)):
+            victims[row["sha256"]] = (row["frame_path"], int(row["size_bytes"]), cutoff)
+
+    if policy.budget_bytes is not None and len(victims) < batch_size:
+        over_budget = get_frame_storage_bytes() - sum(size for _, size, _ in victims.values())
+        over_budget -= policy.budget_bytes
+        if over_budget > 0:
+            for row in list_oldest_frame_blobs(batch_size):
+                if over_budget <= 0 or len(victims) >= batch_size:
+                    break
+                if row["sha256"] in victims:
+                    continue
+                victims[row["sha256"]] = (
+                    row["frame_path"],
+                    int(row["size_bytes"]),
+                    now.isoformat(),
+                )
+                over_budget -= int(row["size_bytes"])
+
+    if not victims:
+        return PruneStats()
+
+    # Rows go first, in one transaction that re-checks each blob, so a frame
+    # re-uploaded since it was picked keeps its file. A crash before the
+    # files are removed leaves a few untracked files behind.
+    deleted = delete_frame_blobs(
+        [(sha256, path, before) for sha256, (path, _size, before) in victims.items()]
+    )
+    for _sha256, frame_path in deleted:
+        remove_frame_file(Path(frame_path), frames_dir)
+    return PruneStats(
+        files=len(deleted), bytes=sum(victims[sha256][1] for sha256, _path in deleted)
+    )
+
+
+def run_retention(
+    policy: RetentionPolicy,
+    frames_dir: Path = DEFAULT_FRAMES_DIR,
+    interval_seconds: float = 60.0,
+    batch_size: int = 500,
+    stop: threading.Event | None = None,
+) -> None:
+    """Prune in small passes; back-to-back while there is a backlog, then idle."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        stats = prune_once(policy, frames_dir, batch_size)
+        if stats.files:
+            print(f"Retention pruned {stats.files} frame(s), {stats.bytes} bytes")
+        if stats.files < batch_size:
+            stop.wait(interval_seconds)
+
+
+class RetentionTask:
+    """Run retention on a background thread, e.g. inside the API process."""
+
+    def __init__(self, policy: RetentionPolicy, frames_dir: Path = DEFAULT_FRAMES_DIR, **kwargs):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=run_retention,
+            args=(policy, frames_dir),
+            kwargs={**kwargs, "stop": self._stop},
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="StableGuard frame retention")
+    parser.add_argument("--frames-dir", type=Path, default=DEFAULT_FRAMES_DIR)
+    parser.add_argument("--max-age-days", type=float, default=7.0)
+    parser.add_argument(
+        "--pinned-max-age-days",
+        type=float,
+        default=30.0,
+        help="Retention for frames that produced detections",
+    )
+    parser.add_argument("--budget-gb", type=float, default=None, help="Disk budget for frames")
+    parser.add_argument("--interval-seconds", type=float, default=60.0)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    args = parser.parse_args()
+
+    init_db()
+    policy = RetentionPolicy(
+        max_age_seconds=args.max_age_days * 24 * 3600,
+        pinned_max_age_seconds=args.pinned_max_age_days * 24 * 3600,
+        budget_bytes=int(args.budget_gb * 1024**3) if args.budget_gb else None,
+    )
+    if args.once:
+        stats = prune_once(policy, args.frames_dir, args.batch_size)
+        print(f"Retention pruned {stats.files} frame(s), {stats.bytes} bytes")
+        return
+    run_retention(policy, args.frames_dir, args.interval_seconds, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import select
+import socket
+import threading
+import time
+from pathlib import Path
+
+# Each idle worker binds a Unix datagram socket here; the ingestion API sends
+# a one-byte datagram to every socket after it queues a job. Datagrams are
+# best effort: a full socket buffer means the worker is already awake, and a
+# missed wakeup only costs one fallback poll interval.
+WAKEUP_DIR = Path("data/run/wakeup")
+# The API's live feed listens here the same way; workers signal it after
+# committing detections or alerts.
+FEED_DIR = Path("data/run/feed")
+
+_HAS_UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+_sender: socket.socket | None = None
+_sender_lock = threading.Lock()
+
+
+def _get_sender() -> socket.socket:
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _sender.setblocking(False)
+        return _sender
+
+
+def notify_job_available(wakeup_dir: Path | None = None) -> int:
+    """Wake every worker listening in ``wakeup_dir``. Returns how many were signalled."""
+    return _notify_all(wakeup_dir or WAKEUP_DIR)
+
+
+def notify_feed(feed_dir: Path | None = None) -> int:
+    """Tell live-feed listeners that new detections or alerts were committed."""
+    return _notify_all(feed_dir or FEED_DIR)
+
+
+def _notify_all(directory: Path) -> int:
+    if not _HAS_UNIX_SOCKETS:
+        return 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+
+    sender = _get_sender()
+    woken = 0
+    for entry in entries:
+        if not entry.name.endswith(".sock"):
+            continue
+        try:
+            sender.sendto(b"j", entry.path)
+            woken += 1
+        except BlockingIOError:
+            # Receiver buffer is full: it has unread wakeups already.
+            woken += 1
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Socket file left behind by a worker that died.
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+        except OSError:
+            continue
+    return woken
+
+
+class JobWakeup:
+    """Wakeup listener for one worker process (or, bound in FEED_DIR, the live feed).
+
+    ``wait(timeout)`` returns as soon as a notification arrives, or after
+    ``timeout`` seconds as a safety-net poll.
+    """
+
+    def __init__(self, wakeup_dir: Path | None = None, name: str | None = None):
+        self.path: Path | None = None
+        self._sock: socket.socket | None = None
+        if not _HAS_UNIX_SOCKETS:
+            return
+        directory = wakeup_dir or WAKEUP_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"{name or f'worker-{os.getpid()}'}.sock"
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._sock.bind(str(self.path))
+
+    def wait(self, timeout: float) -> bool:
+        if self._sock is None:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return False
+        self._drain()
+        return True
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self._sock.recv(64)
+            except BlockingIOError:
+                return
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path is not None:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> JobWakeup:
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+
+def feed_listener(name: str | None = None) -> JobWakeup:
+    return JobWakeup(FEED_DIR, name or f"feed-{os.getpid()}")
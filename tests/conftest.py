@@ -1,3 +1,4 @@
+from collections.abc import Iterator
 from pathlib import Path
 
 import pytest
@@ -5,17 +6,27 @@ from fastapi.testclient import TestClient
 
 from server.api.main import app
 from server.ingestion import api as ingestion_api
+from server.ingestion.admission import AdmissionController
+from server.storage import archive as storage_archive
+from server.storage import async_db
 from server.storage import db as storage_db
+from server.storage import wakeup as storage_wakeup
 
 
 @pytest.fixture
-def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[TestClient]:
     frames_dir = tmp_path / "frames"
     frames_dir.mkdir(parents=True, exist_ok=True)
     db_path = tmp_path / "stableguard.db"
 
     monkeypatch.setattr(ingestion_api, "FRAMES_DIR", frames_dir)
+    monkeypatch.setattr(ingestion_api, "ADMISSION", AdmissionController())
     monkeypatch.setattr(storage_db, "DB_PATH", db_path)
+    monkeypatch.setattr(storage_wakeup, "WAKEUP_DIR", tmp_path / "wakeup")
+    monkeypatch.setattr(storage_wakeup, "FEED_DIR", tmp_path / "feed")
+    monkeypatch.setattr(storage_archive, "ARCHIVE_DIR", tmp_path / "archive")
     storage_db.init_db()
 
-    return TestClient(app)
+    yield TestClient(app)
+    async_db.shutdown()
+    storage_db.close_all_conns()
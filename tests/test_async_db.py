@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from server.monitoring.metrics import REGISTRY
+from server.storage import async_db
+from server.storage import db as storage_db
+
+
+def test_concurrent_writes_share_a_commit_and_fail_alone(client):
+    started, release = threading.Event(), threading.Event()
+
+    def slow(conn):
+        # Holds the writer until the next requests have queued up behind it.
+        started.set()
+        release.wait(5)
+
+    def broken(conn):
+        storage_db.insert_ingestion_event("stable_09", None, "x.jpg", 1, conn=conn)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        first = asyncio.ensure_future(async_db.write(slow))
+        await asyncio.to_thread(started.wait, 5)
+        queued = [
+            asyncio.ensure_future(
+                async_db.insert_event_with_job("stable_01", None, f"{i}.jpg", 1, "detect")
+            )
+            for i in range(5)
+        ]
+        queued.append(asyncio.ensure_future(async_db.write(broken)))
+        await asyncio.sleep(0)  # Let every request reach the writer's queue.
+        release.set()
+        return await asyncio.gather(first, *queued, return_exceptions=True)
+
+    REGISTRY.reset()
+    results = asyncio.run(scenario())
+
+    assert isinstance(results[-1], RuntimeError)
+    event_ids = [event_id for event_id, _job_id in results[1:-1]]
+    assert all(storage_db.get_event(event_id) is not None for event_id in event_ids)
+    cameras = storage_db.get_conn().execute("SELECT DISTINCT camera_id FROM ingestion_events")
+    assert [row[0] for row in cameras] == ["stable_01"]
+    # The slow request, then everything that queued behind it as one group.
+    assert async_db._GROUP_SIZE.count == 2
+    assert async_db._GROUP_SIZE.sum == 7
+
+
+def test_reads_run_on_the_pool(client):
+    event_id, _job_id = storage_db.insert_event_with_job("stable_01", None, "a.jpg", 1, "detect")
+
+    row = asyncio.run(async_db.get_event(event_id))
+    assert row["camera_id"] == "stable_01"
+    with pytest.raises(TypeError):
+        asyncio.run(async_db.get_event())
@@ -0,0 +1,74 @@
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from server.analysis.baseline_engine import BaselineIndex, backfill, update_baselines
+from server.storage import db as storage_db
+
+DAY1 = date(2026, 3, 1)
+DAY2 = date(2026, 3, 2)
+DAY1_10H = 1772359200000  # 2026-03-01T10:00:00Z
+DAY_MS = 86_400_000
+WINDOW_MS = 300_000
+
+
+@pytest.fixture
+def db_path(tmp_path: Path):
+    path = tmp_path / "stableguard.db"
+    storage_db.init_db(path)
+    yield path
+    storage_db.close_all_conns()
+
+
+def _window(camera_id, horse_id, behaviour, start, detections):
+    return (camera_id, horse_id, behaviour, start, start + WINDOW_MS, detections, 0.8, start, start)
+
+
+def _seed(db_path: Path) -> None:
+    storage_db.upsert_behaviour_windows(
+        [
+            _window("stable_01", None, "eating", DAY1_10H, 3),
+            _window("stable_01", None, "standing", DAY1_10H, 1),
+            _window("stable_01", None, "eating", DAY1_10H + DAY_MS, 4),
+            _window("stable_02", 3, "lying", DAY1_10H + DAY_MS + 3_600_000, 2),
+            _window("stable_02", 3, "lying", DAY1_10H + DAY_MS + 3_900_000, 2),
+        ],
+        db_path=db_path,
+    )
+
+
+def test_baselines_are_hourly_means_and_variances(db_path):
+    _seed(db_path)
+    # Every behaviour gets a row for each observed subject-hour.
+    assert backfill(DAY1, DAY2, db_path=db_path) == 6
+
+    index = BaselineIndex(db_path)
+    assert index.computed_date == "2026-03-02"
+    eating = index.lookup("camera:stable_01", 10, "eating")
+    standing = index.lookup("camera:stable_01", 10, "standing")
+    assert eating.days == 2
+    assert eating.mean_minutes == pytest.approx(4.375)
+    assert eating.std_minutes == pytest.approx(0.625)
+    # Standing did not occur on day 2 but the horse was seen: a zero sample.
+    assert standing.mean_minutes == pytest.approx(0.625)
+    lying = index.lookup("horse:3", 11, "lying")
+    assert (lying.days, lying.mean_minutes, lying.std_minutes) == (1, 10.0, 0.0)
+    assert index.lookup("horse:3", 10, "lying") is None
+    never = index.lookup("camera:stable_01", 10, "lying")
+    assert (never.days, never.mean_minutes) == (2, 0.0)
+
+
+def test_daily_update_matches_full_backfill(db_path):
+    _seed(db_path)
+    backfill(DAY1, DAY2, db_path=db_path)
+    full = sorted(tuple(row) for row in storage_db.list_baselines(db_path=db_path))
+
+    storage_db.get_conn(db_path).execute("DELETE FROM behaviour_daily")
+    backfill(DAY1, DAY1, db_path=db_path)
+    update_baselines(DAY2, db_path=db_path)
+    assert sorted(tuple(row) for row in storage_db.list_baselines(db_path=db_path)) == full
+
+    # A day falls out of the 7-day window once it is a week old.
+    update_baselines(date(2026, 3, 8), db_path=db_path)
+    assert BaselineIndex(db_path).lookup("camera:stable_01", 10, "standing") is None
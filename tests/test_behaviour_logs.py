@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+
+from server.analysis.behaviour_logs import BehaviourAggregator, replay
+from server.detection.worker import process_detection_batch
+from server.storage import db as storage_db
+
+MINUTE = 60_000
+T0 = 1772359200000  # 2026-03-01T10:00:00Z, a window boundary
+
+
+@pytest.fixture
+def db_path(tmp_path: Path):
+    path = tmp_path / "stableguard.db"
+    storage_db.init_db(path)
+    yield path
+    storage_db.close_all_conns()
+
+
+def _windows(db_path: Path | None = None) -> list[tuple]:
+    conn = storage_db.get_conn(db_path)
+    return [
+        tuple(row)
+        for row in conn.execute(
+            """
+            SELECT camera_id, horse_id, behaviour_type, window_start_ts, detections,
+                   ROUND(confidence, 4)
+            FROM behaviour_logs ORDER BY window_start_ts, camera_id, behaviour_type
+            """
+        )
+    ]
+
+
+def test_windows_close_on_watermark_and_late_detections_merge(db_path):
+    aggregator = BehaviourAggregator(
+        window_seconds=300, allowed_lateness_seconds=60, flush_windows=1, db_path=db_path
+    )
+    aggregator.add("stable_01", 1, "eating", 0.8, T0 + 1 * MINUTE)
+    aggregator.add("stable_01", 1, "eating", 0.6, T0 + 4 * MINUTE)
+    aggregator.add("stable_02", None, "standing", 0.9, T0 + 2 * MINUTE)
+    # Within the allowed lateness the first window is still open.
+    aggregator.add("stable_01", 1, "eating", 0.7, T0 + 5 * MINUTE + 30_000)
+    assert _windows(db_path) == []
+    assert aggregator.open_windows == 3
+
+    aggregator.add("stable_01", 1, "eating", 0.7, T0 + 6 * MINUTE)
+    assert _windows(db_path) == [
+        ("stable_01", 1, "eating", T0, 2, 0.7),
+        ("stable_02", None, "standing", T0, 1, 0.9),
+    ]
+
+    # A frame for the closed window is merged into the stored row.
+    aggregator.add("stable_01", 1, "eating", 1.0, T0 + 3 * MINUTE)
+    assert aggregator.stats.late_detections == 1
+    aggregator.flush(close_all=True)
+    assert _windows(db_path) == [
+        ("stable_01", 1, "eating", T0, 3, 0.8),
+        ("stable_02", None, "standing", T0, 1, 0.9),
+        ("stable_01", 1, "eating", T0 + 5 * MINUTE, 2, 0.7),
+    ]
+
+
+def test_replay_rebuilds_what_the_worker_aggregated(client):
+    for minute in (0, 2, 7, 12):
+        for camera_id in ("stable_01", "stable_02"):
+            response = client.post(
+                "/ingestion/frame",
+                data={"camera_id": camera_id, "timestamp": f"2026-03-01T10:{minute:02d}:00Z"},
+                files={"frame": ("frame.jpg", f"{camera_id}{minute}".encode(), "image/jpeg")},
+            )
+            assert response.status_code == 200
+
+    aggregator = BehaviourAggregator()
+    assert process_detection_batch(3, aggregator=aggregator) == 3
+    assert process_detection_batch(10, aggregator=aggregator) == 5
+    aggregator.flush(close_all=True)
+    live = _windows()
+    assert sum(row[4] for row in live) == 8
+    assert {row[3] for row in live} == {T0, T0 + 5 * MINUTE, T0 + 10 * MINUTE}
+
+    stats = replay(T0, T0 + 15 * MINUTE)
+    assert stats.detections == 8
+    assert _windows() == live
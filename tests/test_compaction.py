@@ -0,0 +1,142 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from server.detection.worker import process_detection_batch
+from server.storage import db as storage_db
+from server.storage.archive import CompactionPolicy, archive_months, compact_once
+from server.storage.retention import RetentionPolicy, prune_once
+
+# Jobs finish at wall-clock time, so the cut-off for events is set relative
+# to now: everything before April 2026 is old enough to archive.
+APRIL = datetime(2026, 4, 1, tzinfo=timezone.utc)
+EVENT_MAX_AGE = (datetime.now(timezone.utc) - APRIL).total_seconds()
+
+
+def _upload(client, camera_id: str, timestamp: str, payload: bytes) -> dict:
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id, "timestamp": timestamp},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _count(table: str) -> int:
+    return storage_db.get_conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_compaction_archives_by_month_and_listings_read_through(client, tmp_path):
+    timestamps = [
+        "2026-02-10T08:00:00Z",
+        "2026-02-20T08:00:00Z",
+        "2026-03-05T08:00:00Z",
+        "2026-04-14T08:00:00Z",
+    ]
+    uploads = [
+        _upload(client, "stable_01", ts, f"frame-{i}".encode()) for i, ts in enumerate(timestamps)
+    ]
+    assert process_detection_batch(10) == 4
+    pending = _upload(client, "stable_01", "2026-01-01T08:00:00Z", b"still queued")
+    before = client.get("/events", params={"limit": 100}).json()["events"]
+
+    # A zero job age archives every finished job straight away.
+    policy = CompactionPolicy(job_max_age_seconds=0, event_max_age_seconds=EVENT_MAX_AGE)
+    stats = compact_once(policy)
+    assert (stats.jobs, stats.events, stats.detections) == (4, 3, 3)
+    assert compact_once(policy).events == 0
+
+    # The April event is too recent and the January one still has a job.
+    assert _count("ingestion_events") == 2 and _count("detections") == 1 and _count("jobs") == 1
+    # Events go by event time, jobs by the month they were queued in.
+    this_month = datetime.now(timezone.utc).strftime("%Y-%m")
+    assert archive_months() == [this_month, "2026-03", "2026-02"]
+    with storage_db.open_conn(tmp_path / "archive" / "stableguard-2026-02.db") as archive:
+        assert archive.execute("SELECT COUNT(*) FROM detections").fetchone()[0] == 2
+
+    # Listings merge the hot database and the archives, across page boundaries.
+    after = client.get("/events", params={"limit": 100}).json()["events"]
+    assert after == before
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/events", params=params).json()
+        seen.extend(event["id"] for event in page["events"])
+        if not (cursor := page["next_cursor"]):
+            break
+    assert seen == [event["id"] for event in before]
+    assert seen[-1] == pending["event_id"]
+
+    detections = client.get(
+        "/detections", params={"since": "2026-02-15T00:00:00Z", "until": "2026-04-01T00:00:00Z"}
+    ).json()["detections"]
+    assert [d["event_id"] for d in detections] == [uploads[2]["event_id"], uploads[1]["event_id"]]
+    assert detections[0]["features"]["pipeline_version"] == "v0"
+
+
+def test_archives_written_before_feature_columns_are_migrated_on_read(client, tmp_path):
+    _upload(client, "stable_01", "2026-02-10T08:00:00Z", b"archived before")
+    assert process_detection_batch(1) == 1
+    before = client.get("/detections", params={"limit": 10}).json()["detections"]
+    compact_once(CompactionPolicy(job_max_age_seconds=0, event_max_age_seconds=EVENT_MAX_AGE))
+    assert _count("detections") == 0
+
+    # Back then every feature lived in features_json, next to a placeholder box.
+    with storage_db.open_conn(tmp_path / "archive" / "stableguard-2026-02.db") as archive:
+        archive.execute(
+            """
+            UPDATE detections SET
+                features_json = json_set(features_json, '$.frame_size_bytes', frame_size_bytes,
+                                         '$.pipeline_version', pipeline_version),
+                bbox_x = 0, bbox_y = 0, bbox_w = 1, bbox_h = 1
+            """
+        )
+        archive.execute("ALTER TABLE detections DROP COLUMN frame_size_bytes")
+        archive.execute("ALTER TABLE detections DROP COLUMN pipeline_version")
+
+    after = client.get("/detections", params={"limit": 10}).json()["detections"]
+    assert after == before
+    exported = client.get("/detections/export").text.splitlines()
+    assert [json.loads(line) for line in exported] == before
+    with storage_db.open_conn(tmp_path / "archive" / "stableguard-2026-02.db") as archive:
+        row = archive.execute("SELECT frame_size_bytes, bbox_x FROM detections").fetchone()
+        assert tuple(row) == (len(b"archived before"), None)
+
+
+def test_new_databases_return_freed_pages(client):
+    conn = storage_db.get_conn()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    for i in range(40):
+        _upload(client, "stable_01", "2026-01-01T08:00:00Z", bytes([i]) * 64 + b"x" * 4000)
+    process_detection_batch(40)
+    conn.executemany(
+        "UPDATE ingestion_events SET last_error = ? WHERE id = ?",
+        [("x" * 4000, i) for i in range(1, 41)],
+    )
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    stats = compact_once(CompactionPolicy(0, EVENT_MAX_AGE))
+    assert stats.events == 40
+    assert stats.pages_freed > 0
+    assert conn.execute("PRAGMA page_count").fetchone()[0] < pages
+
+
+def test_archived_events_release_their_frame_blobs(client, tmp_path):
+    old = _upload(client, "stable_01", "2026-02-10T08:00:00Z", b"same scene")
+    recent = _upload(client, "stable_01", "2026-04-14T08:00:00Z", b"same scene")
+    assert process_detection_batch(10) == 2
+    blob = storage_db.get_frame_blob(old["sha256"])
+    assert blob["refcount"] == 2
+
+    policy = CompactionPolicy(job_max_age_seconds=0, event_max_age_seconds=EVENT_MAX_AGE)
+    assert compact_once(policy).events == 1
+    assert storage_db.get_frame_blob(old["sha256"])["refcount"] == 1
+
+    # Once it ages out, retention releases the remaining reference and only
+    # then drops the blob.
+    later = datetime.now(timezone.utc) + timedelta(days=60)
+    stats = prune_once(RetentionPolicy(), tmp_path / "frames", now=later)
+    assert stats.files == 1
+    assert storage_db.get_frame_blob(old["sha256"]) is None
+    event = client.get(f"/ingestion/events/{recent['event_id']}").json()
+    assert event["frame_pruned_at"] is not None
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+
+from server.detection import pipeline
+from server.detection.batcher import MicroBatcher
+from server.detection.pipeline import FrameInput, HeuristicBackend
+from server.detection.worker import process_detection_batch
+
+
+def _frame(size: int) -> FrameInput:
+    return FrameInput(path=Path(f"{size}.jpg"), size_bytes=size)
+
+
+def test_full_batch_dispatches_in_one_backend_call():
+    backend = HeuristicBackend()
+    batcher = MicroBatcher(backend, max_batch_size=4, max_wait_seconds=10.0)
+    futures = [batcher.submit(_frame(size)) for size in (3, 4, 5, 6)]
+
+    labels = [future.result(timeout=2)[0].label for future in futures]
+    batcher.close()
+
+    assert labels == ["standing", "walking", "eating", "standing"]
+    assert backend.calls == 1
+    assert batcher.stats.summary()["mean_batch_size"] == 4
+
+
+def test_deadline_flushes_partial_batch():
+    backend = HeuristicBackend()
+    batcher = MicroBatcher(backend, max_batch_size=32, max_wait_seconds=0.01)
+
+    detections = batcher.submit(_frame(7)).result(timeout=2)
+    batcher.close()
+
+    assert detections[0].features["frame_size_bytes"] == 7
+    assert backend.calls == 1
+
+
+def test_backend_error_fails_every_frame_in_batch():
+    class BrokenBackend(HeuristicBackend):
+        def detect_batch(self, frames):
+            raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(BrokenBackend(), max_batch_size=2, max_wait_seconds=10.0)
+    futures = [batcher.submit(_frame(size)) for size in (1, 2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=2)
+    batcher.close()
+
+
+def test_worker_runs_one_inference_call_per_claimed_batch(client, monkeypatch):
+    backend = HeuristicBackend()
+    monkeypatch.setattr(pipeline, "_backend", backend)
+    for i in range(5):
+        response = client.post(
+            "/ingestion/frame",
+            data={"camera_id": f"stable_{i:02d}"},
+            files={"frame": ("frame.jpg", b"\xff\xd8\xff" + bytes(i + 1), "image/jpeg")},
+        )
+        assert response.status_code == 200
+
+    assert process_detection_batch(5) == 5
+    assert backend.calls == 1
+
+
+def test_short_backend_result_fails_every_frame_in_batch():
+    class ShortBackend(HeuristicBackend):
+        def detect_batch(self, frames):
+            return super().detect_batch(frames)[:-1]
+
+    batcher = MicroBatcher(ShortBackend(), max_batch_size=3, max_wait_seconds=10.0)
+    futures = batcher.submit_many([_frame(size) for size in (1, 2, 3)])
+    for future in futures:
+        with pytest.raises(RuntimeError, match="2 results for 3 frames"):
+            future.result(timeout=2)
+    batcher.close()
+
+
+def test_worker_batch_runs_through_micro_batcher(client):
+    for i in range(5):
+        response = client.post(
+            "/ingestion/frame",
+            data={"camera_id": f"stable_{i:02d}"},
+            files={"frame": ("frame.jpg", b"\xff\xd8\xff" + bytes(i + 1), "image/jpeg")},
+        )
+        assert response.status_code == 200
+
+    backend = HeuristicBackend()
+    batcher = MicroBatcher(backend, max_batch_size=2, max_wait_seconds=0.0)
+    assert process_detection_batch(5, detector=batcher) == 5
+    batcher.close()
+
+    assert backend.calls == 3
+    assert batcher.stats.summary()["frames"] == 5
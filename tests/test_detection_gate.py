@@ -0,0 +1,102 @@
+import io
+import random
+
+import numpy as np
+from PIL import Image
+
+from server.detection.gate import DuplicateGate, frame_change, frame_signature
+from server.detection.worker import process_detection_batch
+
+
+def _scene(seed: int, noise_seed: int = 0, size: tuple[int, int] = (640, 480)) -> bytes:
+    """A ~115 KB JPEG: a smooth random layout per ``seed`` plus sensor noise."""
+    layout = np.random.default_rng(seed).integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    scene = Image.fromarray(layout).resize(size, Image.BILINEAR)
+    noise = np.random.default_rng(1000 + noise_seed).normal(0, 12, (size[1], size[0], 3))
+    pixels = np.clip(np.asarray(scene, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def _garbage(seed: int, size: int = 100_000) -> bytes:
+    return b"\xff\xd8\xff" + random.Random(seed).randbytes(size)
+
+
+def _upload(client, camera_id: str, payload: bytes) -> dict:
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _detections(client, event_id: int) -> list[dict]:
+    return client.get(f"/ingestion/events/{event_id}/detections").json()["detections"]
+
+
+def test_signature_change_separates_near_and_far_frames(tmp_path):
+    paths = []
+    for name, data in (("base", _scene(1)), ("near", _scene(1, 1)), ("far", _scene(2))):
+        assert len(data) > 100_000
+        path = tmp_path / f"{name}.jpg"
+        path.write_bytes(data)
+        paths.append(path)
+
+    base_sig, near_sig, far_sig = (frame_signature(path) for path in paths)
+    assert base_sig.shape == (256,)
+    assert frame_change(base_sig, near_sig) < 0.01
+    assert frame_change(base_sig, far_sig) > 0.1
+
+
+def test_unrelated_or_undecodable_frames_are_never_carried(tmp_path):
+    gate = DuplicateGate()
+    for seed in range(2):
+        path = tmp_path / f"scene{seed}.jpg"
+        path.write_bytes(_scene(seed + 10))
+        decision, signature = gate.check("stable_01", path)
+        assert decision.reference_event_id is None
+        gate.record("stable_01", signature, seed)
+
+    # Unrelated compressed bytes of similar size look alike byte-wise; they
+    # must not be compared at all.
+    for seed in range(2):
+        path = tmp_path / f"garbage{seed}.jpg"
+        path.write_bytes(_garbage(seed))
+        decision, signature = gate.check("stable_02", path)
+        assert decision.reference_event_id is None and signature is None
+
+    assert gate.stats.frames_carried == 0
+    assert gate.stats.frames_undecodable == 2
+
+
+def test_near_duplicate_frames_carry_detections_forward(client):
+    first = _upload(client, "stable_01", _scene(1))
+    second = _upload(client, "stable_01", _scene(1, 1))
+    other_camera = _upload(client, "stable_02", _scene(1, 1))
+    changed = _upload(client, "stable_01", _scene(2))
+
+    gate = DuplicateGate()
+    assert process_detection_batch(10, gate=gate) == 4
+
+    reference = _detections(client, first["event_id"])
+    carried = _detections(client, second["event_id"])
+    assert "carried_forward" not in reference[0]["features"]
+    assert carried[0]["label"] == reference[0]["label"]
+    assert carried[0]["features"]["carried_forward"] is True
+    assert carried[0]["features"]["carried_from_event_id"] == first["event_id"]
+    for body in (other_camera, changed):
+        assert "carried_forward" not in _detections(client, body["event_id"])[0]["features"]
+
+    stats = gate.stats.summary()
+    assert stats["frames_checked"] == 4
+    assert stats["frames_carried"] == 1
+    assert stats["detection_saved_ratio"] == 0.25
+
+    # The gate state outlives the batch: a later near-duplicate is carried too.
+    later = _upload(client, "stable_01", _scene(2, 2))
+    assert process_detection_batch(10, gate=gate) == 1
+    features = _detections(client, later["event_id"])[0]["features"]
+    assert features["carried_from_event_id"] == changed["event_id"]
@@ -0,0 +1,184 @@
+import time
+from pathlib import Path
+
+from server.detection.worker import LeaseHeartbeat, process_detection_batch
+from server.storage import db as storage_db
+from server.storage.wakeup import JobWakeup, notify_job_available
+
+
+def _upload(client, camera_id: str, payload: bytes) -> dict:
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_batch_processes_all_claimed_jobs(client):
+    uploads = [_upload(client, f"stable_{i:02d}", b"\xff\xd8\xff" + bytes(i)) for i in range(3)]
+    missing = _upload(client, "field_01", b"\xff\xd8\xffgone")
+    Path(missing["saved_path"]).unlink()
+
+    assert process_detection_batch(10) == 4
+    assert process_detection_batch(10) == 0
+
+    for body in uploads:
+        event = client.get(f"/ingestion/events/{body['event_id']}").json()
+        assert event["status"] == "detected"
+        detections = client.get(f"/ingestion/events/{body['event_id']}/detections").json()
+        assert len(detections["detections"]) == 1
+
+    failed = client.get(f"/ingestion/events/{missing['event_id']}").json()
+    assert failed["status"] == "failed"
+    assert "Frame not found" in failed["last_error"]
+
+    conn = storage_db.get_conn()
+    statuses = dict(conn.execute("SELECT id, status FROM jobs").fetchall())
+    assert statuses[missing["job_id"]] == "failed"
+    assert {statuses[body["job_id"]] for body in uploads} == {"done"}
+
+
+def test_batch_respects_batch_size(client):
+    for i in range(5):
+        _upload(client, "stable_01", b"\xff\xd8\xff" + bytes(i))
+
+    assert process_detection_batch(2) == 2
+    conn = storage_db.get_conn()
+    pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+    assert pending == 3
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(client):
+    body = _upload(client, "stable_01", b"\xff\xd8\xffstuck")
+
+    # A worker that claimed the job and died: its lease is already expired.
+    claimed = storage_db.claim_pending_jobs_with_events(
+        "detect", 1, worker_id="dead:1", lease_seconds=-1
+    )
+    assert [row["id"] for row in claimed] == [body["job_id"]]
+
+    reclaimed = storage_db.claim_pending_jobs_with_events(
+        "detect", 1, worker_id="dead:2", lease_seconds=-1, max_attempts=2
+    )
+    assert [row["attempts"] for row in reclaimed] == [2]
+
+    assert storage_db.reclaim_expired_jobs("detect", max_attempts=2) == 1
+    job = storage_db.get_conn().execute(
+        "SELECT status, last_error, worker_id FROM jobs WHERE id = ?", (body["job_id"],)
+    ).fetchone()
+    assert job["status"] == "failed"
+    assert job["last_error"] == "Lease expired after 2 attempts"
+    assert job["worker_id"] is None
+
+
+def test_released_worker_leases_are_picked_up_by_next_batch(client):
+    body = _upload(client, "stable_01", b"\xff\xd8\xffcrashed")
+    storage_db.claim_pending_jobs_with_events("detect", 1, worker_id="crashed:1")
+    assert process_detection_batch(1) == 0
+
+    assert storage_db.release_worker_leases("crashed:1") == 1
+    assert process_detection_batch(1) == 1
+    event = client.get(f"/ingestion/events/{body['event_id']}").json()
+    assert event["status"] == "detected"
+
+
+def test_lease_heartbeat_renews_without_pooling_a_connection(client):
+    _upload(client, "stable_01", b"\xff\xd8\xffslow")
+    (job,) = storage_db.claim_pending_jobs_with_events(
+        "detect", 1, worker_id="slow:1", lease_seconds=0.15
+    )
+    pooled = len(storage_db._registry)
+
+    with LeaseHeartbeat([int(job["id"])], "slow:1", lease_seconds=0.15):
+        time.sleep(0.3)
+
+    expires_at = storage_db.get_conn().execute(
+        "SELECT lease_expires_at FROM jobs WHERE id = ?", (job["id"],)
+    ).fetchone()[0]
+    assert expires_at > time.time()
+    assert len(storage_db._registry) == pooled
+
+
+def test_upload_wakes_idle_worker(client, tmp_path):
+    with JobWakeup(tmp_path / "wakeup") as wakeup:
+        assert wakeup.wait(0) is False
+
+        started = time.monotonic()
+        _upload(client, "stable_01", b"\xff\xd8\xffwake")
+        assert wakeup.wait(5.0) is True
+        assert time.monotonic() - started < 1.0
+
+        # Pending wakeups are drained, so the next wait times out again.
+        assert wakeup.wait(0) is False
+
+
+def test_notify_removes_stale_worker_sockets(tmp_path):
+    wakeup = JobWakeup(tmp_path, name="dead")
+    wakeup._sock.close()
+
+    assert notify_job_available(tmp_path) == 0
+    assert not (tmp_path / "dead.sock").exists()
+
+
+def test_claims_go_by_priority_then_round_robin_per_camera(client):
+    frames = [("stable_a", None, f"a{i}.jpg", 1, None) for i in range(6)]
+    frames += [("stable_b", None, f"b{i}.jpg", 1, None) for i in range(2)]
+    frames += [("stable_c", None, "c0.jpg", 1, None), ("stable_a", None, "old.jpg", 1, None)]
+    priorities = [storage_db.JOB_PRIORITY_NORMAL] * 8 + [
+        storage_db.JOB_PRIORITY_MOTION,
+        storage_db.JOB_PRIORITY_BACKFILL,
+    ]
+    ids = [
+        job_id
+        for _event_id, job_id in storage_db.insert_events_with_jobs(
+            frames, "detect", priorities=priorities
+        )
+    ]
+    a, b, (c, backfill) = ids[:6], ids[6:8], ids[8:]
+
+    claimed = storage_db.claim_pending_jobs_with_events("detect", 4)
+    assert {row["id"] for row in claimed} == {c, a[0], b[0], a[1]}
+
+    # Everything still pending is now well behind: cameras skip to their newest frame.
+    conn = storage_db.get_conn()
+    conn.execute("UPDATE jobs SET created_at = '2026-01-01T00:00:00+00:00'")
+    claimed = storage_db.claim_pending_jobs_with_events(
+        "detect", 10, supersede_after_seconds=60
+    )
+    assert {row["id"] for row in claimed} == {a[5], b[1], backfill}
+    superseded = conn.execute(
+        "SELECT jobs.id, ingestion_events.status FROM jobs"
+        " JOIN ingestion_events ON ingestion_events.id = jobs.event_id"
+        " WHERE jobs.status = 'superseded' ORDER BY jobs.id"
+    ).fetchall()
+    assert [tuple(row) for row in superseded] == [(job_id, "superseded") for job_id in a[2:5]]
+
+
+def test_cameras_take_turns_across_single_job_claims(client):
+    frames = [("chatty", None, f"c{i}.jpg", 1, None) for i in range(50)]
+    frames += [("quiet", None, "q0.jpg", 1, None), ("other", None, "o0.jpg", 1, None)]
+    storage_db.insert_events_with_jobs(frames, "detect")
+
+    order = [
+        storage_db.claim_pending_jobs_with_events("detect", 1)[0]["camera_id"] for _ in range(5)
+    ]
+    assert order == ["chatty", "quiet", "other", "chatty", "chatty"]
+
+    # A camera that shows up later is served before the one that just had a turn.
+    storage_db.insert_events_with_jobs([("late", None, "l0.jpg", 1, None)], "detect")
+    assert storage_db.claim_pending_jobs_with_events("detect", 1)[0]["camera_id"] == "late"
+    assert process_detection_batch(1) == 1
+
+
+def test_superseding_applies_with_batch_size_one(client):
+    frames = [("stable_a", None, f"a{i}.jpg", 1, None) for i in range(3)]
+    ids = [job_id for _event_id, job_id in storage_db.insert_events_with_jobs(frames, "detect")]
+    conn = storage_db.get_conn()
+    conn.execute("UPDATE jobs SET created_at = '2026-01-01T00:00:00+00:00'")
+
+    claimed = storage_db.claim_pending_jobs_with_events("detect", 1, supersede_after_seconds=60)
+    assert [row["id"] for row in claimed] == [ids[2]]
+    statuses = conn.execute("SELECT status FROM jobs ORDER BY id").fetchall()
+    assert [row[0] for row in statuses] == ["superseded", "superseded", "processing"]
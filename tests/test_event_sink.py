@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from server.ingestion.event_sink import EventSink, RotatingEventLog, parse_topic
+from server.storage import db as storage_db
+
+
+@pytest.fixture
+def db_path(tmp_path: Path):
+    path = tmp_path / "stableguard.db"
+    storage_db.init_db(path)
+    yield path
+    storage_db.close_all_conns()
+
+
+def test_parse_topic():
+    assert parse_topic("stableguard/stable_01/heartbeat") == ("stable_01", "heartbeat")
+    assert parse_topic("other/topic") == (None, "topic")
+
+
+def test_log_buffers_until_flush(tmp_path):
+    log = RotatingEventLog(tmp_path / "events.log", flush_bytes=1024)
+    log.write("a 1\n")
+    assert (tmp_path / "events.log").read_text() == ""
+
+    log.flush()
+    log.write("b 2\n")
+    log.close()
+    assert (tmp_path / "events.log").read_text() == "a 1\nb 2\n"
+
+
+def test_log_rotates_and_prunes(tmp_path):
+    log = RotatingEventLog(tmp_path / "events.log", flush_bytes=1, max_bytes=10, backup_count=2)
+    for i in range(5):
+        log.write(f"line-{i:04d}\n")
+    log.close()
+
+    rotated = sorted(tmp_path.glob("events.log.*"))
+    assert len(rotated) == 2
+    assert rotated[-1].read_text() == "line-0004\n"
+    assert (tmp_path / "events.log").read_text() == ""
+
+
+def test_sink_persists_events_and_latest_heartbeat(tmp_path, db_path):
+    log = RotatingEventLog(tmp_path / "events.log")
+    sink = EventSink(log, persist=True, flush_messages=100, flush_seconds=60, db_path=db_path)
+    sink.record("stableguard/stable_01/events", '{"motion": true}')
+    sink.record("stableguard/stable_01/heartbeat", '{"uptime": 1}')
+    sink.record("stableguard/stable_01/heartbeat", '{"uptime": 2}')
+    sink.close()
+
+    conn = storage_db.get_conn(db_path)
+    events = conn.execute("SELECT camera_id, kind, payload FROM mqtt_events").fetchall()
+    assert [tuple(row) for row in events] == [("stable_01", "events", '{"motion": true}')]
+    heartbeat = conn.execute("SELECT payload FROM camera_heartbeats").fetchall()
+    assert [row["payload"] for row in heartbeat] == ['{"uptime": 2}']
+    assert len((tmp_path / "events.log").read_text().splitlines()) == 3
+
+
+def test_sink_keeps_batch_when_db_write_fails(tmp_path):
+    db_path = tmp_path / "uninitialised.db"
+    log = RotatingEventLog(tmp_path / "events.log")
+    sink = EventSink(log, persist=True, flush_messages=2, flush_seconds=60, db_path=db_path)
+    sink.record("stableguard/stable_01/events", '{"n": 1}')
+    sink.record("stableguard/stable_01/events", '{"n": 2}')
+    with pytest.raises(Exception, match="no such table"):
+        sink.flush()
+
+    storage_db.init_db(db_path)
+    sink.record("stableguard/stable_01/events", '{"n": 3}')
+    sink.close()
+
+    conn = storage_db.get_conn(db_path)
+    events = conn.execute("SELECT payload FROM mqtt_events ORDER BY id").fetchall()
+    assert [row["payload"] for row in events] == ['{"n": 1}', '{"n": 2}', '{"n": 3}']
+    storage_db.close_all_conns()
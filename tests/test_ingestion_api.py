@@ -1,6 +1,10 @@
+import asyncio
+import hashlib
 from pathlib import Path
 
 from server.detection.worker import process_one_detection_job
+from server.ingestion import api as ingestion_api
+from server.storage import db as storage_db
 
 
 def test_api_health(client):
@@ -35,6 +39,7 @@ def test_upload_frame_success(client):
     assert body["camera_id"] == "stable_01"
     assert body["timestamp"] == "2026-02-23T20:00:00Z"
     assert body["size_bytes"] == len(payload)
+    assert body["sha256"] == hashlib.sha256(payload).hexdigest()
 
     saved_path = Path(body["saved_path"])
     assert saved_path.exists()
@@ -88,6 +93,55 @@ def test_upload_frame_rejects_empty_payload(client):
     assert response.json()["detail"] == "Empty frame payload"
 
 
+def test_upload_frame_rejects_oversized_payload(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(ingestion_api, "MAX_FRAME_BYTES", 8)
+    monkeypatch.setattr(ingestion_api, "UPLOAD_CHUNK_BYTES", 4)
+
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": "stable_01"},
+        files={"frame": ("big.jpg", b"0123456789", "image/jpeg")},
+    )
+
+    assert response.status_code == 413
+    assert [p for p in (tmp_path / "frames").rglob("*") if p.is_file()] == []
+
+
+def test_oversized_request_body_is_refused_before_it_is_spooled(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(ingestion_api.upload_frame, "max_body_bytes", 1024)
+    spooled = []
+    monkeypatch.setattr(ingestion_api, "store_upload", lambda *args: spooled.append(args))
+
+    declared = client.post(
+        "/ingestion/frame",
+        data={"camera_id": "stable_01"},
+        files={"frame": ("big.jpg", bytes(4096), "image/jpeg")},
+    )
+    assert declared.status_code == 413
+
+    # Without a Content-Length the body is counted as it streams in.
+    boundary = "stableguard"
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="camera_id"\r\n\r\nstable_01\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="frame"; filename="big.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+
+    def body():
+        yield head
+        yield from [bytes(512)] * 8
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    streamed = client.post(
+        "/ingestion/frame",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert streamed.status_code == 413
+    assert spooled == []
+    assert [p for p in (tmp_path / "frames").rglob("*") if p.is_file()] == []
+
+
 def test_upload_frame_requires_camera_id(client):
     response = client.post(
         "/ingestion/frame",
@@ -106,3 +160,226 @@ def test_upload_frame_requires_valid_file_part(client):
 
     # FastAPI validation rejects this request before endpoint logic runs.
     assert response.status_code == 422
+
+
+def test_upload_frames_batch_writes_all_events_and_jobs(client):
+    payloads = [b"\xff\xd8\xffone", b"\xff\xd8\xfftwo", b"\xff\xd8\xffthree"]
+    response = client.post(
+        "/ingestion/frames",
+        data={
+            "camera_id": ["stable_01", "stable_02", "field_01"],
+            "timestamp": "2026-02-23T20:00:00Z",
+        },
+        files=[("frames", (f"f{i}.jpg", p, "image/jpeg")) for i, p in enumerate(payloads)],
+    )
+
+    assert response.status_code == 200
+    frames = response.json()["frames"]
+    assert [f["camera_id"] for f in frames] == ["stable_01", "stable_02", "field_01"]
+    assert {f["timestamp"] for f in frames} == {"2026-02-23T20:00:00Z"}
+    for payload, frame in zip(payloads, frames):
+        assert Path(frame["saved_path"]).read_bytes() == payload
+        event = client.get(f"/ingestion/events/{frame['event_id']}").json()
+        assert event["camera_id"] == frame["camera_id"]
+        assert event["status"] == "received"
+
+    for _ in frames:
+        assert process_one_detection_job() is True
+    assert process_one_detection_job() is False
+
+
+def test_upload_frames_batch_is_all_or_nothing(client, tmp_path):
+    response = client.post(
+        "/ingestion/frames",
+        data={"camera_id": "stable_01"},
+        files=[
+            ("frames", ("ok.jpg", b"\xff\xd8\xffok", "image/jpeg")),
+            ("frames", ("empty.jpg", b"", "image/jpeg")),
+        ],
+    )
+
+    assert response.status_code == 400
+    assert [p for p in (tmp_path / "frames").rglob("*") if p.is_file()] == []
+    assert process_one_detection_job() is False
+
+
+def test_duplicate_frames_share_storage_and_cached_detections(client):
+    payload = b"\xff\xd8\xffstatic-scene"
+    bodies = []
+    for camera_id in ("stable_01", "stable_01"):
+        response = client.post(
+            "/ingestion/frame",
+            data={"camera_id": camera_id},
+            files={"frame": ("frame.jpg", payload, "image/jpeg")},
+        )
+        assert response.status_code == 200
+        bodies.append(response.json())
+
+    assert [body["duplicate"] for body in bodies] == [False, True]
+    assert bodies[0]["saved_path"] == bodies[1]["saved_path"]
+    assert bodies[0]["event_id"] != bodies[1]["event_id"]
+    blob = storage_db.get_frame_blob(bodies[0]["sha256"])
+    assert blob["refcount"] == 2
+
+    assert process_one_detection_job() is True
+    assert process_one_detection_job() is True
+    first, second = (
+        client.get(f"/ingestion/events/{body['event_id']}/detections").json()["detections"]
+        for body in bodies
+    )
+    assert first[0]["label"] == second[0]["label"]
+    assert "cache_hit" not in first[0]["features"]
+    assert second[0]["features"]["cache_hit"] is True
+
+
+def test_upload_frames_rejects_mismatched_camera_ids(client):
+    response = client.post(
+        "/ingestion/frames",
+        data={"camera_id": ["stable_01", "stable_02"]},
+        files=[("frames", (f"f{i}.jpg", b"abc", "image/jpeg")) for i in range(3)],
+    )
+
+    assert response.status_code == 400
+
+
+def _post_frame(client, camera_id: str, payload: bytes):
+    return client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+
+
+def test_cameras_over_their_rate_get_429_with_retry_after(client):
+    policy = ingestion_api.ADMISSION.policy
+    policy.camera_frames_per_second = 0.1
+    policy.camera_burst_frames = 2
+
+    assert _post_frame(client, "stable_01", b"a").status_code == 200
+    assert _post_frame(client, "stable_01", b"b").status_code == 200
+    refused = _post_frame(client, "stable_01", b"c")
+    assert refused.status_code == 429
+    assert 1 <= int(refused.headers["Retry-After"]) <= 10
+    assert _post_frame(client, "stable_02", b"d").status_code == 200
+
+
+def test_overloaded_queue_stores_frames_without_jobs_except_motion_cameras(client):
+    admission = ingestion_api.ADMISSION
+    admission.policy.max_pending_jobs = 2
+
+    first, second = (_post_frame(client, "stable_01", p).json() for p in (b"a", b"b"))
+    assert first["job_id"] and second["job_id"]
+    stored = _post_frame(client, "stable_01", b"c").json()
+    assert stored["store_only"] is True and stored["job_id"] is None
+    assert storage_db.get_event(stored["event_id"])["status"] == "stored"
+
+    storage_db.insert_mqtt_messages(
+        [("stableguard/stable_02/motion", "stable_02", "motion", "{}", storage_db.utc_now_iso())]
+    )
+    admission.snapshot.taken_at = 0.0  # Force a re-read of the queue and motion.
+    motion_job = _post_frame(client, "stable_02", b"d").json()["job_id"]
+    priority = storage_db.get_conn().execute(
+        "SELECT priority FROM jobs WHERE id = ?", (motion_job,)
+    ).fetchone()[0]
+    assert priority == storage_db.JOB_PRIORITY_MOTION
+    assert _post_frame(client, "stable_03", b"e").json()["store_only"] is True
+
+    admission.policy.overload_mode = "reject"
+    refused = _post_frame(client, "stable_03", b"f")
+    assert refused.status_code == 429
+    assert refused.headers["Retry-After"] == "5"
+
+
+def test_stale_backfill_jobs_do_not_count_as_overload(client):
+    admission = ingestion_api.ADMISSION
+    backfill = client.post(
+        "/ingestion/frame",
+        data={"camera_id": "stable_01", "timestamp": "2026-01-01T08:00:00Z"},
+        files={"frame": ("frame.jpg", b"\xff\xd8\xffbackfill", "image/jpeg")},
+    ).json()
+    conn = storage_db.get_conn()
+    assert conn.execute(
+        "SELECT priority FROM jobs WHERE id = ?", (backfill["job_id"],)
+    ).fetchone()[0] == storage_db.JOB_PRIORITY_BACKFILL
+    conn.execute("UPDATE jobs SET created_at = '2026-01-01T08:00:00+00:00'")
+
+    admission.snapshot.taken_at = 0.0
+    assert _post_frame(client, "stable_02", b"live").json()["store_only"] is False
+    assert admission.snapshot.oldest_pending_seconds == 0.0
+
+    # A stale job at normal priority is real overload.
+    conn.execute("UPDATE jobs SET created_at = '2026-01-01T08:00:00+00:00'")
+    admission.snapshot.taken_at = 0.0
+    assert _post_frame(client, "stable_03", b"late").json()["store_only"] is True
+
+
+def _start_upload(client, payload: bytes, filename: str = "clip.mp4") -> str:
+    response = client.post(
+        "/ingestion/uploads",
+        data={"camera_id": "stable_01", "filename": filename, "size_bytes": len(payload)},
+    )
+    assert response.status_code == 201
+    return response.json()["upload_id"]
+
+
+def test_resumable_upload_in_chunks_becomes_an_event_and_job(client):
+    payload = bytes(range(256)) * 40
+    upload_id = _start_upload(client, payload)
+    url = f"/ingestion/uploads/{upload_id}"
+
+    # Chunks may arrive out of order and be resent after a dropped connection.
+    assert client.put(url, params={"offset": 6000}, content=payload[6000:]).status_code == 200
+    status = client.put(url, params={"offset": 0}, content=payload[:4000]).json()
+    assert status["received"] == [[0, 4000], [6000, len(payload)]]
+    assert status["complete"] is False
+    incomplete = client.post(f"{url}/finalize", data={"sha256": "0" * 64})
+    assert incomplete.status_code == 409
+
+    client.put(url, params={"offset": 3000}, content=payload[3000:6000])
+    assert client.get(url).json()["complete"] is True
+    overrun = client.put(url, params={"offset": len(payload) - 1}, content=b"xx")
+    assert overrun.status_code == 416
+
+    sha256 = hashlib.sha256(payload).hexdigest()
+    finalized = client.post(f"{url}/finalize", data={"sha256": sha256})
+    assert finalized.status_code == 200
+    body = finalized.json()
+    assert body["job_id"] is not None
+    assert Path(body["saved_path"]).read_bytes() == payload
+    assert Path(body["saved_path"]).suffix == ".mp4"
+    assert storage_db.get_event(body["event_id"])["sha256"] == sha256
+    assert client.get(url).status_code == 404
+
+
+def test_upload_refuses_chunks_while_it_is_finalized(client):
+    upload_id = _start_upload(client, b"abcd")
+    url = f"/ingestion/uploads/{upload_id}"
+    guard = ingestion_api._upload_guard(upload_id)
+    guard.finalizing = True
+
+    refused = client.put(url, params={"offset": 0}, content=b"abcd")
+    assert refused.status_code == 409
+    assert client.get(url).json()["received"] == []
+    assert client.post(f"{url}/finalize", data={"sha256": "0" * 64}).status_code == 409
+
+    guard.finalizing = False
+    assert client.put(url, params={"offset": 0}, content=b"abcd").json()["complete"] is True
+
+
+def test_upload_checksum_mismatch_and_abandoned_sessions_are_discarded(client):
+    upload_id = _start_upload(client, b"abcd")
+    url = f"/ingestion/uploads/{upload_id}"
+    client.put(url, params={"offset": 0}, content=b"abcd")
+    wrong = hashlib.sha256(b"abce").hexdigest()
+    mismatch = client.post(f"{url}/finalize", data={"sha256": wrong})
+    assert mismatch.status_code == 422
+    assert client.get(url).status_code == 404
+
+    abandoned = _start_upload(client, b"abcd")
+    part = ingestion_api.upload_path(ingestion_api.FRAMES_DIR, abandoned)
+    assert part.stat().st_size == 4
+    assert asyncio.run(ingestion_api.collect_abandoned_uploads(now=10**12)) == 1
+    assert not part.exists()
+    assert client.get(f"/ingestion/uploads/{abandoned}").status_code == 404
+    conn = storage_db.get_conn()
+    assert conn.execute("SELECT COUNT(*) FROM ingestion_events").fetchone()[0] == 0
@@ -0,0 +1,96 @@
+from datetime import date
+
+from server.analysis.anomaly_scorer import AnomalyScorer
+from server.analysis.baseline_engine import BaselineIndex
+from server.api.websocket import FeedMessage, Subscriber
+from server.detection.worker import process_detection_batch
+from server.storage import db as storage_db
+from server.storage.wakeup import notify_feed
+
+HOUR_10 = 1772359200000  # 2026-03-01T10:00:00Z
+
+
+def _upload(client, camera_id: str, payload: bytes) -> dict:
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id, "timestamp": "2026-03-01T10:00:00Z"},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _seed_baseline(db_path=None) -> None:
+    # Normally stable_01 spends 10:00-11:00 eating and standing, never rolling.
+    storage_db.replace_baselines(
+        [
+            ("camera:stable_01", 10, "eating", 7, 40.0, 4.0),
+            ("camera:stable_01", 10, "standing", 7, 20.0, 4.0),
+            ("camera:stable_01", 10, "rolling", 7, 0.0, 0.0),
+        ],
+        date(2026, 2, 28).isoformat(),
+        db_path=db_path,
+    )
+
+
+def test_scorer_raises_escalating_alerts_for_excess_behaviour(tmp_path):
+    db_path = tmp_path / "stableguard.db"
+    storage_db.init_db(db_path)
+    _seed_baseline(db_path)
+    scorer = AnomalyScorer(BaselineIndex(db_path), min_detections=12)
+
+    def observe(behaviour: str, minute: int):
+        return scorer.observe("stable_01", None, behaviour, 1, HOUR_10 + minute * 60_000)
+
+    normal = ["eating", "eating", "standing"] * 4
+    assert [observe(behaviour, m) for m, behaviour in enumerate(normal)] == [None] * 12
+    alerts = [observe("rolling", 12 + m) for m in range(5)]
+    # Rolling is a colic sign, so it starts one level up and only escalates.
+    assert [alert and alert.severity for alert in alerts] == [None, None, "red", "critical", None]
+    assert alerts[2].expected_minutes == 0.0
+    assert observe("standing", 20) is None
+
+    # A new hour starts from scratch; cameras without a baseline never alert.
+    assert scorer.observe("stable_01", None, "rolling", 1, HOUR_10 + 3_600_000) is None
+    assert all(
+        scorer.observe("stable_09", None, "rolling", 1, HOUR_10 + m) is None for m in range(10)
+    )
+    storage_db.close_all_conns()
+
+
+def test_slow_subscriber_drops_detections_but_keeps_alerts():
+    subscriber = Subscriber(max_pending=4)
+    for i in range(3):
+        subscriber.push(FeedMessage("detection", "stable_01", None, 0, f"d{i}"))
+    subscriber.push(FeedMessage("alert", "stable_01", None, 2, "a0"))
+    subscriber.push(FeedMessage("detection", "stable_01", None, 0, "d3"))
+
+    assert [m.text for m in subscriber.pending] == ["a0"]
+    assert subscriber.dropped == 4
+    for i in range(4):
+        subscriber.push(FeedMessage("alert", "stable_01", None, 2, f"a{i + 1}"))
+    assert subscriber.overflowed
+
+
+def test_websocket_pushes_filtered_detections_and_alerts(client):
+    with client.websocket_connect("/ws/live?camera_id=stable_01&min_severity=red") as ws:
+        _upload(client, "stable_02", b"\xff\xd8\xffother")
+        first = _upload(client, "stable_01", b"\xff\xd8\xffmine")
+        assert process_detection_batch(10) == 2
+
+        message = ws.receive_json()
+        assert message["type"] == "detection"
+        assert message["data"]["event_id"] == first["event_id"]
+        assert message["data"]["features"]["pipeline_version"] == "v0"
+
+        alert = ("camera:stable_01", "stable_01", None, first["event_id"], HOUR_10)
+        storage_db.insert_alerts(
+            [
+                (*alert, "amber", "behaviour_anomaly", "pawing", 3.5, 10.0, 1.0),
+                (*alert, "critical", "behaviour_anomaly", "rolling", 9.0, 20.0, 0.0),
+            ]
+        )
+        notify_feed()
+        message = ws.receive_json()
+        assert message["type"] == "alert"
+        assert message["data"]["severity"] == "critical"
@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+
+from server.api.main import app
+from server.detection.worker import process_detection_batch
+from server.monitoring.metrics import Registry
+
+
+def test_histogram_quantiles_and_prometheus_text():
+    registry = Registry()
+    stage = registry.histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.01, 0.1, 1.0))
+    jobs = registry.counter("jobs_total", "Jobs", ("outcome",))
+    for _ in range(98):
+        stage.labels("detection").observe(0.005)
+    stage.labels("detection").observe(0.5)
+    stage.labels("detection").observe(5.0)
+    jobs.labels("done").inc(3)
+
+    child = stage.labels("detection")
+    assert 0.0 < child.quantile(0.50) <= 0.01
+    assert 0.1 < child.quantile(0.99) <= 1.0
+    assert registry.summary()['stage_seconds{stage="detection"}']["count"] == 100
+
+    text = registry.render_prometheus()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="detection",le="0.01"} 98' in text
+    assert 'stage_seconds_bucket{stage="detection",le="+Inf"} 100' in text
+    assert 'jobs_total{outcome="done"} 3' in text
+
+    registry.reset()
+    assert child.count == 0 and 'jobs_total{outcome="done"} 0' in registry.render_prometheus()
+
+
+def test_metrics_endpoint_reports_stages_and_queue_depth(client):
+    for payload in (b"\xff\xd8\xffone", b"\xff\xd8\xfftwo", b"\xff\xd8\xffthree"):
+        response = client.post(
+            "/ingestion/frame",
+            data={"camera_id": "stable_01"},
+            files={"frame": ("frame.jpg", payload, "image/jpeg")},
+        )
+        assert response.status_code == 200
+    assert process_detection_batch(1) == 1
+
+    # The queue collector is registered by the app's lifespan, not on import.
+    with TestClient(app) as started:
+        response = started.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'stableguard_jobs{type="detect",status="pending"} 2' in text
+    assert 'stableguard_jobs{type="detect",status="processing"} 0' in text
+    stages = ("upload_read", "frame_write", "event_insert", "claim", "detection", "sqlite_commit")
+    for stage in stages:
+        assert f'stableguard_stage_seconds_count{{stage="{stage}"}}' in text
+    assert "stableguard_job_age_at_claim_seconds_count" in text
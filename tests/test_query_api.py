@@ -0,0 +1,210 @@
+import json
+
+from server.storage import db as storage_db
+
+
+def _upload(client, camera_id: str, timestamp: str, payload: bytes) -> dict:
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id, "timestamp": timestamp},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _seed(client) -> list[dict]:
+    uploads = []
+    for minute in range(6):
+        for camera_id in ("stable_01", "stable_02"):
+            uploads.append(
+                _upload(
+                    client,
+                    camera_id,
+                    f"2026-03-01T10:{minute:02d}:00Z",
+                    f"{camera_id}-{minute}".encode(),
+                )
+            )
+    return uploads
+
+
+def test_events_are_paged_by_cursor_within_filters(client):
+    uploads = _seed(client)
+    expected = [
+        body["event_id"]
+        for body in reversed(uploads)
+        if body["camera_id"] == "stable_01" and body["timestamp"] >= "2026-03-01T10:01"
+    ]
+
+    seen: list[int] = []
+    cursor = None
+    while True:
+        params = {"camera_id": "stable_01", "since": "2026-03-01T10:01:00Z", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/events", params=params).json()
+        seen.extend(event["id"] for event in page["events"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+    first = client.get("/events", params={"limit": 1}).json()["events"][0]
+    assert first["event_ts"] == 1772359500000  # 2026-03-01T10:05:00Z
+
+    assert client.get("/events", params={"cursor": "!!"}).status_code == 400
+    assert client.get("/events", params={"since": "yesterday"}).status_code == 400
+
+
+def test_detections_filter_by_label_horse_and_time(client):
+    uploads = _seed(client)
+    rows = [
+        (body["event_id"], "activity", "eating" if i % 3 == 0 else "standing", 0.9, i % 2, None)
+        for i, body in enumerate(uploads)
+    ]
+    storage_db.insert_detections(rows)
+
+    page = client.get(
+        "/detections",
+        params={"label": "eating", "horse_id": 0, "until": "2026-03-01T10:04:00Z"},
+    ).json()
+    assert [d["event_id"] for d in page["detections"]] == [
+        uploads[i]["event_id"] for i in (6, 0)
+    ]
+    assert page["detections"][0]["camera_id"] == "stable_01"
+    assert page["detections"][0]["features"] == {}
+    assert page["next_cursor"] is None
+
+    by_camera = client.get("/detections", params={"camera_id": "stable_02", "limit": 4}).json()
+    assert len(by_camera["detections"]) == 4
+    assert {d["camera_id"] for d in by_camera["detections"]} == {"stable_02"}
+    rest = client.get(
+        "/detections", params={"camera_id": "stable_02", "cursor": by_camera["next_cursor"]}
+    ).json()
+    assert len(rest["detections"]) == 2
+
+
+def test_listing_pages_are_index_range_scans(client):
+    sql, params = storage_db._listing_query(
+        storage_db.LIST_DETECTIONS_SQL,
+        {"camera_id": "stable_01", "label": None, "horse_id": None},
+        None,
+        None,
+        (1772359500000, 10),
+        100,
+    )
+    plan = " ".join(
+        row["detail"] for row in storage_db.get_conn().execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    )
+    assert "idx_detections_camera_ts (camera_id=? AND event_ts<?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+    plan = " ".join(
+        row["detail"]
+        for row in storage_db.get_conn().execute(
+            f"EXPLAIN QUERY PLAN {storage_db.SELECT_EVENT_DETECTIONS_SQL}", (1,)
+        )
+    )
+    assert "idx_detections_event" in plan
+
+
+def test_hot_features_are_typed_columns_and_served_unchanged(client):
+    event_id = _upload(client, "stable_01", "2026-03-01T10:00:00Z", b"typed")["event_id"]
+    features = {
+        "frame_size_bytes": 5,
+        "pipeline_version": "v1",
+        "bbox": [1, 2, 3, 4],
+        "frame_change": 0.5,
+        "note": None,
+    }
+    storage_db.insert_detections([(event_id, "activity", "eating", 0.9, 2, features)])
+
+    (row,) = storage_db.list_detections_for_event(event_id)
+    assert (row["frame_size_bytes"], row["pipeline_version"], row["bbox_w"]) == (5, "v1", 3.0)
+    assert row["features_json"] == '{"frame_change":0.5}'
+
+    expected = storage_db.detection_to_dict(row)
+    assert expected["features"] == {
+        "frame_size_bytes": 5,
+        "pipeline_version": "v1",
+        "bbox": [1.0, 2.0, 3.0, 4.0],
+        "frame_change": 0.5,
+    }
+    body = client.get(f"/ingestion/events/{event_id}/detections").json()
+    assert body == {"event_id": event_id, "detections": [expected]}
+    assert client.get("/detections").json()["detections"] == [expected]
+
+
+def test_legacy_feature_json_is_promoted(client):
+    event_id = _upload(client, "stable_01", "2026-03-01T10:00:00Z", b"legacy")["event_id"]
+    conn = storage_db.get_conn()
+    conn.execute(
+        "INSERT INTO detections (event_id, label, confidence, features_json, bbox_x, bbox_y,"
+        " bbox_w, bbox_h, detected_at, camera_id, event_ts) VALUES (?, 'eating', 0.5, ?,"
+        " 0, 0, 1, 1, '', 'stable_01', 0)",
+        (event_id, '{"frame_size_bytes":6,"pipeline_version":"v0","cache_hit":true}'),
+    )
+    conn.execute(storage_db.PROMOTE_FEATURES_SQL)
+
+    (row,) = storage_db.list_detections_for_event(event_id)
+    assert (row["frame_size_bytes"], row["pipeline_version"], row["bbox_x"]) == (6, "v0", None)
+    assert storage_db.detection_to_dict(row)["features"] == {
+        "frame_size_bytes": 6,
+        "pipeline_version": "v0",
+        "cache_hit": True,
+    }
+
+
+def test_detections_export_streams_ndjson_oldest_first(client):
+    uploads = _seed(client)
+    storage_db.insert_detections(
+        [(body["event_id"], "activity", "standing", 0.8, None, None) for body in uploads]
+    )
+
+    response = client.get("/detections/export", params={"camera_id": "stable_02"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [d["event_id"] for d in exported] == [
+        body["event_id"] for body in uploads if body["camera_id"] == "stable_02"
+    ]
+
+    chunked = storage_db.iter_detections_json(since_ts=exported[0]["event_ts"], chunk_size=4)
+    assert len(list(chunked)) == len(uploads)
+
+
+def test_timeline_reads_rollups_at_the_resolution_that_fits(client):
+    uploads = _seed(client)
+    storage_db.insert_detections(
+        [
+            (body["event_id"], "activity", "eating" if i < 4 else "standing", 0.5, 1, None)
+            for i, body in enumerate(uploads)
+        ]
+    )
+    storage_db.insert_detection(uploads[0]["event_id"], "activity", "eating", 1.0, horse_id=1)
+
+    hour = {"since": "2026-03-01T10:00:00Z", "until": "2026-03-01T11:00:00Z"}
+    minutes = client.get("/timeline", params={**hour, "horse_id": 1}).json()
+    assert minutes["resolution"] == "1m"
+    assert minutes["buckets"][:2] == [
+        {"bucket_ts": 1772359200000, "label": "eating", "detections": 3, "confidence": 2 / 3},
+        {"bucket_ts": 1772359260000, "label": "eating", "detections": 2, "confidence": 0.5},
+    ]
+
+    hourly = client.get("/timeline", params={**hour, "points": 10}).json()
+    assert hourly["resolution"] == "1h"
+    assert [(b["label"], b["detections"]) for b in hourly["buckets"]] == [
+        ("eating", 5),
+        ("standing", 8),
+    ]
+
+    before = storage_db.get_conn().execute(
+        "SELECT * FROM detection_rollups ORDER BY 1, 2, 3, 5"
+    ).fetchall()
+    day_start = 1772323200000  # 2026-03-01T00:00:00Z
+    storage_db.rebuild_rollups(day_start, day_start + 86_400_000)
+    after = storage_db.get_conn().execute(
+        "SELECT * FROM detection_rollups ORDER BY 1, 2, 3, 5"
+    ).fetchall()
+    assert [tuple(row) for row in after] == [tuple(row) for row in before]
+
+    assert client.get("/timeline", params={"resolution": "5m"}).status_code == 400
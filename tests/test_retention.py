@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from server.detection.worker import process_detection_batch
+from server.storage import db as storage_db
+from server.storage.retention import RetentionPolicy, prune_once
+
+
+def _upload(client, camera_id: str, payload: bytes) -> dict:
+    response = client.post(
+        "/ingestion/frame",
+        data={"camera_id": camera_id},
+        files={"frame": ("frame.jpg", payload, "image/jpeg")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_frames_are_sharded_by_camera_and_hour(client, tmp_path):
+    body = _upload(client, "stable 01", b"\xff\xd8\xffshard")
+    relative = Path(body["saved_path"]).relative_to(tmp_path / "frames")
+    camera, day, hour, name = relative.parts
+    received = datetime.fromisoformat(body["received_at"])
+    assert camera == "stable_01"
+    assert day == received.strftime("%Y-%m-%d")
+    assert hour == received.strftime("%H")
+    assert name == f"{body['sha256']}.jpg"
+
+
+def test_age_retention_keeps_pinned_frames_longer(client, tmp_path):
+    pinned = _upload(client, "stable_01", b"\xff\xd8\xffpinned")
+    assert process_detection_batch(10) == 1
+    unpinned = _upload(client, "stable_01", b"\xff\xd8\xffunpinned")
+    assert storage_db.get_frame_storage_bytes() == pinned["size_bytes"] + unpinned["size_bytes"]
+
+    policy = RetentionPolicy(max_age_seconds=3600, pinned_max_age_seconds=3 * 3600)
+    later = datetime.now(timezone.utc) + timedelta(hours=2)
+    stats = prune_once(policy, tmp_path / "frames", now=later)
+
+    assert stats.files == 1
+    assert not Path(unpinned["saved_path"]).exists()
+    assert Path(pinned["saved_path"]).exists()
+    event = client.get(f"/ingestion/events/{unpinned['event_id']}").json()
+    assert event["frame_pruned_at"] is not None
+    assert storage_db.get_frame_storage_bytes() == pinned["size_bytes"]
+
+
+def test_budget_evicts_oldest_until_under_budget(client, tmp_path):
+    bodies = [_upload(client, "field_01", bytes([i]) * 100) for i in range(4)]
+
+    stats = prune_once(RetentionPolicy(None, None, budget_bytes=250), tmp_path / "frames")
+
+    assert stats.files == 2
+    assert [Path(b["saved_path"]).exists() for b in bodies] == [False, False, True, True]
+    assert storage_db.get_frame_storage_bytes() == 200
+    assert prune_once(RetentionPolicy(None, None, budget_bytes=250), tmp_path / "frames").files == 0
+
+
+def test_camera_ids_cannot_escape_the_frames_dir(client, tmp_path):
+    frames_dir = tmp_path / "frames"
+    for i, camera_id in enumerate(("..", "../up", "a\\..\\b", ".incoming")):
+        body = _upload(client, camera_id, b"\xff\xd8\xffcam" + bytes([i]))
+        relative = Path(body["saved_path"]).relative_to(frames_dir)
+        assert relative.parts[0] not in ("..", ".", ".incoming")
+        assert len(relative.parts) == 4
+
+
+def test_age_retention_counts_from_the_latest_reference(client, tmp_path):
+    first = _upload(client, "stable_01", b"\xff\xd8\xffstatic")
+    conn = storage_db.get_conn()
+    conn.execute("UPDATE frame_blobs SET created_at = '2026-01-01T00:00:00+00:00'")
+    conn.execute("UPDATE ingestion_events SET received_at = '2026-01-01T00:00:00+00:00'")
+    # The same content arrives again today: the blob is still in use.
+    again = _upload(client, "stable_01", b"\xff\xd8\xffstatic")
+    assert again["duplicate"] is True
+
+    stats = prune_once(RetentionPolicy(max_age_seconds=3600), tmp_path / "frames")
+
+    assert stats.files == 0
+    assert Path(first["saved_path"]).exists()
+    assert client.get(f"/ingestion/events/{again['event_id']}").json()["frame_pruned_at"] is None
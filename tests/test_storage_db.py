@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+from server.storage import db as storage_db
+
+
+@pytest.fixture
+def db_path(tmp_path: Path):
+    path = tmp_path / "stableguard.db"
+    storage_db.init_db(path)
+    yield path
+    storage_db.close_all_conns()
+
+
+def test_get_conn_is_pooled_per_thread(db_path):
+    conn = storage_db.get_conn(db_path)
+    assert storage_db.get_conn(db_path) is conn
+
+    other: list = []
+    thread = threading.Thread(target=lambda: other.append(storage_db.get_conn(db_path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_connection_uses_wal(db_path):
+    conn = storage_db.get_conn(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
+def test_helpers_join_shared_transaction(db_path):
+    with pytest.raises(RuntimeError):
+        with storage_db.transaction(db_path) as conn:
+            event_id = storage_db.insert_ingestion_event(
+                "stable_01", None, "frame.jpg", 3, conn=conn
+            )
+            storage_db.insert_job("detect", event_id, conn=conn)
+            raise RuntimeError("abort")
+
+    conn = storage_db.get_conn(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM ingestion_events").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+
+
+def test_close_all_conns_reopens_on_next_use(db_path):
+    conn = storage_db.get_conn(db_path)
+    storage_db.close_all_conns()
+    assert storage_db.get_conn(db_path) is not conn
+    assert storage_db.get_event(1, db_path) is None
+
+
+def test_init_db_migrates_unversioned_database_once(tmp_path: Path):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript(
+        """
+        CREATE TABLE ingestion_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            camera_id TEXT NOT NULL,
+            captured_at TEXT,
+            received_at TEXT NOT NULL,
+            frame_path TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'received',
+            last_error TEXT
+        );
+        CREATE TABLE detections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            class_name TEXT,
+            confidence REAL NOT NULL,
+            bbox_x REAL,
+            bbox_y REAL,
+            bbox_w REAL,
+            bbox_h REAL,
+            detected_at TEXT NOT NULL
+        );
+        INSERT INTO ingestion_events (camera_id, received_at, frame_path, size_bytes)
+            VALUES ('stable_01', '2026-02-23T20:00:00+00:00', 'a.jpg', 3);
+        INSERT INTO detections (event_id, class_name, confidence, detected_at)
+            VALUES (1, 'horse', 0.9, '2026-02-23T20:00:01+00:00');
+        """
+    )
+    legacy.close()
+
+    storage_db.init_db(path)
+    conn = storage_db.get_conn(path)
+    try:
+        assert storage_db.schema_version(conn) == storage_db.SCHEMA_VERSION
+        row = conn.execute("SELECT label, camera_id, event_ts FROM detections").fetchone()
+        assert tuple(row) == ("horse", "stable_01", 1771876800000)
+
+        statements: list[str] = []
+        conn.set_trace_callback(statements.append)
+        storage_db.init_db(path)
+        conn.set_trace_callback(None)
+        assert statements == ["PRAGMA user_version"]
+    finally:
+        storage_db.close_all_conns()
+
+
+def test_failed_job_count_is_kept_by_triggers(db_path):
+    job_ids = [
+        storage_db.insert_event_with_job(
+            "stable_01", None, f"{i}.jpg", 3, "detect", db_path=db_path
+        )[1]
+        for i in range(3)
+    ]
+    storage_db.mark_jobs_failed([(job_ids[0], "boom"), (job_ids[1], "boom")], db_path=db_path)
+    storage_db.mark_jobs_failed([(job_ids[0], "again")], db_path=db_path)
+    stats = storage_db.job_queue_stats("detect", db_path=db_path)
+    assert (stats["pending"], stats["failed"]) == (1, 2)
+
+    storage_db.delete_jobs([job_ids[0]], db_path=db_path)
+    assert storage_db.job_queue_stats("detect", db_path=db_path)["failed"] == 1
+    assert storage_db.job_queue_stats("other", db_path=db_path)["failed"] == 0